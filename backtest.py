@@ -0,0 +1,260 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from multiprocessing import get_context
+from numpy.lib.stride_tricks import sliding_window_view
+
+from engine import STRATEGIES, Features, load_builtin
+from ohlcv_cache import OHLCVCache, PERIOD_DAYS
+from panel import Panel, FIELDS
+from pipeline import Pipeline, chunked
+from universe import UniverseCache, fetch_screener
+from metrics import metrics
+
+# ==========================================
+# 历史回放 / 回测: 每只股票一遍算出所有交易日的信号
+# ==========================================
+# live 每天收盘后对"截至当天、按策略周期截取"的 K 线跑一次 analyze_batch。
+# 回测把一只股票的全部历史当成一批: 第 k 行就是第 k 个交易日 live 会看到的窗口
+# (sliding_window_view 叠出尾部矩阵，周期起点之前的列置空)，交给同一个策略插件，
+# 滚动分位数 / ATR / 90 日高点等都是按行整批算的。该股当天有有效 K 线的每一天，
+# 信号与 live 逐位一致 (停牌 / 缺数据的日子 live 会拿旧 K 线重复出信号，回测不算)。
+# 命中后按 Trigger 进场、Stop 止损，另记信号日收盘起的固定天数前向收益。
+# 注意: 名单用的是今天的筛选结果，历史上已退市的股票不在其中。
+
+DAY_NS = 86400 * 10**9
+HORIZONS = (1, 5, 20)
+
+
+class HistoryFeatures(Features):
+    # 一只股票的全部历史 (dates, values) 当成一批: "代码"是交易日 (YYYY-MM-DD)，
+    # 每行按 period 截到 period_start(当天) 之后，与 engine 里 panel.since() 的口径相同
+    def __init__(self, dates, values, period):
+        super().__init__(None)
+        self.dates, self.values = dates, values
+        self.days = PERIOD_DAYS[period]
+
+    def rows(self, subset=None):
+        # 去掉 subset 空值后的 (日期, K 线, 每行周期起点的下标)
+        sub = tuple(subset or FIELDS)
+        def calc():
+            cols = [FIELDS.index(f) for f in sub]
+            keep = ~np.isnan(self.values[:, cols]).any(axis=1)
+            d, v = self.dates[keep], self.values[keep]
+            start = np.searchsorted(d, d // DAY_NS * DAY_NS - self.days * DAY_NS)
+            return d, v, start
+        return self.memo(('rows', sub), calc)
+
+    def keys(self, subset=None):
+        d = self.rows(subset)[0]
+        return self.memo(('keys', tuple(subset or FIELDS)),
+                         lambda: list(np.datetime_as_string(d.view('datetime64[ns]'), unit='D')))
+
+    def tails(self, width, subset=None):
+        # 第 k 行: 第 k 天往前 width 根 (右对齐)，周期起点之前的补 NaN；n 是周期内的根数
+        def calc():
+            d, v, start = self.rows(subset)
+            t = np.arange(len(d))
+            pad = np.concatenate([np.full((width - 1, v.shape[1]), np.nan), v])
+            x = np.ascontiguousarray(sliding_window_view(pad, width, axis=0).transpose(0, 2, 1))
+            x[np.arange(width) < (start - t + width - 1)[:, None]] = np.nan
+            return self.keys(subset), x, t - start + 1
+        return self.memo(('tails', width, tuple(subset or ())), calc)
+
+    def series(self, i, subset=None, field='Close'):
+        d, v, start = self.rows(subset)
+        return d[start[i]:i + 1], v[start[i]:i + 1, FIELDS.index(field)]
+
+
+class DayView:
+    # 代替 Panel 传给策略插件: 代码是交易日，column() 只给出到当天为止的那一根
+    def __init__(self, dates, values):
+        self.values = values
+        self.pos = {k: i for i, k in enumerate(np.datetime_as_string(dates.view('datetime64[ns]'), unit='D'))}
+
+    def column(self, key, field):
+        i = self.pos[key]
+        return pd.Series(self.values[i:i + 1, FIELDS.index(field)])
+
+
+def simulate(values, i, trigger=None, stop=None, hold=20, entry_days=5):
+    # i: 信号日下标 (收盘后出信号)。有 Trigger 的在之后 entry_days 天内突破才进场 (跳空按开盘价)，
+    # 没有的次日开盘进场；之后碰到 Stop 出场 (跳空按开盘价)，否则持有 hold 天按收盘出场
+    o, h, l, c = (values[:, k] for k in range(4))
+    n = len(c)
+    out = {f'Fwd{k}': c[i + k] / c[i] - 1 if i + k < n else np.nan for k in HORIZONS}
+    j = None
+    if trigger is not None:
+        hit = np.flatnonzero(h[i + 1:i + 1 + entry_days] >= trigger)
+        if hit.size: j = i + 1 + hit[0]; px = max(o[j], trigger)
+    elif i + 1 < n:
+        j = i + 1; px = o[j]
+    if j is None or not px > 0: return out
+    end = min(j + hold, n) - 1
+    k, reason = end, 'time' if j + hold <= n else 'open'
+    if stop is not None:
+        hit = np.flatnonzero(l[j:end + 1] <= stop)
+        if hit.size: k, reason = j + hit[0], 'stop'
+    exit_px = c[k] if reason != 'stop' else (min(px, stop) if k == j else min(o[k], stop))
+    out.update(Entry=j, EntryPrice=round(px, 4), Exit=k, ExitPrice=round(exit_px, 4), Reason=reason,
+               Days=k - j + 1, Return=exit_px / px - 1)
+    return out
+
+
+# ---------- 每个进程一份策略实例 ----------
+_worker = {}
+
+
+def _init_worker(names, ctx, hold, entry_days):
+    load_builtin()
+    strategies = [STRATEGIES[n]() for n in names]
+    for s in strategies: s.prepare(ctx)
+    _worker.update(strategies=strategies, hold=hold, entry_days=entry_days)
+
+
+def backtest_symbol(symbol, dates, values):
+    strategies = _worker['strategies']
+    view = DayView(dates, values)
+    stamps = list(view.pos)
+    trades = []
+    for p in sorted({s.period for s in strategies}, key=PERIOD_DAYS.get):
+        feats = HistoryFeatures(dates, values, p)
+        for s in strategies:
+            if s.period != p: continue
+            try:
+                found = s.scan(view, feats)
+            except Exception as e:
+                metrics.error(f"backtest.{s.name}", e); continue
+            for r in found:
+                i = view.pos[r['Symbol']]
+                res = simulate(values, i, r.get('Trigger'), r.get('Stop'), _worker['hold'], _worker['entry_days'])
+                for k in ('Entry', 'Exit'):
+                    if k in res: res[k] = stamps[res[k]]
+                trades.append(dict(Symbol=symbol, Date=r['Symbol'], Strategy=s.name, Signal=r['Signal'],
+                                   Close=round(values[i, 3], 2), Trigger=r.get('Trigger'), Stop=r.get('Stop'), **res))
+    return trades
+
+
+def _run_task(task):
+    return backtest_symbol(*task)
+
+
+def run(tasks, names, ctx=None, workers=1, hold=20, entry_days=5):
+    # tasks: 可迭代的 (代码, dates int64, values (行, 5))；返回所有交易记录
+    ctx = ctx if ctx is not None else {}
+    trades = []
+    if workers <= 1:
+        _init_worker(names, ctx, hold, entry_days)
+        for i, t in enumerate(tasks):
+            trades += backtest_symbol(*t)
+            if i % 50 == 49: print(f"   回放 {i + 1} 只...", end="\r")
+        return trades
+    with get_context().Pool(workers, initializer=_init_worker, initargs=(names, ctx, hold, entry_days)) as pool:
+        for i, part in enumerate(pool.imap_unordered(_run_task, tasks, chunksize=8)):
+            trades += part
+            if i % 50 == 49: print(f"   回放 {i + 1} 只...", end="\r")
+    return trades
+
+
+def panel_tasks(panel):
+    for i, s in enumerate(panel.symbols):
+        a, b = panel.offsets[i], panel.offsets[i + 1]
+        if b > a: yield s, panel.row_dates(a, b), panel.values[a:b]
+
+
+def summarize(trades):
+    if not trades: return pd.DataFrame()
+    df = pd.DataFrame(trades).reindex(columns=list(trades[0]) + ['Return'])
+    df = df.loc[:, ~df.columns.duplicated()]
+    g = df.groupby('Strategy')
+    out = pd.DataFrame({'Signals': g.size(), 'Entered': g['Return'].count()})
+    out['WinRate%'] = g['Return'].apply(lambda r: (r.dropna() > 0).mean() * 100).round(1)
+    out['AvgRet%'] = (g['Return'].mean() * 100).round(2)
+    for k in HORIZONS: out[f'Fwd{k}%'] = (g[f'Fwd{k}'].mean() * 100).round(2)
+    return out
+
+
+def add_history_args(p):
+    # 回测 / 参数扫描共用的数据来源参数
+    p.add_argument("--period", default="5y", choices=list(PERIOD_DAYS), help="回放的历史长度")
+    p.add_argument("--tickers", help="逗号分隔的代码，默认用各策略今天的名单")
+    p.add_argument("--cache-dir", help="只用本地 OHLCV 缓存目录里的 K 线 (不联网)")
+    p.add_argument("--workers", type=int, default=int(os.environ.get("WORKERS", os.cpu_count() or 1)))
+    p.add_argument("--download-workers", type=int, default=int(os.environ.get("DOWNLOAD_WORKERS", 4)))
+    p.add_argument("--metrics-dir", default=os.environ.get("METRICS_DIR"))
+
+
+def history_ctx(args, families):
+    # 基准要覆盖整段回放区间，先放进 ctx，插件的 prepare 就不再按 1y 拉取
+    ctx = {}
+    if 'wyckoff' in families:
+        from wyckoff_scan import WyckoffAnalyzer
+        from relstrength import Benchmarks, BENCHMARKS
+        ctx['wyckoff'] = WyckoffAnalyzer()
+        if args.cache_dir:
+            cache = OHLCVCache(args.cache_dir)
+            ctx['wyckoff'].bench_data = Benchmarks({b: df['Close'] for b in BENCHMARKS if (df := cache.read(b)) is not None})
+        else:
+            ctx['wyckoff'].fetch_benchmark(period=args.period)
+    return ctx
+
+
+def history_tasks(args, picks):
+    # 返回 (代码列表, 逐只 (代码, dates, values) 的迭代器)；下载模式边下边产出
+    if args.cache_dir:
+        cache = OHLCVCache(args.cache_dir)
+        tickers = args.tickers.split(",") if args.tickers else \
+            sorted(f[:-4] for f in os.listdir(cache.root) if f.endswith(".npy") and ".tmp" not in f)
+        frames = {s: df for s in tickers if (df := cache.read(s)) is not None}
+        return tickers, panel_tasks(Panel.from_frames(frames))
+    from wyckoff_scan import RobustDownloader
+    if args.tickers:
+        tickers = args.tickers.split(",")
+    else:
+        with metrics.timer("universe"):
+            rows = UniverseCache().load(lambda: fetch_screener(timeout=30)) or []
+        tickers = [r['symbol'] for r in rows if any(s.universe(r) for s in picks)]
+    cache = OHLCVCache() if os.environ.get("OHLCV_CACHE", "1") != "0" else None
+    pipe = Pipeline(lambda batch: RobustDownloader.download_chunk(batch, period=args.period, cache=cache),
+                    workers=args.download_workers)
+    return tickers, (t for batch, raw in pipe.run(chunked(tickers, 100)) for t in panel_tasks(Panel.from_download(raw, batch)))
+
+
+def main(argv=None):
+    load_builtin()
+    p = argparse.ArgumentParser(description="策略历史回放: 逐日信号 + 进出场模拟")
+    p.add_argument("--strategies", default=os.environ.get("STRATEGIES", ",".join(STRATEGIES)),
+                   help=f"逗号分隔，可选: {', '.join(STRATEGIES)}")
+    add_history_args(p)
+    p.add_argument("--hold", type=int, default=20, help="最长持有天数")
+    p.add_argument("--entry-days", type=int, default=5, help="Trigger 信号等待突破的天数")
+    p.add_argument("--out", default="backtest_trades.csv")
+    args = p.parse_args(argv)
+    names = [n for n in args.strategies.split(",") if n]
+    unknown = [n for n in names if n not in STRATEGIES]
+    if unknown: p.error(f"未知策略: {', '.join(unknown)}")
+    metrics.reset("backtest")
+
+    ctx = history_ctx(args, {STRATEGIES[n].family for n in names})
+    tickers, tasks = history_tasks(args, [STRATEGIES[n]() for n in names])
+    print(f"🧪 回放 {', '.join(names)} | {len(tickers)} 只 × {args.period} | {args.workers} 进程")
+
+    with metrics.timer("backtest"):
+        trades = run(tasks, names, ctx, args.workers, args.hold, args.entry_days)
+    trades.sort(key=lambda r: (r['Date'], r['Symbol'], r['Strategy']))
+    for n in names: metrics.count(f"signals.{n}", sum(r['Strategy'] == n for r in trades))
+    print()
+    if trades:
+        pd.DataFrame(trades).to_csv(args.out, index=False)
+        print(f"💾 {len(trades)} 条信号 -> {args.out}")
+        print(summarize(trades).to_string())
+    else:
+        print("📭 没有信号")
+    metrics.print_summary()
+    metrics.write(args.metrics_dir)
+    return trades
+
+
+if __name__ == "__main__":
+    main()
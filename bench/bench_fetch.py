@@ -0,0 +1,84 @@
+import sys
+import time
+import argparse
+
+from bench.fake_backend import FakeYahoo
+from bench.synthetic import symbols
+from pipeline import Pipeline, AdaptiveFetcher, chunked
+
+# ==========================================
+# 下载调度对比: 固定批次 + 原地重试 vs 自适应批次 (二分 / 退避重试 / 熔断)
+# 用法: python -m bench.bench_fetch --tickers 2000 --fail-rate 0.1 --bad 5 --max-batch 80
+# ==========================================
+# 固定批次用 --fixed-batch (默认不超过 --max-batch，否则必定全部超时)，只丢含坏代码的整批；
+# 自适应从 --batch 起步 (可以超过上限，靠缩批恢复)。跑完校验自适应的结果:
+#   - 非坏代码覆盖率不低于 --min-coverage
+#   - 坏代码全部被隔离: 不在结果里，且逐只重试满 --retries 次后记为失败
+#   - 没有触发熔断
+
+
+def fixed(src, tickers, batch, workers, retries):
+    # 原来的做法: 固定批大小，整批失败原地重试几次后放弃
+    def fetch(b):
+        for _ in range(retries):
+            try:
+                data = src.download(b, period="1y", group_by='ticker')
+                if data is not None and not data.empty: return data
+            except Exception:
+                pass
+        return None
+
+    got = set()
+    for b, data in Pipeline(fetch, workers=workers).run(chunked(tickers, batch)):
+        if data is not None: got |= set(data.columns.get_level_values(0))
+    return got, None
+
+
+def adaptive(src, tickers, batch, workers, retries, backoff):
+    f = AdaptiveFetcher(src.download, size=batch, retries=retries, backoff=backoff, max_backoff=backoff * 8)
+    got = set()
+    for b, data in f.run(tickers, lambda b: f.download(b, period="1y", group_by='ticker'), workers=workers):
+        if data is not None: got |= set(data.columns.get_level_values(0))
+    f.report(len(got))
+    return got, f.stats
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--tickers", type=int, default=2000)
+    p.add_argument("--batch", type=int, default=100)
+    p.add_argument("--latency", type=float, default=0.05)
+    p.add_argument("--fail-rate", type=float, default=0.1)
+    p.add_argument("--bad", type=int, default=5, help="会让整批请求失败的代码数")
+    p.add_argument("--max-batch", type=int, default=80, help="超过此大小的请求必定失败 (0 = 不限)")
+    p.add_argument("--fixed-batch", type=int, default=None, help="固定批次的批大小 (默认 min(--batch, --max-batch))")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--retries", type=int, default=3)
+    p.add_argument("--backoff", type=float, default=0.1)
+    p.add_argument("--min-coverage", type=float, default=0.99, help="自适应对非坏代码的最低覆盖率")
+    p.add_argument("--seed", type=int, default=0)
+    a = p.parse_args(argv)
+    tickers = symbols(a.tickers)
+    bad = tickers[::max(1, a.tickers // a.bad)][:a.bad] if a.bad else []
+    good = set(tickers) - set(bad)
+    fixed_batch = a.fixed_batch or (min(a.batch, a.max_batch) if a.max_batch else a.batch)
+    for name, fn, batch, extra in (("固定批次", fixed, fixed_batch, ()), ("自适应", adaptive, a.batch, (a.backoff,))):
+        src = FakeYahoo(latency=a.latency, fail_rate=a.fail_rate, seed=a.seed, bad=bad, max_batch=a.max_batch or None)
+        t0 = time.perf_counter()
+        got, stats = fn(src, tickers, batch, a.workers, a.retries, *extra)
+        dt = time.perf_counter() - t0
+        print(f"{name} (批 {batch}): 覆盖率 {len(got) / len(tickers) * 100:.1f}% ({len(got)}/{len(tickers)}) | "
+              f"{dt:.2f}s | 吞吐 {len(got) / dt:.1f} 只/秒 | 请求 {src.calls} 次, 失败 {src.failures}")
+
+    coverage = len(got & good) / len(good)
+    assert coverage >= a.min_coverage, f"自适应覆盖率 {coverage:.1%} 低于 {a.min_coverage:.0%}"
+    assert not got & set(bad), f"坏代码未被隔离: {sorted(got & set(bad))}"
+    assert stats['failed'] >= len(bad), f"失败只数 {stats['failed']} 少于坏代码数 {len(bad)}"
+    assert stats['retries'] >= len(bad) * a.retries, f"重试 {stats['retries']} 次，坏代码应各重试 {a.retries} 次"
+    assert stats['retries'] <= stats['errors'], "重试次数多于出错的请求数"
+    assert not stats['skipped'], f"触发熔断，跳过 {stats['skipped']} 只"
+    print(f"✅ 自适应: 非坏代码覆盖 {coverage:.1%}，{len(bad)} 只坏代码全部隔离，重试 {stats['retries']} 次")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import os
+import sys
+import argparse
+import subprocess
+
+# ==========================================
+# 冷启动预算: python -X importtime 量各入口模块的 import 耗时，超预算或
+# 提前加载了重模块 (yfinance / requests / scipy) 就以非 0 退出
+# 用法: python -m bench.bench_import [--repeat 3] [--scale 1.0]
+# ==========================================
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 模块 -> 预算 (毫秒)。scanner 模块的大头是 pandas (~0.3s)，scan 入口只应有标准库
+BUDGET = {'scan': 50, 'monitor': 800, 'wyckoff_scan': 800, 'engine': 800}
+# import 时不应加载的模块: 只在下载 / 老代码路径上才需要
+LAZY = ('yfinance', 'requests', 'scipy')
+
+
+def importtime(module):
+    # 返回 (累计微秒, 加载过的模块名集合)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stderr
+    total, loaded = 0, set()
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        _, cum, name = line.split("|")
+        name = name.strip()
+        loaded.add(name)
+        if name == module: total = int(cum)
+    return total, loaded
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--repeat", type=int, default=3, help="每个模块量几次取最小值")
+    p.add_argument("--scale", type=float, default=1.0, help="预算倍数 (慢机器上放宽)")
+    p.add_argument("modules", nargs="*", default=list(BUDGET))
+    a = p.parse_args(argv)
+    failed = []
+    for m in a.modules:
+        runs = [importtime(m) for _ in range(a.repeat)]
+        us = min(t for t, _ in runs)
+        eager = sorted(n for n in runs[0][1] if n.split(".")[0] in LAZY and "." not in n)
+        budget = BUDGET.get(m, 800) * a.scale
+        ok = us / 1000 <= budget and not eager
+        print(f"{'✅' if ok else '❌'} {m:<14} {us / 1000:8.1f} ms  (预算 {budget:.0f} ms)"
+              + (f"  提前加载: {', '.join(eager)}" if eager else ""))
+        if not ok: failed.append(m)
+    if failed:
+        print(f"超出冷启动预算: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
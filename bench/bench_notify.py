@@ -0,0 +1,97 @@
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+
+from bench.smtp_server import LocalSMTP
+from notify import Mailer, Digest
+
+# ==========================================
+# 通知对比: 每轮新建连接、全量发送 vs 复用连接 + 去重 + 汇总 (本地 SMTP 服务器)
+# 用法: python -m bench.bench_notify --runs 16 --latency 0.2 --every 60
+# ==========================================
+# 模拟一天 runs 轮盘中扫描 (每轮间隔 interval 分钟)，信号大部分持续存在，每轮新出现 new 个。
+# 断言: 旧做法每轮一封、每封一次连接；新做法只连一次，每个信号恰好发一次，
+# 两封邮件的间隔不小于 every 分钟。
+
+
+def signals(runs, base, new):
+    # 第 k 轮的信号: 前 base 个一直在，外加每轮新出现的 new 个 (持续 3 轮)
+    out = []
+    for k in range(runs):
+        items = [{'Symbol': f"S{i:03d}", 'Signal': 'Ambush', 'Close': 1.0, 'Trigger': 1.1, 'Stop': 0.9, 'Risk': '10%'}
+                 for i in range(base)]
+        items += [{'Symbol': f"N{j:03d}", 'Signal': 'Compression', 'Close': 1.0, 'RVol': 3.0, 'Change%': '1%', 'Score': 5}
+                  for kk in range(max(0, k - 2), k + 1) for j in range(kk * new, (kk + 1) * new)]
+        out.append(items)
+    return out
+
+
+def delivered(server):
+    return [set(re.findall(r"<b>([SN]\d{3})</b>", m.get_payload(decode=True).decode())) for _, _, m, _ in server.messages]
+
+
+def main(argv=None):
+    from monitor import build_report
+    p = argparse.ArgumentParser()
+    p.add_argument("--runs", type=int, default=16)
+    p.add_argument("--interval", type=float, default=30, help="两轮扫描间隔 (分钟)")
+    p.add_argument("--base", type=int, default=20)
+    p.add_argument("--new", type=int, default=2)
+    p.add_argument("--every", type=float, default=60, help="两封邮件最短间隔 (分钟)")
+    p.add_argument("--latency", type=float, default=0.2, help="每次建连 + 登录的延迟 (秒)")
+    p.add_argument("--fail", type=int, default=1, help="服务器对前 N 封返回 451 (测重试)")
+    a = p.parse_args(argv)
+    rounds = signals(a.runs, a.base, a.new)
+    report = lambda items: build_report([r for r in items if r['Signal'] == 'Ambush'],
+                                        [r for r in items if r['Signal'] == 'Compression'])
+
+    # 旧做法: 每轮一封全量邮件，每封新建连接并登录
+    with LocalSMTP(latency=a.latency) as srv:
+        kw = dict(host=srv.host, port=srv.port, ssl=False, user='bot@example.com', password='x', to='me@example.com')
+        t0 = time.perf_counter()
+        for items in rounds:
+            m = Mailer(**kw)
+            m.send("old", report(items))
+            m.close()
+        old_t = time.perf_counter() - t0
+        assert len(srv.messages) == a.runs and srv.connections == a.runs, (len(srv.messages), srv.connections)
+        old = (len(srv.messages), srv.connections, sum(map(len, delivered(srv))))
+
+    # 新做法: 一条连接 + 去重窗口 + 汇总间隔 (时钟按扫描间隔模拟)
+    with LocalSMTP(latency=a.latency, fail_next=a.fail) as srv, tempfile.TemporaryDirectory() as d:
+        m = Mailer(host=srv.host, port=srv.port, ssl=False, user='bot@example.com', password='x', to='me@example.com',
+                   backoff=0.01)
+        digest = Digest("bench", dedup=24 * 3600, every=a.every * 60, path=os.path.join(d, "n.json"))
+        start, lat, mail_times = time.time(), [], []
+        t0 = time.perf_counter()
+        for k, items in enumerate(rounds):
+            now = start + k * a.interval * 60
+            digest.add(items, now=now)
+            if digest.due(now=now):
+                t1 = time.perf_counter()
+                if m.send("new", report(digest.pending)): digest.mark_sent(now=now)
+                lat.append(time.perf_counter() - t1)
+                mail_times.append(now)
+        m.close()
+        new_t = time.perf_counter() - t0
+        got = delivered(srv)
+        want = {r['Symbol'] for items in rounds for r in items}
+        # 每个信号恰好发一次 (最后一轮未到点的留在 pending)
+        sent = [s for g in got for s in g]
+        left = {r['Symbol'] for r in digest.pending}
+        assert len(sent) == len(set(sent)) and set(sent) | left == want, "去重失败"
+        assert srv.connections == 1 and len(srv.logins) == 1, srv.connections
+        assert all(b - a_ >= a.every * 60 for a_, b in zip(mail_times, mail_times[1:])), "汇总间隔不足"
+        assert m.stats['retries'] == a.fail
+        new = (len(srv.messages), srv.connections, len(sent))
+
+    print(f"旧做法: {old[0]} 封, {old[1]} 次连接, 共 {old[2]} 行 | {old_t:.2f}s")
+    print(f"新做法: {new[0]} 封, {new[1]} 次连接, 共 {new[2]} 行 (重试 {a.fail}) | {new_t:.2f}s | "
+          f"单封投递 平均 {sum(lat) / max(len(lat), 1) * 1000:.0f}ms, 最长 {max(lat, default=0) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import sys
+import time
+import argparse
+
+from bench.fake_backend import FakeYahoo
+from bench.synthetic import symbols
+from pipeline import Pipeline, TokenBucket, chunked
+
+# ==========================================
+# 流水线对比: 串行 vs 并行下载 (假数据源，带延迟)
+# 用法: python -m bench.bench_pipeline --tickers 1000 --latency 0.5
+# ==========================================
+
+
+def run(tickers, batch, latency, workers, rate, analyze_cost):
+    src = FakeYahoo(latency=latency)
+    limiter = TokenBucket(rate, capacity=max(1, rate))
+    batches = chunked(symbols(tickers), batch)
+
+    def fetch(b):
+        limiter.acquire()
+        return src.download(b, period="1y")
+
+    def analyze(data):
+        time.sleep(analyze_cost)
+
+    t0 = time.perf_counter()
+    for b in batches: analyze(fetch(b))
+    serial = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for b, data in Pipeline(fetch, workers=workers).run(batches): analyze(data)
+    piped = time.perf_counter() - t0
+    return serial, piped
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--tickers", type=int, default=1000)
+    p.add_argument("--batch", type=int, default=100)
+    p.add_argument("--latency", type=float, default=0.5)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--rate", type=float, default=0)
+    p.add_argument("--analyze-cost", type=float, default=0.2)
+    a = p.parse_args(argv)
+    serial, piped = run(a.tickers, a.batch, a.latency, a.workers, a.rate, a.analyze_cost)
+    print(f"串行 {serial:.2f}s | 流水线 {piped:.2f}s | 加速 {serial/piped:.1f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
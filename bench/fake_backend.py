@@ -0,0 +1,126 @@
+import time
+import zlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+from ohlcv_cache import period_start
+
+# ==========================================
+# 本地假数据源 (离线测试 / 压测用)
+# ==========================================
+# FakeYahoo.download 与 yf.download(group_by='ticker') 的签名和返回格式一致，
+# FakeScreener 返回与 NASDAQ screener 相同格式的行。两者都可以配置
+# 延迟 (latency + 随机 jitter) 和失败率 (fail_rate 抛异常, empty_rate 返回空表)。
+# FakeYahoo 还可以模拟按批次大小出错: bad 里的代码只要在请求里整批都抛异常，
+# 请求超过 max_batch 只也抛异常 (类似限流 / 超时)。
+
+
+class FakeError(Exception):
+    pass
+
+
+class _Flaky:
+    def __init__(self, latency=0.0, jitter=0.0, fail_rate=0.0, empty_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.empty_rate = empty_rate
+        self.calls = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.rng = np.random.default_rng(seed)
+
+    def _roll(self):
+        # 返回 'ok' / 'fail' / 'empty'，并按配置阻塞
+        with self.lock:
+            self.calls += 1
+            extra = self.rng.uniform(0, self.jitter) if self.jitter else 0.0
+            r = self.rng.random()
+        if self.latency or extra: time.sleep(self.latency + extra)
+        if r < self.fail_rate:
+            with self.lock: self.failures += 1
+            return 'fail'
+        if r < self.fail_rate + self.empty_rate: return 'empty'
+        return 'ok'
+
+
+class FakeYahoo(_Flaky):
+    # market: {代码: DataFrame}，不给则按代码生成确定的随机游走
+    def __init__(self, latency=0.0, jitter=0.0, days=260, seed=0, market=None, fail_rate=0.0, empty_rate=0.0,
+                 bad=(), max_batch=None):
+        super().__init__(latency, jitter, fail_rate, empty_rate, seed)
+        self.days = days
+        self.seed = seed
+        self.market = market
+        self.bad = set(bad)
+        self.max_batch = max_batch
+
+    def _bars(self, symbol, index):
+        # 以代码为种子的随机游走，同一代码每次返回相同的数据
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        n = len(index)
+        c = rng.uniform(1, 50) * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        o = c * np.exp(rng.normal(0, 0.01, n))
+        h = np.maximum(o, c) * (1 + np.abs(rng.normal(0, 0.01, n)))
+        l = np.minimum(o, c) * (1 - np.abs(rng.normal(0, 0.01, n)))
+        v = np.round(rng.lognormal(13, 0.5, n))
+        return pd.DataFrame({'Open': o, 'High': h, 'Low': l, 'Close': c, 'Volume': v}, index=index)
+
+    def download(self, tickers, period=None, start=None, **kwargs):
+        state = self._roll()
+        if state == 'fail': raise FakeError("fake download failure")
+        if state == 'empty': return pd.DataFrame()
+        if isinstance(tickers, str): tickers = tickers.split()
+        if self.max_batch and len(tickers) > self.max_batch:
+            with self.lock: self.failures += 1
+            raise FakeError(f"fake timeout: {len(tickers)} > {self.max_batch}")
+        if self.bad.intersection(tickers):
+            with self.lock: self.failures += 1
+            raise FakeError("fake bad symbol")
+        if self.market is not None:
+            frames = {t: self.market[t] for t in tickers if t in self.market}
+        else:
+            index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=self.days, name='Date')
+            frames = {t: self._bars(t, index) for t in tickers}
+        if start is not None:
+            frames = {t: df[df.index >= pd.Timestamp(start)] for t, df in frames.items()}
+        elif period in (None, 'max'):
+            pass
+        else:
+            frames = {t: df[df.index >= period_start(period)] for t, df in frames.items()}
+        if not frames: return pd.DataFrame()
+        out = pd.concat(frames, axis=1)
+        # yf.download 默认 group_by='column'，列是 (字段, 代码)
+        if kwargs.get('group_by', 'column') != 'ticker': out = out.swaplevel(axis=1)
+        return out
+
+
+class FakeScreener(_Flaky):
+    def __init__(self, rows, latency=0.0, jitter=0.0, fail_rate=0.0, seed=0):
+        super().__init__(latency, jitter, fail_rate, 0.0, seed)
+        self.rows = rows
+
+    def fetch(self, *args, **kwargs):
+        if self._roll() == 'fail': raise FakeError("fake screener failure")
+        return list(self.rows)
+
+
+@contextmanager
+def install(yahoo=None, screener=None, modules=()):
+    # 临时替换 yf.download 和各扫描模块里的 fetch_screener
+    import yfinance as yf
+    saved = []
+    if yahoo is not None:
+        saved.append((yf, 'download', yf.download))
+        yf.download = yahoo.download
+    if screener is not None:
+        for m in modules:
+            if hasattr(m, 'fetch_screener'):
+                saved.append((m, 'fetch_screener', m.fetch_screener))
+                m.fetch_screener = screener.fetch
+    try:
+        yield
+    finally:
+        for obj, name, val in reversed(saved): setattr(obj, name, val)
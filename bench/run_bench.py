@@ -0,0 +1,231 @@
+import io
+import os
+import sys
+import glob
+import json
+import time
+import platform
+import tracemalloc
+import argparse
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+
+from bench.synthetic import make_market, benchmark_series, screener_rows, FIELDS
+from bench.fake_backend import FakeYahoo, FakeScreener, install
+
+# ==========================================
+# 离线基准: 合成行情 + 假 yfinance / screener，逐阶段计时
+# 用法: python -m bench.run_bench --sizes 100,1000,5000 --out bench_results.json
+#       python -m bench.run_bench --compare old.json new.json
+# ==========================================
+
+PLANT = {'Spring': 0.01, 'SOS': 0.01, 'Ambush': 0.01, 'Compression': 0.01}
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _traced(fn, *args, **kwargs):
+    # tracemalloc 统计: 峰值内存、结果常驻内存、结果占用的内存块数 (分配次数的近似)
+    tracemalloc.start()
+    try:
+        out = fn(*args, **kwargs)
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(st.count for st in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    return {'peak_kb': round(peak / 1024), 'retained_kb': round(current / 1024), 'blocks': blocks}, out
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        out = fn(*args, **kwargs)
+    return time.perf_counter() - t0, out
+
+
+class Recorder:
+    def __init__(self):
+        self.rows = []
+        self.failures = []
+
+    def add(self, stage, size, seconds, **extra):
+        row = {'stage': stage, 'size': size, 'seconds': round(seconds, 6),
+               'us_per_ticker': round(seconds / max(size, 1) * 1e6, 3)}
+        row.update(extra)
+        self.rows.append(row)
+        mem = f"  峰值 {extra['peak_kb']} KB / {extra['blocks']} 块" if 'peak_kb' in extra else ""
+        print(f"  {stage:<32} n={size:<6} {seconds:9.4f}s  {row['us_per_ticker']:10.1f} µs/只{mem}")
+
+
+def bench_size(rec, n, args):
+    import monitor
+    import wyckoff_scan as ws
+    from panel import Panel, CompactPanel
+    from pipeline import Pipeline, chunked
+
+    frames, planted = make_market(n, days=args.days, seed=args.seed, plant=PLANT)
+    bench = benchmark_series(args.days, seed=args.seed)
+    market = dict(frames)
+    # 三个基准都放进假行情，fetch_benchmark 一次拉齐
+    for k, name in enumerate(('QQQ', 'SPY', 'IWM')):
+        b = bench if k == 0 else benchmark_series(args.days, seed=args.seed + k)
+        market[name] = b.to_frame().assign(Open=b, High=b, Low=b, Volume=1e6)[FIELDS]
+    yahoo = FakeYahoo(latency=args.latency, jitter=args.jitter, market=market,
+                      fail_rate=args.fail_rate, empty_rate=args.empty_rate, seed=args.seed)
+    screener = FakeScreener(screener_rows(frames, args.seed), latency=args.latency)
+    # 所有落盘的东西 (名单缓存、断点、信号库、指标、通知状态) 都写进每个规模自己的临时目录:
+    # 不碰仓库里真实的 .cache，也不会因为上一个规模留下的"已完成"断点而直接跳过
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    os.environ["UNIVERSE_CACHE"] = os.path.join(tmp, "universe.json")
+    os.environ["OHLCV_CACHE"] = "0"
+    os.environ["OHLCV_CACHE_DIR"] = os.path.join(tmp, "ohlcv")
+    os.environ["CHECKPOINT_DIR"] = os.path.join(tmp, "checkpoints")
+    os.environ["SIGNAL_DB"] = os.path.join(tmp, "signals.db")
+    os.environ["METRICS_DIR"] = os.path.join(tmp, "metrics")
+    os.environ["NOTIFY_DIR"] = tmp
+
+    with install(yahoo, screener, modules=(ws, monitor)):
+        os.environ["UNIVERSE_TTL"] = "0"
+        dt, tickers = _timed(ws.get_tickers)
+        rec.add("get_tickers", n, dt, cached=False)
+        os.environ["UNIVERSE_TTL"] = "3600"
+        dt, _ = _timed(ws.get_tickers)
+        rec.add("get_tickers", n, dt, cached=True)
+
+        ws.RobustDownloader.limiter.rate = 0
+        batches = chunked(sorted(frames), 100)
+        t0 = time.perf_counter()
+        raws = [ws.RobustDownloader.download_chunk(b) for b in batches]
+        rec.add("download_chunk", n, time.perf_counter() - t0, latency=args.latency, mode="serial")
+        t0 = time.perf_counter()
+        for _ in Pipeline(ws.RobustDownloader.download_chunk, workers=args.download_workers).run(batches): pass
+        rec.add("download_chunk", n, time.perf_counter() - t0, latency=args.latency, mode="pipeline")
+
+        # 逐只 DataFrame 拷贝 (旧写法) 对比整块转 Panel。和主程序一样逐批转换 + 分析，
+        # 上一批用完即丢，峰值反映的是单批的内存开销
+        per_frame = lambda raw, b: {t: raw[t].copy() for t in b if not raw.empty and t in raw}
+        wa = ws.WyckoffAnalyzer()
+        wa.bench_data = bench
+
+        def run(norm, analyze=None):
+            for raw, b in zip(raws, batches):
+                part = norm(raw, b)
+                if analyze: analyze(part)
+
+        for mode, norm in (("frames", per_frame), ("panel", ws.RobustDownloader.normalize_data)):
+            dt, _ = _timed(run, norm)
+            mem, _ = _traced(run, norm)
+            rec.add("normalize_data", n, dt, mode=mode, **mem)
+            dt, _ = _timed(run, norm, wa.analyze_batch)
+            mem, _ = _traced(run, norm, wa.analyze_batch)
+            rec.add("normalize+analyze_batch", n, dt, mode=mode, **mem)
+        # 全市场一批分析: 每批转换后累积，拼成一块再跑一次 analyze_batch (拼完各批即释放)。
+        # compact (float32 + 日期下标) 的峰值要在 --mem-budget 以内 (每只 KB)，超出记为失败
+        def one_batch(compact):
+            parts = [ws.RobustDownloader.normalize_data(raw, b, compact=compact) for raw, b in zip(raws, batches)]
+            data = (CompactPanel if compact else Panel).concat(parts)
+            del parts
+            return wa.analyze_batch(data)
+
+        for mode, compact in (("float64", False), ("compact", True)):
+            dt, _ = _timed(one_batch, compact)
+            mem, _ = _traced(one_batch, compact)
+            extra = {'budget_kb': round(args.mem_budget * n), 'within_budget': mem['peak_kb'] <= args.mem_budget * n} if compact else {}
+            rec.add("one_batch_scan", n, dt, mode=mode, **mem, **extra)
+            if compact and not extra['within_budget']:
+                print(f"  ❌ 峰值 {mem['peak_kb']} KB 超出预算 {extra['budget_kb']} KB ({args.mem_budget} KB/只)")
+                rec.failures.append(f"one_batch_scan n={n}: 峰值 {mem['peak_kb']} KB > {extra['budget_kb']} KB")
+        data = Panel.concat([ws.RobustDownloader.normalize_data(raw, b) for raw, b in zip(raws, batches)])
+
+        dt, ref = _timed(lambda: [r for t, df in data.items() if (r := wa.analyze(t, df))])
+        rec.add("WyckoffAnalyzer.analyze", n, dt, hits=len(ref))
+        dt, got = _timed(wa.analyze_batch, data)
+        rec.add("WyckoffAnalyzer.analyze_batch", n, dt, hits=len(got), identical=got == ref)
+        if got != ref: rec.failures.append(f"WyckoffAnalyzer.analyze_batch n={n}: 与逐只 analyze 结果不一致")
+        found = {r['Symbol']: r['Signal'] for r in got}
+
+        na = monitor.NanoAnalyzer()
+        nano = Panel.concat([Panel.from_download(raw, b) for raw, b in zip(raws, batches)])
+        ref = {}
+        t0 = time.perf_counter()
+        for t, df in nano.items():
+            r = na.analyze(t, df)
+            if r: ref.update(r)
+        rec.add("NanoAnalyzer.analyze", n, time.perf_counter() - t0, hits=len(ref))
+        dt, got = _timed(na.analyze_batch, nano)
+        rec.add("NanoAnalyzer.analyze_batch", n, dt, hits=len(got), identical=got == ref)
+        if got != ref: rec.failures.append(f"NanoAnalyzer.analyze_batch n={n}: 与逐只 analyze 结果不一致")
+
+        # 植入形态的召回率: 合成数据里埋下的形态应该全部被对应策略找到
+        for t, r in got.items(): found[t] = found.get(t, '') + ' ' + ' '.join(r)
+        recall = {k: sum(k in found.get(s, '') for s in v) / len(v) for k, v in planted.items() if v}
+
+        ws.send_email = lambda results: True
+        # 结果 CSV 写在当前目录，也放进临时目录
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            dt, _ = _timed(ws.main, ["--rate", "0", "--download-workers", str(args.download_workers), "--fresh"])
+        finally:
+            os.chdir(cwd)
+        ckpt = json.load(open(glob.glob(os.path.join(tmp, "checkpoints", "*.json"))[0], encoding='utf-8'))
+        scanned = len(set(ckpt['done']) & set(ckpt['universe']))
+        rec.add("wyckoff_scan.main", n, dt, latency=args.latency, planted_recall=recall, scanned=scanned)
+        if not ckpt.get('finished') or scanned != len(ckpt['universe']):
+            rec.failures.append(f"wyckoff_scan.main n={n}: 只扫描了 {scanned}/{len(ckpt['universe'])} 只")
+
+
+def compare(old_path, new_path):
+    old, new = (json.load(open(p, encoding='utf-8')) for p in (old_path, new_path))
+    key = lambda r: (r['stage'], r['size'], r.get('mode'), r.get('cached'))
+    base = {key(r): r for r in old['results']}
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    for r in new['results']:
+        o = base.get(key(r))
+        if not o: continue
+        ratio = r['seconds'] / o['seconds'] if o['seconds'] else float('inf')
+        flag = " ⚠️" if ratio > 1.2 else ""
+        mem = f"  峰值 {o['peak_kb']} -> {r['peak_kb']} KB" if 'peak_kb' in o and 'peak_kb' in r else ""
+        print(f"  {r['stage']:<32} n={r['size']:<6} {o['seconds']:9.4f}s -> {r['seconds']:9.4f}s  x{ratio:.2f}{flag}{mem}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="扫描器离线基准")
+    p.add_argument("--sizes", default="100,1000,5000")
+    p.add_argument("--days", type=int, default=260)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--latency", type=float, default=0.05, help="假数据源每次请求的延迟 (秒)")
+    p.add_argument("--jitter", type=float, default=0.0)
+    p.add_argument("--fail-rate", type=float, default=0.0)
+    p.add_argument("--empty-rate", type=float, default=0.0)
+    p.add_argument("--download-workers", type=int, default=4)
+    p.add_argument("--mem-budget", type=float, default=24.0,
+                   help="紧凑模式全市场一批扫描的峰值内存预算 (KB/只，1y 日 K)")
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = p.parse_args(argv)
+    if args.compare: return compare(*args.compare)
+
+    rec = Recorder()
+    for n in [int(x) for x in args.sizes.split(",") if x]:
+        print(f"📊 n = {n}")
+        bench_size(rec, n, args)
+    meta = {'commit': _git_rev(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'machine': platform.machine(), 'cpus': os.cpu_count(), 'args': vars(args)}
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': rec.rows}, f, ensure_ascii=False, indent=1)
+    print(f"✅ 结果已写入 {args.out}")
+    if rec.failures:
+        for msg in rec.failures: print(f"❌ {msg}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import time
+import base64
+import threading
+import socketserver
+from email import message_from_bytes
+
+# ==========================================
+# 进程内的本地 SMTP 服务器 (离线测试通知用)
+# ==========================================
+# 只实现 smtplib 用得到的命令: EHLO/HELO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET, NOOP, QUIT。
+# 明文连接 (配合 SMTP_SSL=0)；收到的邮件存在 messages 里，并统计连接 / 登录次数。
+# latency 模拟每次建连 + 登录的开销 (真实的 SSL 握手和登录通常要几百毫秒)，
+# fail_next 让接下来 N 封邮件在 DATA 阶段返回 451，测试重试。
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        srv = self.server.smtp
+        with srv.lock: srv.connections += 1
+        if srv.latency: time.sleep(srv.latency)
+        self.reply("220 localhost fake smtp")
+        sender, rcpts = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line: return
+            cmd, _, arg = line.decode().rstrip("\r\n").partition(" ")
+            cmd = cmd.upper()
+            if cmd == "EHLO":
+                self.reply("250-localhost"); self.reply("250-AUTH PLAIN LOGIN"); self.reply("250 8BITMIME")
+            elif cmd == "HELO":
+                self.reply("250 localhost")
+            elif cmd == "AUTH":
+                mech, _, data = arg.partition(" ")
+                if mech.upper() == "PLAIN":
+                    if not data:
+                        self.reply("334 "); data = self.rfile.readline().decode().strip()
+                    user = base64.b64decode(data).split(b"\0")[1].decode()
+                else:
+                    self.reply("334 " + base64.b64encode(b"Username:").decode())
+                    user = base64.b64decode(self.rfile.readline().strip()).decode()
+                    self.reply("334 " + base64.b64encode(b"Password:").decode())
+                    self.rfile.readline()
+                with srv.lock: srv.logins.append(user)
+                self.reply("235 ok")
+            elif cmd == "MAIL":
+                sender, rcpts = arg.split(":", 1)[1].strip().strip("<>"), []
+                self.reply("250 ok")
+            elif cmd == "RCPT":
+                rcpts.append(arg.split(":", 1)[1].strip().strip("<>"))
+                self.reply("250 ok")
+            elif cmd == "DATA":
+                self.reply("354 end with .")
+                lines = []
+                while True:
+                    l = self.rfile.readline()
+                    if not l or l in (b".\r\n", b".\n"): break
+                    lines.append(l[1:] if l.startswith(b"..") else l)
+                with srv.lock:
+                    fail = srv.fail_next > 0
+                    if fail: srv.fail_next -= 1
+                    else: srv.messages.append((sender, rcpts, message_from_bytes(b"".join(lines)), time.time()))
+                self.reply("451 try again" if fail else "250 queued")
+            elif cmd == "RSET":
+                sender, rcpts = None, []
+                self.reply("250 ok")
+            elif cmd == "NOOP":
+                self.reply("250 ok")
+            elif cmd == "QUIT":
+                self.reply("221 bye"); return
+            else:
+                self.reply("502 not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class LocalSMTP:
+    def __init__(self, latency=0.0, fail_next=0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.fail_next = fail_next
+        self.messages = []      # (发件人, 收件人列表, email.message.Message, 收到时间)
+        self.connections = 0
+        self.logins = []
+        self.lock = threading.Lock()
+        self.server = _Server((host, port), _Handler)
+        self.server.smtp = self
+        self.host, self.port = self.server.server_address
+        self.thread = None
+
+    def env(self):
+        # 让 notify.Mailer 连到这里的环境变量
+        return {'SMTP_HOST': self.host, 'SMTP_PORT': str(self.port), 'SMTP_SSL': '0',
+                'MAIL_USER': 'bot@example.com', 'MAIL_PASS': 'x', 'MAIL_TO': 'me@example.com'}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 合成行情: 可复现的随机 K 线 + 人工植入的形态
+# ==========================================
+# make_market(n, days, seed) 生成 {代码: DataFrame}；plant 可在指定股票末尾
+# 植入 Spring / SOS / Ambush / Compression，使对应策略一定命中。
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+PATTERNS = ('Spring', 'SOS', 'Ambush', 'Compression')
+
+
+def symbols(n, prefix="Z"):
+    # 纯字母代码 (扫描器会过滤掉含数字的代码)，prefix + 4 位 A-Z，最多 26^4 只
+    out = []
+    for i in range(n):
+        s = ""
+        for _ in range(4):
+            i, r = divmod(i, 26)
+            s = chr(65 + r) + s
+        out.append(prefix + s)
+    return out
+
+
+def trading_days(days, end=None):
+    end = pd.Timestamp.today().normalize() if end is None else pd.Timestamp(end)
+    return pd.bdate_range(end=end, periods=days, name='Date')
+
+
+def _ohlc(close, rng, spread):
+    # 由收盘价生成开高低：开盘在前收附近，高低点包住开收
+    n = len(close)
+    prev = np.concatenate(([close[0]], close[:-1]))
+    o = prev * np.exp(rng.normal(0, spread / 2, n))
+    h = np.maximum(o, close) * (1 + np.abs(rng.normal(0, spread / 2, n)))
+    l = np.minimum(o, close) * (1 - np.abs(rng.normal(0, spread / 2, n)))
+    return o, h, l
+
+
+def random_walk(rng, days, price=(2, 200), vol=(0.01, 0.04), volume=(12, 15)):
+    p0 = np.exp(rng.uniform(np.log(price[0]), np.log(price[1])))
+    sigma = rng.uniform(*vol)
+    c = p0 * np.exp(np.cumsum(rng.normal(0, sigma, days)))
+    o, h, l = _ohlc(c, rng, sigma)
+    v = np.round(rng.lognormal(rng.uniform(*volume), 0.4, days))
+    return np.column_stack([o, h, l, c, v])
+
+
+# ---------- 形态植入 (就地修改 bars 的末尾) ----------
+def _range_bound(rng, days, mid, width, sigma=0.012):
+    # 在 mid ± width 区间内来回震荡的收盘价
+    t = np.arange(days)
+    c = mid * (1 + width * np.sin(t / rng.uniform(6, 10) + rng.uniform(0, 6)) + rng.normal(0, sigma, days))
+    o, h, l = _ohlc(c, rng, sigma)
+    return np.column_stack([o, h, l, c, np.round(rng.lognormal(14, 0.3, days))])
+
+
+def plant_spring(bars, rng):
+    # 区间震荡后最后 3 根下刺支撑、收在高位、成交量枯竭
+    n = len(bars)
+    mid = rng.uniform(20, 80)
+    bars[:] = _range_bound(rng, n, mid, 0.08)
+    sub = bars[-120:-3]
+    # 支撑 = max(5% 分位低点, 中位收盘 - 4*ATR)；ATR >= 平均振幅，所以 base 是支撑的上界
+    q_lo = np.quantile(sub[:, 2], 0.05)
+    base = max(q_lo, np.median(sub[:, 3]) - 4 * (sub[-14:, 1] - sub[-14:, 2]).mean())
+    for k, close in enumerate((1.02, 1.03, 1.035)):
+        i = n - 3 + k
+        bars[i, 2] = q_lo * 0.98
+        bars[i, 3] = base * close
+        bars[i, 0] = base * (close - 0.005)
+        bars[i, 1] = bars[i, 3] * 1.002
+        bars[i, 4] = bars[-60:-3, 4].min() * 0.5
+    return bars
+
+
+def plant_sos(bars, rng):
+    # 区间震荡，最后 50 天重心稳步抬升，末根放量突破区间上沿
+    n = len(bars)
+    mid = rng.uniform(20, 80)
+    bars[:] = _range_bound(rng, n, mid, 0.08, sigma=0.01)
+    c = mid * np.linspace(0.96, 1.08, 50) * (1 + rng.normal(0, 0.005, 50))
+    o, h, l = _ohlc(c, rng, 0.012)
+    bars[-50:, :4] = np.column_stack([o, h, l, c])
+    res = np.quantile(bars[-120:-3, 1], 0.95)
+    c = max(res, bars[-2, 3]) * 1.02
+    bars[-1] = [bars[-2, 3], c * 1.004, bars[-2, 3] * 0.995, c, bars[-60:-1, 4].max() * 1.5]
+    return bars
+
+
+def plant_ambush(bars, rng):
+    # 高位回落 35%+ 后在低位窄幅横盘 15 天，量能平稳
+    n = len(bars)
+    p0 = rng.uniform(3.0, 4.5)
+    c = np.full(n, p0) * np.exp(rng.normal(0, 0.01, n))
+    fall = np.linspace(1.0, 0.6, 20)
+    c[-35:-15] = p0 * fall * np.exp(rng.normal(0, 0.01, 20))
+    c[-15:] = p0 * 0.6 * (1 + rng.normal(0, 0.004, 15))
+    o, h, l = _ohlc(c, rng, 0.003)
+    h, l = np.maximum(h, c * 1.025), np.minimum(l, c * 0.975)
+    bars[:] = np.column_stack([o, h, l, c, np.round(rng.lognormal(13, 0.15, n))])
+    return bars
+
+
+def plant_compression(bars, rng):
+    # 最后一根放量 3-5 倍，但涨跌幅很小
+    avg = bars[-21:-1, 4].mean()
+    if avg <= 30000:
+        bars[:, 4] *= 60000 / max(avg, 1)
+        avg = bars[-21:-1, 4].mean()
+    o = bars[-2, 3]
+    bars[-1, 0] = o
+    bars[-1, 3] = o * rng.uniform(1.0, 1.03)
+    bars[-1, 1] = bars[-1, 3] * 1.01
+    bars[-1, 2] = o * 0.99
+    bars[-1, 4] = avg * rng.uniform(3, 5)
+    return bars
+
+
+PLANTERS = {'Spring': plant_spring, 'SOS': plant_sos, 'Ambush': plant_ambush, 'Compression': plant_compression}
+
+
+def make_market(n, days=260, seed=0, plant=None, price=(2, 200), end=None):
+    # plant: {形态名: 比例}，例如 {'Spring': 0.01}；返回 (frames, planted)
+    # planted 记录每个形态植入到了哪些代码
+    rng = np.random.default_rng(seed)
+    index = trading_days(days, end)
+    names = symbols(n)
+    bars = {s: random_walk(rng, days, price=price) for s in names}
+    planted = {k: [] for k in PATTERNS}
+    if plant:
+        order = rng.permutation(n)
+        pos = 0
+        for kind, frac in plant.items():
+            k = int(round(n * frac))
+            for i in order[pos:pos + k]:
+                PLANTERS[kind](bars[names[i]], rng)
+                planted[kind].append(names[i])
+            pos += k
+    frames = {s: pd.DataFrame(b, index=index, columns=FIELDS) for s, b in bars.items()}
+    return frames, {k: sorted(v) for k, v in planted.items()}
+
+
+def benchmark_series(days=260, seed=0, end=None, drift=0.0):
+    rng = np.random.default_rng([seed, 7])
+    c = 400 * np.exp(np.cumsum(rng.normal(drift, 0.004, days)))
+    return pd.Series(c, index=trading_days(days, end), name='Close')
+
+
+def screener_rows(frames, seed=0):
+    # 生成与 NASDAQ screener 接口同格式的行 (字符串带 $ 和千分位)
+    rng = np.random.default_rng([seed, 11])
+    rows = []
+    for s, df in frames.items():
+        last = df.iloc[-1]
+        shares = rng.uniform(5e6, 5e8)
+        rows.append({'symbol': s, 'lastsale': f"${last['Close']:.2f}", 'volume': f"{int(last['Volume']):,}",
+                     'marketCap': f"{last['Close'] * shares:,.0f}"})
+    return rows
@@ -0,0 +1,92 @@
+import os
+import json
+import glob
+import time
+import pandas as pd
+
+# ==========================================
+# 扫描断点: 每批分析完就落盘，进程挂了下次从断点继续
+# ==========================================
+# 一次运行由 run_id 标识，默认 "<扫描名>-<美东交易日>"，同一交易日重复启动
+# 都落到同一个文件: 已完成的代码、到目前为止的结果、本次运行的名单快照。
+# 跑完的运行记为 finished，当天再启动直接跳过 (--fresh 重新开始)。
+# 没拿到数据的代码不算完成，续跑时会再试一次。
+
+
+def trading_day(now=None, tz="America/New_York"):
+    # 周末算作上一个交易日 (周六补跑的仍是周五的那一轮)
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now(tz=tz)
+    day = now.tz_localize(None).normalize() if now.tzinfo else now.normalize()
+    return pd.offsets.BDay().rollback(day).strftime('%Y-%m-%d')
+
+
+def _plain(o):
+    # numpy 标量 -> Python 数值
+    return o.item() if hasattr(o, 'item') else str(o)
+
+
+class ScanCheckpoint:
+    def __init__(self, name, run_id=None, root=None, keep=10):
+        self.root = root or os.environ.get("CHECKPOINT_DIR", os.path.join(".cache", "checkpoints"))
+        self.run_id = run_id or f"{name}-{trading_day()}"
+        self.path = os.path.join(self.root, f"{self.run_id}.json")
+        self.keep = keep
+        self.state = self._read()
+        self.done = set(self.state.get('done', []))
+        self.resumed = bool(self.state)
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.state['done'] = sorted(self.done)
+        self.state['updated_at'] = time.time()
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(self.state, f, default=_plain)
+        os.replace(tmp, self.path)
+
+    @property
+    def finished(self):
+        return self.state.get('finished', False)
+
+    @property
+    def results(self):
+        return self.state.get('results', [])
+
+    def reset(self):
+        self.state, self.done, self.resumed = {}, set(), False
+        if os.path.exists(self.path): os.remove(self.path)
+
+    def universe(self, load):
+        # 名单快照: 续跑时用第一次运行的名单，不重拉 screener
+        if 'universe' not in self.state:
+            self.state.update(universe=list(load()), results=[], started_at=time.time())
+            self._write()
+            self._prune()
+        return self.state['universe']
+
+    def pending(self):
+        return [t for t in self.state.get('universe', []) if t not in self.done]
+
+    def commit(self, symbols, results):
+        # 一批分析完: 代码记为完成，结果追加，原子写盘
+        self.done.update(symbols)
+        self.state.setdefault('results', []).extend(dict(r) for r in results)
+        self._write()
+
+    def finish(self):
+        self.state['finished'] = True
+        self._write()
+
+    def _prune(self):
+        # 只留最近 keep 次运行的断点文件
+        files = sorted(glob.glob(os.path.join(self.root, "*.json")), key=os.path.getmtime)
+        for f in files[:-self.keep]:
+            try:
+                os.remove(f)
+            except OSError:
+                pass
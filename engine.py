@@ -0,0 +1,185 @@
+import os
+import argparse
+import importlib
+import numpy as np
+
+from ohlcv_cache import OHLCVCache, PERIOD_DAYS, period_start
+from panel import Panel, FIELDS, stack_tails, nan_quantile_rows
+from pipeline import Pipeline, chunked
+from universe import UniverseCache, fetch_screener
+from metrics import metrics
+
+# ==========================================
+# 多策略引擎: 名单和 K 线只下载一次，各策略以插件方式挂上来
+# ==========================================
+# 策略用 @register 登记，声明需要的回看周期 (period) 和名单过滤 (universe)。
+# 引擎取所有已启用策略名单的并集，按最长的回看周期下载一次；每批 K 线
+# 按各策略的周期截取，同一周期的策略共用一个 Features (尾部矩阵 / TR / 分位数
+# 等共享指标只算一次)。新增策略不会多一次全市场下载。
+# 注意: 指标只在同一周期内共享。周期不同的策略 (纳米盘 3mo / 威科夫 1y) 看到的窗口
+# 本来就不同 (截取后尾部行数、空值补位都不一样)，ATR / 分位数等不能互相复用，
+# 各自一个 Features；内置插件里真正共用缓存的是同一分析器的两个形态
+# (Ambush / Compression、Spring / SOS) 以及参数扫描时的各组参数。
+
+STRATEGIES = {}
+# 内置策略所在的模块，import 时完成登记
+BUILTIN = ('monitor', 'wyckoff_scan')
+
+
+def register(cls):
+    STRATEGIES[cls.name] = cls
+    return cls
+
+
+def load_builtin():
+    for m in BUILTIN: importlib.import_module(m)
+    return STRATEGIES
+
+
+class Strategy:
+    name = None
+    family = None       # 同一 family 的结果合并成一份报告
+    period = '1y'       # 需要的回看周期 (yfinance 的 period 写法)
+
+    def prepare(self, ctx):
+        # 每次运行前调用一次；ctx 是所有策略共用的 dict，可放基准数据等
+        self.ctx = ctx
+
+    def universe(self, row):
+        # row: universe.clean_rows 清洗后的一行
+        return True
+
+    def scan(self, panel, feats):
+        # 返回结果列表，每条至少有 'Symbol' 和 'Signal'
+        return []
+
+    def notify(self, items):
+        pass
+
+
+class Features:
+    # 同一批 Panel 上的共享指标缓存；参数相同的请求只算一次
+    def __init__(self, panel):
+        self.panel = panel
+        self.cache = {}
+
+    def memo(self, key, fn):
+        if key not in self.cache: self.cache[key] = fn()
+        return self.cache[key]
+
+    def tails(self, width, subset=None):
+        # 同 stack_tails；已有同一 subset 更宽的结果时直接切出尾部视图
+        sub = tuple(subset or ())
+        wider = [k for k in self.cache if k[0] == 'tails' and k[2] == sub and k[1] >= width]
+        if wider and ('tails', width, sub) not in self.cache:
+            syms, x, n = self.cache[min(wider, key=lambda k: k[1])]
+            self.cache[('tails', width, sub)] = (syms, x[:, x.shape[1] - width:], n)
+        return self.memo(('tails', width, sub), lambda: stack_tails(self.panel, width, subset=subset))
+
+    def true_range(self, width, subset=None):
+        # (股票数, width-1) 的真实波幅: TR 取三者中非空的最大值
+        def calc():
+            _, x, _ = self.tails(width, subset)
+            h, l, cp = x[:, 1:, 1], x[:, 1:, 2], x[:, :-1, 3]
+            return np.fmax(h - l, np.fmax(np.abs(h - cp), np.abs(l - cp)))
+        return self.memo(('tr', width, tuple(subset or ())), calc)
+
+    def quantile(self, field, q, width, subset=None, lo=0, hi=None):
+        # 尾部矩阵 [:, lo:hi] 上某字段的按行分位数 (忽略 NaN)
+        def calc():
+            _, x, _ = self.tails(width, subset)
+            return nan_quantile_rows(x[:, lo:hi, field], q)
+        return self.memo(('q', field, q, width, tuple(subset or ()), lo, hi), calc)
+
+    def series(self, i, subset=None, field='Close'):
+        # 第 i 只去掉 subset 空值后的完整序列 (日期 int64 纳秒, 字段值)，给 RS 这类要看全部历史的指标用
+        p = self.panel
+        subset = list(subset or FIELDS)
+        if isinstance(p, Panel):
+            a, b = p.offsets[i], p.offsets[i + 1]
+            d, v = p.row_dates(a, b), p.values[a:b]
+            cols = [p.fields.index(f) for f in subset if f not in p.dense]
+            if cols:
+                keep = ~np.isnan(v[:, cols]).any(axis=1)
+                d, v = d[keep], v[keep]
+            return d, v[:, p.fields.index(field)]
+        syms = self.memo('symbols', lambda: list(p))
+        s = p[syms[i]].dropna(subset=subset).sort_index()[field]
+        return s.index.values.astype('datetime64[ns]').view('i8'), s.to_numpy(dtype='f8')
+
+
+def run(names=None, download=None, cache=None, workers=4, batch_size=100):
+    # 返回 {策略名: 结果列表}
+    if download is None:
+        from wyckoff_scan import RobustDownloader
+        download = RobustDownloader.download_chunk
+    strategies = [STRATEGIES[n]() for n in (names or STRATEGIES)]
+    ctx = {}
+    for s in strategies: s.prepare(ctx)
+
+    with metrics.timer("universe"):
+        rows = UniverseCache().load(lambda: fetch_screener(timeout=30)) or []
+    eligible = {s.name: {r['symbol'] for r in rows if s.universe(r)} for s in strategies}
+    tickers = [r['symbol'] for r in rows if any(r['symbol'] in e for e in eligible.values())]
+    metrics.count("tickers.screener", len(rows))
+    metrics.count("tickers.requested", len(tickers))
+    period = max((s.period for s in strategies), key=PERIOD_DAYS.get)
+    periods = sorted({s.period for s in strategies}, key=PERIOD_DAYS.get)
+    print(f"🧩 策略: {', '.join(s.name for s in strategies)} | {len(tickers)} 只, 下载 {period}")
+
+    results = {s.name: [] for s in strategies}
+    pipe = Pipeline(lambda batch: download(batch, period=period, cache=cache), workers=workers)
+    for i, (batch, raw) in enumerate(pipe.run(chunked(tickers, batch_size))):
+        print(f"   批次 {i + 1}...", end="\r")
+        with metrics.timer("normalize"):
+            panel = Panel.from_download(raw, batch)
+        metrics.count("tickers.downloaded", len(panel))
+        for p in periods:
+            # 周期较短的策略只看自己窗口内的 K 线，结果与单独下载该周期一致；
+            # Features 按周期各建一个 (见模块说明)
+            sub = panel if p == period else panel.since(period_start(p))
+            feats = Features(sub)
+            for s in strategies:
+                if s.period != p: continue
+                try:
+                    with metrics.timer(f"strategy.{s.name}"):
+                        found = [r for r in s.scan(sub, feats) if r['Symbol'] in eligible[s.name]]
+                except Exception as e:
+                    metrics.error(f"strategy.{s.name}", e); continue
+                metrics.count(f"signals.{s.name}", len(found))
+                results[s.name] += found
+    return results
+
+
+def main(argv=None):
+    load_builtin()
+    p = argparse.ArgumentParser(description="多策略扫描: 一次下载，多个策略")
+    p.add_argument("--strategies", default=os.environ.get("STRATEGIES", ",".join(STRATEGIES)),
+                   help=f"逗号分隔，可选: {', '.join(STRATEGIES)}")
+    p.add_argument("--download-workers", type=int, default=int(os.environ.get("DOWNLOAD_WORKERS", 4)))
+    p.add_argument("--email", action="store_true", help="按策略族发送邮件报告")
+    p.add_argument("--metrics-dir", default=os.environ.get("METRICS_DIR"))
+    args = p.parse_args(argv)
+    names = [n for n in args.strategies.split(",") if n]
+    unknown = [n for n in names if n not in STRATEGIES]
+    if unknown: p.error(f"未知策略: {', '.join(unknown)}")
+
+    metrics.reset("engine")
+    cache = OHLCVCache() if os.environ.get("OHLCV_CACHE", "1") != "0" else None
+    results = run(names, cache=cache, workers=args.download_workers)
+    print()
+    families = {}
+    for name, found in results.items():
+        print(f"📋 {name}: {len(found)}")
+        for r in found: print(f"   🎯 {r['Symbol']} {r['Signal']}")
+        families.setdefault(STRATEGIES[name].family or name, (STRATEGIES[name], []))[1].extend(found)
+    if args.email:
+        for cls, items in families.values():
+            if items: cls().notify(items)
+    metrics.print_summary()
+    metrics.write(args.metrics_dir)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from panel import Panel, FIELDS
+
+# ==========================================
+# 盘中 5 分钟 K 线环形缓冲 + 本地重采样
+# ==========================================
+# 只订阅一路 5 分钟数据，日线 / 周线 / 分时段量能都在本地由它算出来，不再为每个周期单独下载。
+# BarRing 给每只股票一个固定长度的环 (默认 25 个交易日 × 78 根)，存在 root 下的 memmap 文件里:
+#   bars.f32  (capacity, slots, 5) float32  OHLCV
+#   ts.i64    (capacity, slots)    int64    K 线起始时间 (UTC 纳秒)
+#   total.i64 (capacity,)          int64    累计写入根数 (环里最新一根在 (total-1) % slots)
+#   meta.json 代码 -> 行号
+# 内存上限: 每只 slots × (5×4 + 8) 字节，默认 1950 × 28 ≈ 53 KiB，与跑了多久无关；
+# 4096 只的文件约 214 MiB，但只有写过的页会占磁盘和内存 (稀疏文件 + 按需换页)。
+# 容量满了按倍数扩文件 (行在前、列在后，扩容只是在文件尾追加)。
+
+SESSION_BARS = 78           # 09:30-16:00 共 78 根 5 分钟 K 线
+DAY_NS = 86400 * 10 ** 9
+MIN_FRACTION = 0.02         # 开盘第一根时预期量能占比的下限，避免 RVol 被放大到离谱
+
+
+def _group_bars(values, label, new, offsets):
+    # 把按代码、时间排好的 K 线按组合并: new 标记每组的第一根，label 是每根所属组的日期
+    # O 取第一根、H 最高、L 最低、C 最后一根、V 求和；返回 (values, dates, 每只股票的组偏移)
+    starts = np.flatnonzero(new)
+    if not len(starts):
+        return np.empty((0, len(FIELDS))), np.empty(0, dtype=np.int64), np.zeros(len(offsets), dtype=np.int64)
+    ends = np.r_[starts[1:], len(values)] - 1
+    out = np.empty((len(starts), len(FIELDS)))
+    out[:, 0] = values[starts, 0]
+    out[:, 1] = np.fmax.reduceat(values[:, 1], starts)
+    out[:, 2] = np.fmin.reduceat(values[:, 2], starts)
+    out[:, 3] = values[ends, 3]
+    out[:, 4] = np.add.reduceat(np.nan_to_num(values[:, 4]), starts)
+    return out, label[starts], np.searchsorted(starts, offsets)
+
+
+def week_ids(dates):
+    # 日期 (int64 纳秒) 所在的自然周编号，周一开始 (1970-01-01 是周四)
+    return (dates // DAY_NS + 3) // 7
+
+
+def resample_weekly(panel):
+    # 日线 Panel -> 周线 Panel (按周一到周五合并，日期记为该周最后一个交易日)
+    d = panel.row_dates(0, panel.offsets[-1])
+    wk = week_ids(d)
+    new = np.ones(len(d), dtype=bool)
+    new[1:] = wk[1:] != wk[:-1]
+    new[panel.offsets[:-1][panel.offsets[:-1] < len(d)]] = True
+    ends = np.r_[np.flatnonzero(new)[1:], len(d)] - 1
+    label = np.empty_like(d)
+    label[new] = d[ends]
+    values, dates, offsets = _group_bars(np.asarray(panel.values, dtype='f8'), label, new, panel.offsets)
+    return Panel(panel.symbols, values, dates, offsets, FIELDS)
+
+
+def weekly_trend(dates, close, weeks=10):
+    # 最新周收盘相对最近 weeks 周收盘均值的偏离 (%)，周数不够返回 NaN。
+    # 与 resample_weekly 后取 Close 的结果相同，只是不生成整张周线
+    if not len(close): return np.nan
+    wk = week_ids(dates)
+    wc = close[np.flatnonzero(np.r_[wk[1:] != wk[:-1], True])]
+    if len(wc) < weeks: return np.nan
+    return (wc[-1] / wc[-weeks:].mean() - 1) * 100
+
+
+class BarRing:
+    def __init__(self, root=None, days=25, capacity=1024, tz="America/New_York"):
+        self.root = root or os.environ.get("INTRADAY_DIR", os.path.join(".cache", "intraday"))
+        self.slots = days * SESSION_BARS
+        self.tz = tz
+        os.makedirs(self.root, exist_ok=True)
+        self.meta_path = os.path.join(self.root, "meta.json")
+        meta = self._read_meta()
+        if meta.get('slots') != self.slots or not all(os.path.exists(self._path(n)) for n in ('bars.f32', 'ts.i64', 'total.i64')):
+            # 第一次使用或换了环长: 重建
+            meta = {'slots': self.slots, 'capacity': 0, 'symbols': []}
+            for n in ('bars.f32', 'ts.i64', 'total.i64'):
+                open(self._path(n), 'wb').close()
+        self.symbols = meta['symbols']
+        self._pos = {s: i for i, s in enumerate(self.symbols)}
+        self.capacity = meta['capacity']
+        self._map(max(self.capacity, capacity))
+
+    # ---------- 存储 ----------
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'slots': self.slots, 'capacity': self.capacity, 'symbols': self.symbols}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _map(self, capacity):
+        # 把三个文件扩到 capacity 行 (新增部分是文件空洞，读出来是 0) 再重新映射
+        if capacity != self.capacity or not hasattr(self, 'bars'):
+            self.flush()
+            for name, width in (('bars.f32', self.slots * 5 * 4), ('ts.i64', self.slots * 8), ('total.i64', 8)):
+                os.truncate(self._path(name), capacity * width)
+            self.capacity = capacity
+            self._write_meta()
+        self.bars = np.memmap(self._path('bars.f32'), np.float32, 'r+', shape=(capacity, self.slots, 5))
+        self.ts = np.memmap(self._path('ts.i64'), np.int64, 'r+', shape=(capacity, self.slots))
+        self.total = np.memmap(self._path('total.i64'), np.int64, 'r+', shape=(capacity,))
+
+    def flush(self):
+        for a in ('bars', 'ts', 'total'):
+            if hasattr(self, a): getattr(self, a).flush()
+
+    def bytes_per_symbol(self):
+        return self.slots * (5 * 4 + 8)
+
+    def _row(self, symbol):
+        i = self._pos.get(symbol)
+        if i is None:
+            if len(self.symbols) >= self.capacity: self._map(max(2 * self.capacity, 64))
+            i = self._pos[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            self._write_meta()
+        return i
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._pos
+
+    def _order(self, i):
+        # 第 i 行环里按时间先后的槽位
+        n = int(self.total[i])
+        return np.arange(n - min(n, self.slots), n) % self.slots
+
+    def bars_of(self, symbol):
+        # (时间 int64 UTC 纳秒, OHLCV float32)，按时间升序
+        i = self._pos.get(symbol)
+        if i is None: return np.empty(0, dtype=np.int64), np.empty((0, 5), dtype=np.float32)
+        k = self._order(i)
+        return self.ts[i, k], self.bars[i, k]
+
+    def last_time(self, symbol):
+        i = self._pos.get(symbol)
+        if i is None or not self.total[i]: return None
+        return pd.Timestamp(int(self.ts[i, (self.total[i] - 1) % self.slots]), tz='UTC')
+
+    # ---------- 写入 ----------
+    def append(self, symbol, ts, values):
+        # ts 升序。已有时间的 K 线原地覆盖 (盘中最后一根在变)，更新的依次写进环；返回内容是否有变化
+        ok = ~np.isnan(values[:, 3])
+        ts, values = ts[ok], values[ok].astype(np.float32)
+        if not len(ts): return False
+        i = self._row(symbol)
+        k = self._order(i)
+        old = self.ts[i, k]
+        changed = False
+        if len(old):
+            seen = ts <= old[-1]
+            if seen.any():
+                pos = np.searchsorted(old, ts[seen])
+                pos = np.minimum(pos, len(old) - 1)
+                hit = old[pos] == ts[seen]
+                slot, v = k[pos[hit]], values[seen][hit]
+                if not np.array_equal(self.bars[i, slot], v, equal_nan=True):
+                    self.bars[i, slot] = v
+                    changed = True
+            ts, values = ts[~seen], values[~seen]
+        if len(ts):
+            ts, values = ts[-self.slots:], values[-self.slots:]
+            slot = (self.total[i] + np.arange(len(ts))) % self.slots
+            self.ts[i, slot] = ts
+            self.bars[i, slot] = values
+            self.total[i] += len(ts)
+            changed = True
+        return changed
+
+    def update(self, panel):
+        # panel: 5 分钟 K 线 (Panel.from_download 的结果，时间为 UTC)；返回有变化的代码
+        changed = []
+        for k, s in enumerate(panel.symbols):
+            a, b = panel.offsets[k], panel.offsets[k + 1]
+            if a < b and self.append(s, panel.row_dates(a, b), panel.values[a:b]): changed.append(s)
+        return changed
+
+    # ---------- 视图 ----------
+    def _stack(self, symbols):
+        # 部分股票的 K 线首尾相接: (代码, 时间, 值, 偏移, 当地日期 (纳秒), 当地分钟)
+        symbols = [s for s in symbols if s in self._pos]
+        parts = [self.bars_of(s) for s in symbols]
+        offsets = np.zeros(len(symbols) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(t) for t, _ in parts])
+        ts = np.concatenate([t for t, _ in parts]) if parts else np.empty(0, dtype=np.int64)
+        values = np.concatenate([v for _, v in parts]).astype('f8') if parts else np.empty((0, 5))
+        local = pd.DatetimeIndex(ts.view('datetime64[ns]')).tz_localize('UTC').tz_convert(self.tz).tz_localize(None)
+        day = local.normalize().values.view('i8')
+        minute = local.hour.values * 60 + local.minute.values
+        return symbols, ts, values, offsets, day, minute
+
+    def daily(self, symbols=None, since=None):
+        # 5 分钟 K 线按当地交易日合并成日线 Panel (日期为当地零点，与 yf 日线一致)；
+        # since: 只要这一天 (含) 之后的，盘中常驻模式只拿当天那根去更新日线
+        symbols, ts, values, offsets, day, _ = self._stack(self.symbols if symbols is None else symbols)
+        new = np.ones(len(day), dtype=bool)
+        new[1:] = day[1:] != day[:-1]
+        new[offsets[:-1][offsets[:-1] < len(day)]] = True
+        out = Panel(symbols, *_group_bars(values, day, new, offsets), FIELDS)
+        return out.since(since) if since is not None else out
+
+    def volume_fraction(self, symbols=None, days=20):
+        # 分时段量能: 每只股票今天已有的最后一根 (当地时间 hh:mm) 及之前的量，
+        # 在过去 days 个完整交易日里平均占全天量的比例。{代码: 比例}，没有历史的不给。
+        # 用它把"今天到此刻的量 / 20 日平均全天量"校正成同一时刻的可比值
+        symbols, ts, values, offsets, day, minute = self._stack(self.symbols if symbols is None else symbols)
+        out = {}
+        for k, s in enumerate(symbols):
+            a, b = offsets[k], offsets[k + 1]
+            if a == b: continue
+            d, m, v = day[a:b], minute[a:b], np.nan_to_num(values[a:b, 4])
+            past = d < d[-1]
+            if not past.any(): continue
+            cut = m[-1]
+            keys, inv = np.unique(d[past], return_inverse=True)
+            total = np.bincount(inv, weights=v[past])
+            early = np.bincount(inv, weights=np.where(m[past] <= cut, v[past], 0.0), minlength=len(keys))
+            use = total > 0
+            frac = (early[use] / total[use])[-days:]
+            if len(frac): out[s] = max(float(frac.mean()), MIN_FRACTION)
+        return out
@@ -0,0 +1,170 @@
+import os
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+
+from ohlcv_cache import OHLCVCache, period_start
+from panel import Panel, FIELDS
+
+# ==========================================
+# 盘中常驻模式的组件: 滚动 K 线 / 交易时段 / 本地回放
+# ==========================================
+# RollingStore 在内存里保留每只股票最近 width 根日 K，盘中每轮只合并最新几根，
+# 返回真正变了的股票，分析只重算这些。ReplayFeed 用本地已有的日 K 逐步"放出"
+# 最后几天 (可把一根日 K 拆成几个未收盘的 tick)，接口与 yf.download 相同。
+
+
+class RollingStore:
+    def __init__(self, width=120, fields=FIELDS):
+        self.width = width
+        self.fields = list(fields)
+        self.symbols = []
+        self._pos = {}
+        self.values = np.full((0, width, len(fields)), np.nan)
+        self.dates = np.zeros((0, width), dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._pos
+
+    def _grow(self, new):
+        n = len(new)
+        self.values = np.concatenate([self.values, np.full((n, self.width, len(self.fields)), np.nan)])
+        self.dates = np.concatenate([self.dates, np.zeros((n, self.width), dtype=np.int64)])
+        self.lengths = np.concatenate([self.lengths, np.zeros(n, dtype=np.int64)])
+        for s in new:
+            self._pos[s] = len(self.symbols)
+            self.symbols.append(s)
+
+    def last_date(self, symbol):
+        i = self._pos.get(symbol)
+        if i is None or not self.lengths[i]: return None
+        return pd.Timestamp(self.dates[i, -1])
+
+    def update(self, panel):
+        # panel: 新到的 K 线 (Panel)。同一天的旧 K 线被覆盖 (盘中那根在变)，更新的日期追加在后面。
+        # 返回内容有变化的代码
+        self._grow([s for s in panel.symbols if s not in self._pos])
+        w = self.width
+        changed = []
+        for k, s in enumerate(panel.symbols):
+            a, b = panel.offsets[k], panel.offsets[k + 1]
+            if a == b: continue
+            i = self._pos[s]
+            n = self.lengths[i]
+            new_d, new_v = panel.row_dates(a, b), panel.values[a:b]
+            old_d, old_v = self.dates[i, w - n:], self.values[i, w - n:]
+            keep = old_d < new_d[0]
+            d = np.concatenate([old_d[keep], new_d])[-w:]
+            v = np.concatenate([old_v[keep], new_v])[-w:]
+            if len(d) == n and np.array_equal(d, old_d) and np.array_equal(v, old_v, equal_nan=True): continue
+            self.values[i] = np.nan
+            self.values[i, w - len(d):] = v
+            self.dates[i] = 0
+            self.dates[i, w - len(d):] = d
+            self.lengths[i] = len(d)
+            changed.append(s)
+        return changed
+
+    def panel(self, symbols=None):
+        # 取出部分股票 (默认全部) 组成 Panel，交给 analyze_batch
+        symbols = [s for s in (self.symbols if symbols is None else symbols) if s in self._pos]
+        idx = np.array([self._pos[s] for s in symbols], dtype=np.int64)
+        n = self.lengths[idx]
+        mask = np.arange(self.width) >= (self.width - n)[:, None]
+        offsets = np.concatenate(([0], np.cumsum(n)))
+        return Panel(symbols, self.values[idx][mask], self.dates[idx][mask], offsets, self.fields)
+
+
+class MarketClock:
+    # hours: "09:30-16:00"，按 tz 的当地时间；weekdays: 0=周一 ... 4=周五 (节假日不处理)
+    def __init__(self, hours="09:30-16:00", tz="America/New_York", weekdays=(0, 1, 2, 3, 4)):
+        lo, hi = hours.split("-")
+        self.open = datetime.strptime(lo, "%H:%M").time()
+        self.close = datetime.strptime(hi, "%H:%M").time()
+        self.tz = ZoneInfo(tz)
+        self.weekdays = set(weekdays)
+
+    def now(self):
+        return datetime.now(self.tz)
+
+    def is_open(self, now=None):
+        now = now or self.now()
+        return now.weekday() in self.weekdays and self.open <= now.time() < self.close
+
+    def seconds_until_open(self, now=None):
+        now = now or self.now()
+        if self.is_open(now): return 0.0
+        day = now.date()
+        for k in range(8):
+            d = day + timedelta(days=k)
+            start = datetime.combine(d, self.open, tzinfo=self.tz)
+            if d.weekday() in self.weekdays and start > now: return (start - now).total_seconds()
+        return 24 * 3600.0
+
+
+class ReplayFeed:
+    # frames: {代码: 日 K DataFrame}。从倒数第 days 根开始回放，
+    # 每根拆成 steps 个 tick: 前几个 tick 是按比例走到收盘的未完成 K 线
+    def __init__(self, frames, days=5, steps=4):
+        self.frames = {s: df.sort_index() for s, df in frames.items() if len(df)}
+        self.calendar = sorted(set().union(*(df.index for df in self.frames.values()))) if self.frames else []
+        self.days = max(1, min(days, len(self.calendar)))
+        self.steps = max(1, steps)
+        self.tick = 0
+
+    @classmethod
+    def from_cache(cls, root=None, days=5, steps=4, symbols=None):
+        # 用 OHLCV 本地缓存目录里的 K 线回放
+        cache = OHLCVCache(root)
+        symbols = symbols or sorted(f[:-4] for f in os.listdir(cache.root) if f.endswith(".npy") and ".tmp" not in f)
+        frames = {s: df for s in symbols if (df := cache.read(s)) is not None}
+        return cls(frames, days, steps)
+
+    @property
+    def bar(self):
+        return len(self.calendar) - self.days + self.tick // self.steps
+
+    @property
+    def done(self):
+        return self.bar >= len(self.calendar)
+
+    @property
+    def now(self):
+        return pd.Timestamp(self.calendar[min(self.bar, len(self.calendar) - 1)])
+
+    def advance(self):
+        self.tick += 1
+        return not self.done
+
+    def symbols(self):
+        return list(self.frames)
+
+    def download(self, tickers, period=None, start=None, **kwargs):
+        if isinstance(tickers, str): tickers = tickers.split()
+        cut = self.now
+        frac = (self.tick % self.steps + 1) / self.steps
+        lo = pd.Timestamp(start) if start is not None else (period_start(period, cut) if period not in (None, 'max') else None)
+        out = {}
+        for t in tickers:
+            df = self.frames.get(t)
+            if df is None: continue
+            df = df[df.index <= cut]
+            if lo is not None: df = df[df.index >= lo]
+            if not len(df): continue
+            if df.index[-1] == cut and frac < 1:
+                # 当天还没收盘: 收盘价从开盘价按比例走向最终收盘，高低点只包住已走过的部分，量按比例
+                df = df.copy()
+                o, c = df['Open'].iloc[-1], df['Close'].iloc[-1]
+                p = o + (c - o) * frac
+                df.iloc[-1, df.columns.get_loc('Close')] = p
+                df.iloc[-1, df.columns.get_loc('High')] = min(df['High'].iloc[-1], max(o, p) * (1 + 0.01 * frac))
+                df.iloc[-1, df.columns.get_loc('Low')] = max(df['Low'].iloc[-1], min(o, p) * (1 - 0.01 * frac))
+                df.iloc[-1, df.columns.get_loc('Volume')] = round(df['Volume'].iloc[-1] * frac)
+            out[t] = df
+        if not out: return pd.DataFrame()
+        return pd.concat(out, axis=1)
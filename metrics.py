@@ -0,0 +1,168 @@
+import io
+import os
+import json
+import time
+import heapq
+import cProfile
+import pstats
+import threading
+from contextlib import contextmanager
+
+# ==========================================
+# 运行指标: 分阶段计时 / 计数 / 异常统计
+# ==========================================
+# 各模块共用模块级的 metrics 实例 (和 logging 的用法类似)，扫描结束时
+# 写出 JSON 汇总和 Prometheus textfile (node_exporter textfile collector 可直接读取)。
+
+
+class Metrics:
+    def __init__(self, run="scan"):
+        self.run = run
+        self.started = time.time()
+        self.timers = {}     # 名称 -> [次数, 总秒数, 最大秒数]
+        self.counters = {}   # 名称 -> 数值
+        self.errors = {}     # (阶段, 异常类型) -> 次数
+        self.lock = threading.Lock()
+        self.profiler = None
+
+    def reset(self, run=None):
+        with self.lock:
+            self.run = run or self.run
+            self.started = time.time()
+            self.timers, self.counters, self.errors = {}, {}, {}
+
+    # ---------- 记录 ----------
+    def observe(self, name, seconds):
+        with self.lock:
+            t = self.timers.setdefault(name, [0, 0.0, 0.0])
+            t[0] += 1; t[1] += seconds; t[2] = max(t[2], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def count(self, name, n=1):
+        if not n: return
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def error(self, stage, exc):
+        key = (stage, type(exc).__name__)
+        with self.lock: self.errors[key] = self.errors.get(key, 0) + 1
+
+    # ---------- 跨进程合并 ----------
+    def snapshot(self):
+        # 可 pickle 的当前记录，配合 merge 把进程池子进程里记的数并回主进程
+        with self.lock:
+            return ({k: list(v) for k, v in self.timers.items()}, dict(self.counters), dict(self.errors))
+
+    def merge(self, snap):
+        timers, counters, errors = snap
+        with self.lock:
+            for k, (c, s, m) in timers.items():
+                t = self.timers.setdefault(k, [0, 0.0, 0.0])
+                t[0] += c; t[1] += s; t[2] = max(t[2], m)
+            for k, n in counters.items(): self.counters[k] = self.counters.get(k, 0) + n
+            for k, n in errors.items(): self.errors[k] = self.errors.get(k, 0) + n
+
+    # ---------- 输出 ----------
+    def summary(self):
+        with self.lock:
+            return {
+                'run': self.run,
+                'started': self.started,
+                'duration': time.time() - self.started,
+                'timers': {k: {'count': c, 'seconds': round(s, 6), 'max': round(m, 6)}
+                           for k, (c, s, m) in sorted(self.timers.items())},
+                'counters': dict(sorted(self.counters.items())),
+                'errors': [{'stage': s, 'type': t, 'count': n} for (s, t), n in sorted(self.errors.items())],
+            }
+
+    def prometheus(self):
+        s = self.summary()
+        run = s['run']
+        lines = []
+
+        def metric(name, kind, help_, samples):
+            lines.append(f"# HELP {name} {help_}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lab = ",".join(f'{k}="{v}"' for k, v in [('run', run)] + labels)
+                lines.append(f"{name}{{{lab}}} {value}")
+
+        timers = s['timers'].items()
+        metric("scan_stage_seconds_total", "counter", "Total seconds spent per stage",
+               [([('stage', k)], v['seconds']) for k, v in timers])
+        metric("scan_stage_calls_total", "counter", "Number of timed calls per stage",
+               [([('stage', k)], v['count']) for k, v in timers])
+        metric("scan_stage_seconds_max", "gauge", "Slowest single call per stage",
+               [([('stage', k)], v['max']) for k, v in timers])
+        metric("scan_events_total", "counter", "Event counters (tickers, retries, filter drops)",
+               [([('name', k)], v) for k, v in s['counters'].items()])
+        metric("scan_errors_total", "counter", "Exceptions by stage and type",
+               [([('stage', e['stage']), ('type', e['type'])], e['count']) for e in s['errors']])
+        metric("scan_run_duration_seconds", "gauge", "Wall time of the last run", [([], round(s['duration'], 3))])
+        metric("scan_last_run_timestamp_seconds", "gauge", "Unix time the last run finished", [([], int(time.time()))])
+        return "\n".join(lines) + "\n"
+
+    def write(self, out_dir=None):
+        out_dir = out_dir or os.environ.get("METRICS_DIR", os.path.join(".cache", "metrics"))
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for ext, text in (("json", json.dumps(self.summary(), ensure_ascii=False, indent=1)), ("prom", self.prometheus())):
+            path = os.path.join(out_dir, f"{self.run}.{ext}")
+            tmp = path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f: f.write(text)
+            os.replace(tmp, path)
+            paths.append(path)
+        if self.profiler is not None:
+            path = os.path.join(out_dir, f"{self.run}_profile.txt")
+            with open(path, 'w', encoding='utf-8') as f: f.write(self.profiler.report())
+            paths.append(path)
+        return paths
+
+    def print_summary(self):
+        s = self.summary()
+        print(f"📈 [{s['run']}] 用时 {s['duration']:.1f}s")
+        for k, v in s['timers'].items():
+            print(f"   ⏱️ {k:<24} {v['count']:>6} 次  {v['seconds']:9.3f}s  (最长 {v['max']:.3f}s)")
+        for k, v in s['counters'].items():
+            print(f"   🔢 {k:<24} {v}")
+        for e in s['errors']:
+            print(f"   ❗ {e['stage']}/{e['type']}: {e['count']}")
+
+
+class ProfileSampler:
+    # 对逐只分析做 cProfile，只保留最慢的 n 份
+    def __init__(self, n=5, lines=25):
+        self.n = n
+        self.lines = lines
+        self.heap = []
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def run(self, key, fn, *args, **kwargs):
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        try:
+            return prof.runcall(fn, *args, **kwargs)
+        finally:
+            dt = time.perf_counter() - t0
+            with self.lock:
+                self.seq += 1
+                item = (dt, self.seq, key, prof)
+                if len(self.heap) < self.n: heapq.heappush(self.heap, item)
+                elif dt > self.heap[0][0]: heapq.heapreplace(self.heap, item)
+
+    def report(self):
+        out = io.StringIO()
+        for dt, _, key, prof in sorted(self.heap, reverse=True):
+            out.write(f"===== {key}: {dt*1000:.1f} ms =====\n")
+            pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(self.lines)
+        return out.getvalue()
+
+
+metrics = Metrics()
@@ -1,84 +1,76 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import requests
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.utils import formataddr
+import time
+import argparse
+from contextlib import nullcontext
 from datetime import datetime
+from ohlcv_cache import OHLCVCache, period_start
+from panel import Panel, CompactPanel
+from pipeline import TokenBucket, Pipeline, AdaptiveFetcher, chunked
+from parallel import ParallelAnalyzer
+from universe import UniverseCache, fetch_screener
+from metrics import metrics, ProfileSampler
+from live import RollingStore, MarketClock, ReplayFeed
+from intraday import BarRing
+from engine import Strategy, Features, register
+from notify import mailer, table, Digest
+from signal_store import SignalStore, params_of
+from records import Ambush, Compression
+from orderstats import quantiles
 
 # ==========================================
 # 0. 📧 邮件配置函数
 # ==========================================
 def send_email(content):
-    mail_user = os.environ.get("MAIL_USER")
-    mail_pass = os.environ.get("MAIL_PASS")
-    mail_to = os.environ.get("MAIL_TO")
-
-    if not mail_user or not mail_pass or not mail_to:
-        print("❌ 邮箱配置缺失，无法发送通知。")
-        return
-
-    message = MIMEText(content, 'html', 'utf-8')
-    message['From'] = formataddr(["Nano猎手", mail_user])
-    message['To'] = formataddr(["指挥官", mail_to])
-    
+    # 进程内共用一条 SMTP 连接 (常驻模式多轮报警不再重复登录)，失败重试，返回是否发出
     subject = f"🔥 纳米盘双策略战报 ({datetime.now().strftime('%H:%M')})"
-    message['Subject'] = subject
-
-    try:
-        # 默认使用 QQ 邮箱端口 465 SSL
-        smtp_obj = smtplib.SMTP_SSL('smtp.qq.com', 465) 
-        smtp_obj.login(mail_user, mail_pass)
-        smtp_obj.sendmail(mail_user, [mail_to], message.as_string())
-        print("✅ 邮件已发送！")
-        smtp_obj.quit()
-    except Exception as e:
-        print(f"❌ 邮件发送失败: {e}")
+    ok = mailer().send(subject, content, sender="Nano猎手", recipient="指挥官")
+    if ok: print("✅ 邮件已发送！")
+    return ok
 
 # ==========================================
 # 1. 数据源：NASDAQ 官方
 # ==========================================
+def is_nano(r, min_p=0.2, max_p=5.0):
+    # 只要纯字母，长度<=5，剔除权证
+    return (r['lastsale'] is not None and min_p <= r['lastsale'] <= max_p
+            and r['symbol'].isalpha() and len(r['symbol']) <= 5)
+
 def get_nasdaq_tickers(min_p=0.2, max_p=5.0): # 放宽到 $5 以防漏掉好票
     print(f"🌊 [Step 1] 从 NASDAQ 拉取 ${min_p}-${max_p} 名单...")
-    url = "https://api.nasdaq.com/api/screener/stocks?tableonly=true&limit=25&offset=0&download=true"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Origin': 'https://www.nasdaq.com',
-        'Referer': 'https://www.nasdaq.com/'
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, timeout=20)
-        data_json = response.json()
-        rows = data_json['data']['rows']
-        df = pd.DataFrame(rows)
-        
-        df['lastsale'] = df['lastsale'].astype(str).str.replace('$', '').str.replace(',', '')
-        df['lastsale'] = pd.to_numeric(df['lastsale'], errors='coerce')
-        
-        mask = (df['lastsale'] >= min_p) & (df['lastsale'] <= max_p)
-        nano_df = df[mask]
-        
-        def clean_symbol(s):
-            s = str(s).strip()
-            # 只要纯字母，长度<=5，剔除权证
-            return s if (s.isalpha() and len(s) <= 5) else None
-            
-        ticker_list = nano_df['symbol'].apply(clean_symbol).dropna().unique().tolist()
-        print(f"✅ 获取到 {len(ticker_list)} 只有效标的")
-        return ticker_list
-    except Exception as e:
-        print(f"❌ NASDAQ 数据获取失败: {e}")
-        # 如果接口挂了，用一些经典妖股保底，证明程序还能跑
+    # 名单带 TTL 缓存在本地，过期才重拉；重拉失败沿用上次成功的名单
+    with metrics.timer("universe"):
+        rows = UniverseCache().load(lambda: fetch_screener(timeout=20))
+    if not rows:
+        print("❌ NASDAQ 数据获取失败")
+        # 如果接口挂了又没有缓存，用一些经典妖股保底，证明程序还能跑
         return ["MULN", "FFIE", "HOLO", "GROM", "SNDL", "CEI", "KSCP"]
+    
+    ticker_list = [r['symbol'] for r in rows if is_nano(r, min_p, max_p)]
+    metrics.count("tickers.screener", len(rows))
+    metrics.count("drop.universe.filter", len(rows) - len(ticker_list))
+    print(f"✅ 获取到 {len(ticker_list)} 只有效标的")
+    return ticker_list
+
+# 全局请求限速 (令牌桶)，与 wyckoff_scan 使用相同的环境变量
+limiter = TokenBucket(rate=float(os.environ.get("YF_RATE", 1.0)), capacity=float(os.environ.get("YF_BURST", 2)))
+
+def download_batch(tickers, period=None, start=None, interval="1d"):
+    # yfinance 较重，第一次下载时才 import。盘中 K 线保留时区 (转成 UTC)，日线是当地日期
+    import yfinance as yf
+    metrics.observe("download.rate_wait", limiter.acquire())
+    with metrics.timer("download.attempt"):
+        data = yf.download(tickers, period=period, start=start, interval=interval, group_by='ticker',
+                           threads=True, progress=False, auto_adjust=True, ignore_tz=interval[-1] not in "mh")
+    if data is None or data.empty: metrics.count("download.empty")
+    return data
 
 # ==========================================
 # 2. 核心分析逻辑 (融合版)
 # ==========================================
 class NanoAnalyzer:
-    def __init__(self):
+    def __init__(self, **params):
         self.atr_period = 10
         # 策略 A (埋伏) 参数
         self.box_days = 15
@@ -89,6 +81,13 @@ class NanoAnalyzer:
         self.min_rvol = 2.0
         self.max_change = 8.0
         self.min_change = -3.0
+        # 盘中分时段量能 {代码: 此刻预期已完成的全天量比例} (intraday.BarRing.volume_fraction)；
+        # 设置后 RVol 按同一时刻比较，不设 (收盘后扫描) 与原来相同
+        self.volume_fraction = None
+        # 参数扫描 (sweep.py) 时覆盖默认值
+        for k, v in params.items():
+            if not hasattr(self, k): raise ValueError(f"未知参数: {k}")
+            setattr(self, k, v)
 
     def calculate_atr(self, df):
         high = df['High']
@@ -112,10 +111,10 @@ class NanoAnalyzer:
         results = {}
 
         # --- 🟢 策略 A: 埋伏 (Deep + Quiet) ---
-        max_90d_robust = df['High'].iloc[-90:].quantile(0.95)
+        max_90d_robust, = quantiles(df['High'].to_numpy()[-90:], 0.95)
         is_deep = (close_p / max_90d_robust) < 0.75
         
-        vol_baseline = df['Volume'].iloc[-90:].quantile(0.20)
+        vol_baseline, = quantiles(df['Volume'].to_numpy()[-90:], 0.20)
         vol_5d = df['Volume'].iloc[-5:].mean()
         is_quiet = (vol_5d < vol_baseline * 3.0)
         
@@ -124,111 +123,407 @@ class NanoAnalyzer:
         is_elastic = volatility > req_vol
 
         if is_deep and is_quiet and is_elastic:
-            box_high = df['High'].iloc[-self.box_days:].quantile(0.95)
+            box_high, = quantiles(df['High'].to_numpy()[-self.box_days:], 0.95)
             trigger = round(box_high + self.trigger_buffer * atr, 2)
             if trigger / close_p < 1.30:
                 stop = round(df['Low'].iloc[-5:].min() - 0.2 * atr, 2)
                 rr_ratio = (trigger - stop) / trigger
                 if 0 < rr_ratio < 0.20:
-                    results['Ambush'] = {
-                        "Trigger": trigger, "Stop": stop, "Risk": f"{rr_ratio*100:.1f}%", "Setup": "Deep+Quiet"
-                    }
+                    results['Ambush'] = Ambush(trigger=trigger, stop=stop, rr=rr_ratio)
 
         # --- 🔴 策略 B: 蓄力 (Volume Squeeze) ---
         avg_vol_20d = df['Volume'].iloc[-21:-1].mean()
         if avg_vol_20d > 30000: 
             r_vol = vol / avg_vol_20d
+            if self.volume_fraction: r_vol /= self.volume_fraction.get(symbol, 1.0)
             open_p = float(curr['Open'])
             if open_p > 0:
                 change_pct = (close_p - open_p) / open_p * 100
                 if r_vol > self.min_rvol and self.min_change < change_pct < self.max_change:
                     score = r_vol / (abs(change_pct) + 0.5)
-                    results['Compression'] = {
-                        "RVol": round(r_vol, 1), "Change%": f"{change_pct:.2f}%", "Score": round(score, 2), "Setup": "Vol Squeeze"
-                    }
+                    results['Compression'] = Compression(rvol=round(r_vol, 1), change=change_pct, score=round(score, 2))
 
         if not results: return None
         return {symbol: results}
 
+    def analyze_batch(self, batch_data, feats=None):
+        # 批量版 analyze: 整批一次数组运算，结果与逐只调用 analyze 相同
+        # 返回 {symbol: results}，只包含有信号的股票；feats 为多策略引擎共享的指标缓存
+        feats = feats or Features(batch_data)
+        syms, x, n = feats.tails(90)
+        if not syms: return {}
+        o, h, l, c, v = (x[:, :, k] for k in range(5))
+        close_p, vol, open_p = c[:, -1], v[:, -1], o[:, -1]
+
+        atr = feats.memo(('nano.atr', self.atr_period), lambda: feats.true_range(90)[:, -self.atr_period:].mean(axis=1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ok = n >= 60
+            metrics.count("drop.nano.short_history", int((~ok).sum()))
+            metrics.count("drop.nano.bad_atr", int((ok & ~(atr > 0)).sum()))
+            ok &= atr > 0
+
+            # 与参数无关的部分记在 feats 里，参数扫描时各组参数共用
+            def base():
+                is_deep = (close_p / feats.quantile(1, 0.95, 90)) < 0.75
+                is_quiet = v[:, -5:].mean(axis=1) < feats.quantile(4, 0.20, 90) * 3.0
+                avg_vol_20d = v[:, -21:-1].mean(axis=1)
+                return is_deep & is_quiet, l[:, -5:].min(axis=1), avg_vol_20d, vol / avg_vol_20d, (close_p - open_p) / open_p * 100
+            deep_quiet, low_5d, avg_vol_20d, r_vol, change_pct = feats.memo('nano.base', base)
+            if self.volume_fraction:
+                r_vol = r_vol / np.array([self.volume_fraction.get(s, 1.0) for s in syms])
+
+            # --- 🟢 策略 A: 埋伏 (Deep + Quiet) ---
+            req_vol = np.where(close_p < 2.0, self.min_vol_low, self.min_vol_high)
+            is_elastic = (atr / close_p) > req_vol
+            ambush = ok & deep_quiet & is_elastic
+            box_high = feats.quantile(1, 0.95, 90, lo=-self.box_days)
+
+            # --- 🔴 策略 B: 蓄力 (Volume Squeeze) ---
+            compression = (ok & (avg_vol_20d > 30000) & (open_p > 0) & (r_vol > self.min_rvol)
+                           & (change_pct > self.min_change) & (change_pct < self.max_change))
+
+        out = {}
+        # 命中的只是少数，取整和风控比例仍按标量算，保证和逐只版本逐位一致；
+        # 输出顺序与输入顺序相同
+        for i in np.flatnonzero(ambush | compression):
+            results = {}
+            if ambush[i]:
+                a = atr[i]
+                trigger = round(box_high[i] + self.trigger_buffer * a, 2)
+                if trigger / close_p[i] < 1.30:
+                    stop = round(low_5d[i] - 0.2 * a, 2)
+                    rr_ratio = (trigger - stop) / trigger
+                    if 0 < rr_ratio < 0.20:
+                        results['Ambush'] = Ambush(trigger=trigger, stop=stop, rr=rr_ratio)
+            if compression[i]:
+                score = r_vol[i] / (abs(change_pct[i]) + 0.5)
+                results['Compression'] = Compression(rvol=round(r_vol[i], 1), change=change_pct[i], score=round(score, 2))
+            if results: out[syms[i]] = results
+        for k in ('Ambush', 'Compression'):
+            metrics.count(f"signals.{k.lower()}", sum(k in r for r in out.values()))
+        return out
+
+class NanoSetup(Strategy):
+    # 多策略引擎插件: 两个形态共用一次 analyze_batch (记在 feats 里)
+    family = 'nano'
+    period = '3mo'
+    setup = None
+
+    def universe(self, row):
+        return is_nano(row)
+
+    def scan(self, panel, feats):
+        hits = feats.memo('nano', lambda: NanoAnalyzer().analyze_batch(panel, feats))
+        out = []
+        for sym, res in hits.items():
+            if self.setup not in res: continue
+            r = res[self.setup]
+            r.symbol, r.close = sym, round(float(panel.column(sym, 'Close').iloc[-1]), 2)
+            out.append(r)
+        return out
+
+    def notify(self, items):
+        final_msg = build_report([r for r in items if r['Signal'] == 'Ambush'],
+                                 [r for r in items if r['Signal'] == 'Compression'])
+        if final_msg: send_email(final_msg)
+
+@register
+class NanoAmbush(NanoSetup):
+    name = 'nano.ambush'
+    setup = 'Ambush'
+
+@register
+class NanoCompression(NanoSetup):
+    name = 'nano.compression'
+    setup = 'Compression'
+
 # ==========================================
-# 3. 主程序
+# 3. 汇总与邮件内容
 # ==========================================
-if __name__ == "__main__":
+def collect(hits, panel, ambush_list, compression_list):
+    for sym, res_data in hits.items():
+        try:
+            close_price = round(float(panel.column(sym, 'Close').iloc[-1]), 2)
+            
+            if 'Ambush' in res_data:
+                item = res_data['Ambush']
+                item['Symbol'] = sym
+                item['Close'] = close_price
+                ambush_list.append(item)
+                
+            if 'Compression' in res_data:
+                item = res_data['Compression']
+                item['Symbol'] = sym
+                item['Close'] = close_price
+                compression_list.append(item)
+        except Exception as e:
+            metrics.error("report", e); continue
+
+AMBUSH_COLUMNS = [
+    ("代码", lambda r: f"<b>{r['Symbol']}</b>"), ("现价", lambda r: r['Close']),
+    ("Trigger", lambda r: f"<b>{r['Trigger']}</b>"), ("止损", lambda r: r['Stop']), ("盈亏比", lambda r: r['Risk']),
+]
+COMPRESSION_COLUMNS = [
+    ("代码", lambda r: f"<b>{r['Symbol']}</b>"), ("现价", lambda r: r['Close']),
+    ("量比(RVol)", lambda r: r['RVol'], "color:red"), ("涨幅", lambda r: r['Change%']),
+    ("压盘分", lambda r: f"<b>{r['Score']}</b>"),
+]
+
+def build_report(ambush_list, compression_list):
+    # 返回邮件 HTML；两个列表都为空时返回 None
+    if not ambush_list and not compression_list: return None
+    parts = [f"<h3>🕒 扫描时间: {datetime.now().strftime('%H:%M')} (UTC)</h3>"]
+    if ambush_list:
+        parts.append("<h4>🟢 埋伏机会 (建议挂 Trigger 单)</h4>")
+        parts.append(table(AMBUSH_COLUMNS, sorted(ambush_list, key=lambda x: x['Trigger']/x['Close']),
+                           header_style="background-color:#e8f5e9;"))
+    if compression_list:
+        # 只发前15名，防止邮件太长
+        parts.append("<h4>🔴 蓄力异动 (主力正在压盘)</h4>")
+        parts.append(table(COMPRESSION_COLUMNS, sorted(compression_list, key=lambda x: x['Score'], reverse=True)[:15],
+                           header_style="background-color:#ffebee;"))
+    return "".join(parts)
+
+# ==========================================
+# 4. 主程序: 单次扫描 (定时任务) / 盘中常驻 (--daemon)
+# ==========================================
+def deliver(digest, items):
+    # --- 发送逻辑 (单次扫描和常驻模式共用): 同一信号 NOTIFY_DEDUP 秒内只发一次，
+    # 两封邮件至少间隔 NOTIFY_EVERY 秒 (期间攒成汇总)。返回这次发出 / 待发 / 丢掉的条数 ---
+    digest.add(items)
+    if not mailer().configured:
+        # 没有邮箱配置就没有发出去的那一天，不攒 pending (否则常驻模式每轮都在增长)
+        n = digest.drop()
+        if n: print(f"📭 邮箱未配置，{n} 条新信号不进入汇总")
+        return n
+    n = len(digest.pending)
+    if digest.due():
+        items = digest.pending
+        final_msg = build_report([r for r in items if r['Signal'] == 'Ambush'],
+                                 [r for r in items if r['Signal'] == 'Compression'])
+        print(f"🚀 发现机会，正在发送邮件 ({n} 条)...")
+        if send_email(final_msg): digest.mark_sent()
+    elif n:
+        print(f"⏳ {n} 条新信号等待下一封汇总邮件")
+    return n
+
+def run_scan():
     print(f"⚔️ 终极纳米盘扫描器 | {datetime.now().strftime('%H:%M')}")
+    metrics.reset("nano")
+    # PROFILE_SLOWEST=N: 逐只 cProfile 分析并保留最慢的 N 份
+    profile_n = int(os.environ.get("PROFILE_SLOWEST", 0))
+    metrics.profiler = ProfileSampler(profile_n) if profile_n > 0 else None
     
     tickers = get_nasdaq_tickers(min_p=0.2, max_p=5.0)
-    analyzer = NanoAnalyzer()
+    # OHLCV_CACHE=0 可关闭本地缓存；开启时每轮只补最新几根 K 线
+    cache = OHLCVCache() if os.environ.get("OHLCV_CACHE", "1") != "0" else None
     
     ambush_list = []
     compression_list = []
     
-    # 每次处理 50 个，避免内存爆炸
+    # 批大小从 50 起按请求成败自动调整；失败批次二分，单只失败的退避后重试，连续失败熔断
+    fetcher = AdaptiveFetcher(download_batch, size=int(os.environ.get("BATCH_SIZE", 50)),
+                              max_size=int(os.environ.get("MAX_BATCH_SIZE", 200)))
+
+    def fetch(batch):
+        if cache is not None: return cache.fetch(batch, "3mo", fetcher.download)
+        return fetcher.download(batch, period="3mo")
+
+    def analyze(batch_data):
+        try:
+            with metrics.timer("analyze.nano"):
+                if metrics.profiler is not None:
+                    # 剖析模式走逐只分析，便于定位拖慢的个股
+                    hits, single = {}, NanoAnalyzer()
+                    for sym, df in batch_data.items():
+                        hits.update(metrics.profiler.run(sym, single.analyze, sym, df) or {})
+                else:
+                    hits = analyzer.analyze_batch(batch_data)
+            collect(hits, batch_data, ambush_list, compression_list)
+        except Exception as e:
+            metrics.error("analyze", e)
+
+    # 分批下载避免内存爆炸；在途批次数有上限，下载与分析并行。
+    # COMPACT=1: 下载仍分批，K 线转成 float32 的 CompactPanel 累积，全市场只分析一次
+    compact = os.environ.get("COMPACT", "0") == "1"
+    parts = []
+    downloaded = 0
+    metrics.count("tickers.requested", len(tickers))
+    # ANALYZE_WORKERS>1 时用多进程分析 (0 = CPU 核数)；中途出错进程池也会被收掉
+    workers = int(os.environ.get("ANALYZE_WORKERS", 1))
+    with nullcontext(NanoAnalyzer()) if workers == 1 else ParallelAnalyzer(NanoAnalyzer, workers) as analyzer:
+        for batch, data in fetcher.run(tickers, fetch, workers=int(os.environ.get("DOWNLOAD_WORKERS", 4))):
+            print(f"   进度: {downloaded}/{len(tickers)}...", end="\r")
+
+            try:
+                with metrics.timer("normalize"):
+                    batch_data = Panel.from_download(data, batch, compact=compact)
+                downloaded += len(batch_data)
+                metrics.count("tickers.downloaded", len(batch_data))
+            except Exception as e:
+                metrics.error("normalize", e); continue
+            if compact: parts.append(batch_data)
+            else: analyze(batch_data)
+        if compact: analyze(CompactPanel.concat(parts))
+    print()
+    metrics.count("drop.no_data", len(tickers) - downloaded)
+    fetcher.report(downloaded)
+    if cache is not None:
+        for k, n in cache.stats.items(): metrics.count(f"cache.{k}", n)
+
+    # --- 信号入库，只报告相对上一次运行新出现的 (REPORT_ALL=1 全部报告) ---
+    if os.environ.get("SIGNAL_STORE", "1") != "0":
+        try:
+            store = SignalStore()
+            run_id = store.record("nano", ambush_list + compression_list, params=params_of(NanoAnalyzer()))
+            new = store.new_since_last("nano", run_id)
+            store.close()
+            metrics.count("signals.new", len(new))
+            print(f"🆕 新信号 {len(new)} / {len(ambush_list) + len(compression_list)}")
+            if os.environ.get("REPORT_ALL", "0") != "1":
+                ambush_list = [r for r in ambush_list if (r['Symbol'], r['Signal']) in new]
+                compression_list = [r for r in compression_list if (r['Symbol'], r['Signal']) in new]
+        except Exception as e:
+            metrics.error("signal_store", e)
+
+    if not deliver(Digest("nano"), ambush_list + compression_list):
+        print("🛡️ 本次扫描未发现新的 [Deep+Quiet] 或 [Compression] 标的。")
+
+    metrics.print_summary()
+    print(f"📝 指标已写入: {', '.join(metrics.write())}")
+
+def run_daemon(args):
+    # 常驻模式: 名单和 3 个月历史只在启动 (和每个新交易日) 加载一次，
+    # 之后每轮只拉最近几根 K 线，只重算有变化的股票，只对新出现的信号报警。
+    # --intraday: 每轮拉的是 5 分钟 K 线 (写进 BarRing)，当天的日 K 和分时段量能都从它算，不再另拉日线
+    metrics.reset("nano_daemon")
+    feed = ReplayFeed.from_cache(args.replay, days=args.replay_days, steps=args.replay_steps) if args.replay else None
+    clock = MarketClock(args.hours, args.tz)
+    store = RollingStore(width=120)
+    ring = BarRing(args.intraday_dir, tz=args.tz) if args.intraday and feed is None else None
+    analyzer = NanoAnalyzer()
+    digest = Digest("nano") if feed is None else None
+    cache = OHLCVCache() if feed is None and os.environ.get("OHLCV_CACHE", "1") != "0" else None
+    pipe = Pipeline(lambda job: fetch_job(*job), workers=int(os.environ.get("DOWNLOAD_WORKERS", 4)))
     chunk_size = 50
-    for i in range(0, len(tickers), chunk_size):
-        batch = tickers[i:i+chunk_size]
-        print(f"   进度: {i}/{len(tickers)}...", end="\r")
-        
+
+    def fetch_job(batch, period, start, interval="1d"):
         try:
-            data = yf.download(batch, period="3mo", interval="1d", group_by='ticker', threads=True, progress=False)
-            if len(batch) == 1: batch_data = {batch[0]: data}
-            else: batch_data = {t: data[t] for t in batch if t in data.columns.get_level_values(0)}
-            
-            for sym, df in batch_data.items():
-                try:
-                    res = analyzer.analyze(sym, df)
-                    if res:
-                        res_data = res[sym]
-                        close_price = round(df['Close'].iloc[-1], 2)
-                        
-                        if 'Ambush' in res_data:
-                            item = res_data['Ambush']
-                            item['Symbol'] = sym
-                            item['Close'] = close_price
-                            ambush_list.append(item)
-                            
-                        if 'Compression' in res_data:
-                            item = res_data['Compression']
-                            item['Symbol'] = sym
-                            item['Close'] = close_price
-                            compression_list.append(item)
-                except: continue
-        except: continue
-
-    # ==========================================
-    # 4. 生成邮件内容
-    # ==========================================
-    msg_lines = []
-    has_content = False
-    
-    msg_lines.append(f"<h3>🕒 扫描时间: {datetime.now().strftime('%H:%M')} (UTC)</h3>")
-    
-    # --- 生成埋伏表格 ---
-    if ambush_list:
-        has_content = True
-        ambush_list.sort(key=lambda x: x['Trigger']/x['Close'])
-        msg_lines.append("<h4>🟢 埋伏机会 (建议挂 Trigger 单)</h4>")
-        msg_lines.append("<table border='1' cellpadding='4' cellspacing='0' style='border-collapse: collapse; width: 100%;'>")
-        msg_lines.append("<tr style='background-color:#e8f5e9;'><th>代码</th><th>现价</th><th>Trigger</th><th>止损</th><th>盈亏比</th></tr>")
-        for item in ambush_list:
-            msg_lines.append(f"<tr><td><b>{item['Symbol']}</b></td><td>{item['Close']}</td><td><b>{item['Trigger']}</b></td><td>{item['Stop']}</td><td>{item['Risk']}</td></tr>")
-        msg_lines.append("</table>")
-    
-    # --- 生成蓄力表格 ---
-    if compression_list:
-        has_content = True
-        compression_list.sort(key=lambda x: x['Score'], reverse=True)
-        msg_lines.append("<h4>🔴 蓄力异动 (主力正在压盘)</h4>")
-        msg_lines.append("<table border='1' cellpadding='4' cellspacing='0' style='border-collapse: collapse; width: 100%;'>")
-        msg_lines.append("<tr style='background-color:#ffebee;'><th>代码</th><th>现价</th><th>量比(RVol)</th><th>涨幅</th><th>压盘分</th></tr>")
-        for item in compression_list[:15]: # 只发前15名，防止邮件太长
-            msg_lines.append(f"<tr><td><b>{item['Symbol']}</b></td><td>{item['Close']}</td><td style='color:red'>{item['RVol']}</td><td>{item['Change%']}</td><td><b>{item['Score']}</b></td></tr>")
-        msg_lines.append("</table>")
-
-    # --- 发送逻辑 ---
-    if has_content:
-        final_msg = "".join(msg_lines)
-        print("🚀 发现机会，正在发送邮件...")
-        send_email(final_msg)
-    else:
-        print("🛡️ 本次扫描未发现符合 [Deep+Quiet] 或 [Compression] 的标的。")
-   
+            if feed is not None: return feed.download(batch, period=period, start=start)
+            if interval != "1d": return download_batch(batch, period=period, start=start, interval=interval)
+            if cache is not None and period: return cache.fetch(batch, period, download_batch)
+            return download_batch(batch, period=period, start=start)
+        except Exception as e:
+            metrics.error("download", e)
+            return None
+
+    def load(batches, sink=store.update):
+        # batches: [(代码列表, period, start[, interval])]；交给 sink 合并，返回有变化的代码
+        changed = []
+        for (batch, *_), data in pipe.run(batches):
+            with metrics.timer("normalize"):
+                changed += sink(Panel.from_download(data, batch))
+        return changed
+
+    if args.intraday and feed is not None:
+        print("⚠️ 回放模式没有 5 分钟数据，忽略 --intraday")
+    if ring is not None:
+        print(f"🧮 5 分钟环形缓冲: {ring.root}, 每只 {ring.slots} 根 / {ring.bytes_per_symbol() / 1024:.0f} KiB")
+    if feed is not None:
+        print(f"🎞️ 回放模式: {len(feed.symbols())} 只, 最后 {feed.days} 天, 每天 {feed.steps} 个 tick")
+    tickers, day, alerted, ticks, loaded = [], None, set(), 0, []
+    while args.max_ticks <= 0 or ticks < args.max_ticks:
+        if feed is None and not clock.is_open():
+            wait = clock.seconds_until_open()
+            print(f"💤 休市中，{wait/60:.0f} 分钟后开盘")
+            time.sleep(min(wait, 3600))
+            continue
+        today = feed.now.date() if feed is not None else clock.now().date()
+        t0 = time.perf_counter()
+        if today != day:
+            # 新的交易日: 刷新名单，补齐新代码的历史，清空已报警记录
+            tickers = feed.symbols() if feed is not None else get_nasdaq_tickers(min_p=0.2, max_p=5.0)
+            new = [t for t in tickers if t not in store]
+            with metrics.timer("daemon.history"):
+                # 刚补齐历史的这一轮也要分析，不等它们的 K 线再变
+                loaded = load([(b, "3mo", None) for b in chunked(new, chunk_size)])
+            day, alerted = today, set()
+            print(f"📅 {today}: 跟踪 {len(store)} 只 (新增 {len(new)})")
+
+        # 只要最近几根: 从这批里最早的"最后一根"开始拉 (覆盖盘中那根)
+        jobs = []
+        for b in chunked([t for t in tickers if t in store], chunk_size):
+            if ring is not None:
+                # 环里没有的先补一个月 (分时段量能要过去 20 天的分布)
+                last = min((ring.last_time(t) for t in b if t in ring), default=None) if all(t in ring for t in b) else None
+                jobs.append((b, None, last.strftime('%Y-%m-%d'), "5m") if last is not None else (b, "1mo", None, "5m"))
+                continue
+            last = min((store.last_date(t) for t in b if store.last_date(t) is not None), default=None)
+            jobs.append((b, None, last.strftime('%Y-%m-%d')) if last is not None else (b, "5d", None))
+        with metrics.timer("daemon.fetch"):
+            if ring is None:
+                changed = load(jobs)
+            else:
+                # 5 分钟 K 线进环，再由环合并出当天的日 K 更新滚动日线
+                moved = load(jobs, sink=ring.update)
+                ring.flush()
+                changed = store.update(ring.daily(moved, since=today)) if moved else []
+                # 只有变了的会重算，分时段量能也只算这些
+                analyzer.volume_fraction = ring.volume_fraction(changed)
+        changed, loaded = list(dict.fromkeys(loaded + changed)), []
+        metrics.count("daemon.changed", len(changed))
+
+        ambush_list, compression_list = [], []
+        if changed:
+            # 滚动存储里留了 120 根，分析只看单次扫描同样的 3 个月窗口，两种模式同一天的结果一致
+            panel = store.panel(changed).since(period_start("3mo", today))
+            with metrics.timer("analyze.nano"):
+                hits = analyzer.analyze_batch(panel)
+            fresh = {s: {k: v for k, v in r.items() if (s, k) not in alerted} for s, r in hits.items()}
+            fresh = {s: r for s, r in fresh.items() if r}
+            alerted.update((s, k) for s, r in fresh.items() for k in r)
+            collect(fresh, panel, ambush_list, compression_list)
+        ticks += 1
+        metrics.count("daemon.ticks")
+        metrics.observe("daemon.tick", time.perf_counter() - t0)
+        stamp = feed.now.strftime('%Y-%m-%d') + f" #{feed.tick % feed.steps + 1}" if feed is not None else datetime.now().strftime('%H:%M')
+        print(f"⏱️ [{stamp}] 变化 {len(changed)} 只, 新信号 埋伏 {len(ambush_list)} / 蓄力 {len(compression_list)}")
+
+        if ambush_list or compression_list:
+            metrics.count("daemon.alerts", len(ambush_list) + len(compression_list))
+            for item in ambush_list + compression_list:
+                print(f"   🎯 {item['Symbol']} {item['Setup']} @ {item['Close']}")
+        # 回放只打印，不发邮件；实盘和单次扫描走同一个 Digest (去重、限频)，攒着的汇总到点就发
+        if digest is not None: deliver(digest, ambush_list + compression_list)
+        metrics.write(args.metrics_dir)
+
+        if feed is not None:
+            if not feed.advance(): break
+        else:
+            time.sleep(args.interval)
+    metrics.print_summary()
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="纳米盘雷达")
+    p.add_argument("--daemon", action="store_true", help="盘中常驻，按 --interval 轮询")
+    p.add_argument("--interval", type=float, default=float(os.environ.get("MONITOR_INTERVAL", 300)),
+                   help="常驻模式两轮之间的秒数")
+    p.add_argument("--hours", default=os.environ.get("MARKET_HOURS", "09:30-16:00"), help="交易时段 (当地时间)")
+    p.add_argument("--tz", default=os.environ.get("MARKET_TZ", "America/New_York"))
+    p.add_argument("--max-ticks", type=int, default=0, help="跑满这么多轮后退出 (0 = 不限)")
+    p.add_argument("--replay", metavar="CACHE_DIR", help="用本地 OHLCV 缓存目录回放，代替实时下载")
+    p.add_argument("--replay-days", type=int, default=5)
+    p.add_argument("--replay-steps", type=int, default=4, help="回放时每根日 K 拆成几个 tick")
+    p.add_argument("--intraday", action="store_true", default=os.environ.get("INTRADAY", "0") == "1",
+                   help="常驻模式改拉 5 分钟 K 线，RVol 按分时段量能校正")
+    p.add_argument("--intraday-dir", default=None, help="5 分钟环形缓冲目录 (默认 INTRADAY_DIR 或 .cache/intraday)")
+    p.add_argument("--metrics-dir", default=os.environ.get("METRICS_DIR"))
+    return p.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.daemon or args.replay: run_daemon(args)
+    else: run_scan()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import atexit
+import smtplib
+import threading
+from collections import deque
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+from metrics import metrics
+
+# ==========================================
+# 通知: 模板 / SMTP 发送队列 / 去重与汇总
+# ==========================================
+# - table(): 一次拼出整张 HTML 表格 (列定义 + 行)，不再逐行 += 字符串
+# - Mailer: 一个进程共用一条 SMTP 连接 (登录一次)，消息先进队列，flush 时逐封发送；
+#   连接断开自动重连，失败按指数退避重试，最终失败的返回 False 并计入 email.failed
+# - Digest: 按 (代码, 信号) 在 dedup 秒内只发一次；两封邮件至少间隔 every 秒，
+#   期间的新信号攒在 pending 里 (落盘)，下一次到点一起发；pending 最多留 max_pending 条 (丢最旧的)，
+#   没有可用的邮箱配置时调用方用 drop() 清掉，常驻模式下不会每轮越攒越多
+# SMTP_HOST / SMTP_PORT / SMTP_SSL 可覆盖默认服务器 (本地测试用 bench.smtp_server)。
+
+
+# ---------- 模板 ----------
+TABLE_STYLE = "border-collapse: collapse; width: 100%;"
+
+
+def table(columns, rows, header_style="", row_style=None, style=TABLE_STYLE, cellpadding=4):
+    # columns: [(表头, 取值函数 row -> str[, 单元格 style 或 row -> style])]；row_style: row -> <tr> 的 style
+    out = [f"<table border='1' cellpadding='{cellpadding}' cellspacing='0' style='{style}'>",
+           f"<tr style='{header_style}'>" if header_style else "<tr>",
+           *(f"<th>{c[0]}</th>" for c in columns), "</tr>"]
+    for r in rows:
+        out.append(f"<tr style='{row_style(r)}'>" if row_style else "<tr>")
+        for c in columns:
+            st = c[2](r) if len(c) > 2 and callable(c[2]) else (c[2] if len(c) > 2 else None)
+            out.append(f"<td style='{st}'>{c[1](r)}</td>" if st else f"<td>{c[1](r)}</td>")
+        out.append("</tr>")
+    out.append("</table>")
+    return "".join(out)
+
+
+# ---------- SMTP ----------
+def smtp_host(user):
+    # 按发件邮箱选服务器，默认 QQ
+    for domain in ('qq.com', '163.com', 'gmail.com'):
+        if user and domain in user: return f"smtp.{domain}"
+    return 'smtp.qq.com'
+
+
+class Mailer:
+    def __init__(self, user=None, password=None, to=None, host=None, port=None, ssl=None, timeout=30,
+                 retries=3, backoff=1.0):
+        self.user = user or os.environ.get("MAIL_USER")
+        self.password = password or os.environ.get("MAIL_PASS")
+        self.to = to or os.environ.get("MAIL_TO")
+        self.host = host or os.environ.get("SMTP_HOST") or smtp_host(self.user)
+        self.port = int(port or os.environ.get("SMTP_PORT", 465))
+        self.ssl = ssl if ssl is not None else os.environ.get("SMTP_SSL", "1") != "0"
+        self.timeout, self.retries, self.backoff = timeout, retries, backoff
+        self.conn = None
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.stats = {'connects': 0, 'sent': 0, 'failed': 0, 'retries': 0}
+
+    @property
+    def configured(self):
+        return bool(self.user and self.password and self.to)
+
+    def _session(self):
+        if self.conn is None:
+            cls = smtplib.SMTP_SSL if self.ssl else smtplib.SMTP
+            conn = cls(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.login(self.user, self.password)
+            except Exception:
+                conn.close(); raise
+            self.conn = conn
+            self.stats['connects'] += 1
+            metrics.count("email.connect")
+        return self.conn
+
+    def _drop(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = None
+
+    def _reset(self):
+        try:
+            if self.conn is not None: self.conn.rset()
+        except Exception:
+            self._drop()
+
+    def enqueue(self, subject, html, sender="Scanner", recipient="Commander"):
+        msg = MIMEText(html, 'html', 'utf-8')
+        msg['From'] = formataddr([sender, self.user])
+        msg['To'] = formataddr([recipient, self.to])
+        msg['Subject'] = subject
+        with self.lock: self.queue.append(msg)
+
+    def flush(self):
+        # 发送队列里的全部消息，返回是否全部成功
+        ok = True
+        with self.lock:
+            while self.queue:
+                msg = self.queue.popleft()
+                for attempt in range(self.retries):
+                    if attempt:
+                        self.stats['retries'] += 1
+                        metrics.count("email.retry")
+                        time.sleep(self.backoff * 2 ** (attempt - 1))
+                    try:
+                        with metrics.timer("email"):
+                            self._session().sendmail(self.user, [self.to], msg.as_string())
+                        self.stats['sent'] += 1
+                        metrics.count("email.sent")
+                        break
+                    except smtplib.SMTPResponseException as e:
+                        # 服务器拒收这一封 (如 451 暂时失败)，连接还能用
+                        self._reset()
+                        metrics.error("email", e)
+                        err = e
+                    except Exception as e:
+                        # 连接可能已失效: 丢掉，下一次重连
+                        self._drop()
+                        metrics.error("email", e)
+                        err = e
+                else:
+                    ok = False
+                    self.stats['failed'] += 1
+                    metrics.count("email.failed")
+                    print(f"❌ 邮件发送失败 ({self.retries} 次): {err}")
+        return ok
+
+    def send(self, subject, html, sender="Scanner", recipient="Commander"):
+        if not self.configured:
+            print("❌ 邮箱配置缺失，无法发送通知。")
+            return False
+        self.enqueue(subject, html, sender, recipient)
+        return self.flush()
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    self.conn.quit()
+                except Exception:
+                    pass
+            self.conn = None
+
+
+_mailer = None
+
+
+def mailer():
+    # 进程内共用的 Mailer (常驻模式下多轮报警复用同一条连接)，退出时 QUIT
+    global _mailer
+    if _mailer is None:
+        _mailer = Mailer()
+        atexit.register(_mailer.close)
+    return _mailer
+
+
+# ---------- 去重 / 汇总 ----------
+class Digest:
+    def __init__(self, name, dedup=None, every=None, path=None, max_pending=None):
+        self.path = path or os.path.join(os.environ.get("NOTIFY_DIR", ".cache"), f"notify_{name}.json")
+        # 同一 (代码, 信号) 默认 6 小时内只发一次；两封邮件默认不限间隔；待发的默认最多 500 条
+        self.dedup = float(dedup if dedup is not None else os.environ.get("NOTIFY_DEDUP", 6 * 3600))
+        self.every = float(every if every is not None else os.environ.get("NOTIFY_EVERY", 0))
+        self.max_pending = int(max_pending if max_pending is not None else os.environ.get("NOTIFY_MAX_PENDING", 500))
+        self.state = self._read()
+        self.state.setdefault('sent', {})
+        self.state.setdefault('pending', [])
+        self.state.setdefault('last_mail', 0)
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def key(r):
+        return f"{r['Symbol']}|{r['Signal']}"
+
+    @property
+    def pending(self):
+        return self.state['pending']
+
+    def add(self, items, now=None):
+        # 去掉 dedup 窗口内发过的和已在 pending 里的，其余加入 pending；返回加入的条数
+        now = time.time() if now is None else now
+        sent = self.state['sent']
+        queued = {self.key(r) for r in self.pending}
+        added = 0
+        for r in items:
+            k = self.key(r)
+            if k in queued or now - sent.get(k, -1e18) < self.dedup:
+                metrics.count("notify.deduped"); continue
+            self.pending.append(dict(r))
+            queued.add(k)
+            added += 1
+        over = len(self.pending) - self.max_pending
+        if over > 0:
+            # 邮件一直发不出去时只留最新的 max_pending 条
+            del self.pending[:over]
+            metrics.count("notify.dropped", over)
+        self._write()
+        return added
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        return bool(self.pending) and now - self.state['last_mail'] >= self.every
+
+    def mark_sent(self, now=None):
+        # 邮件发出后调用: pending 清空并记下发送时间；过期的去重记录顺便清理
+        now = time.time() if now is None else now
+        sent = self.state['sent']
+        for r in self.pending: sent[self.key(r)] = now
+        self.state['sent'] = {k: t for k, t in sent.items() if now - t < self.dedup}
+        self.state['pending'] = []
+        self.state['last_mail'] = now
+        self._write()
+
+    def drop(self):
+        # 没有可用的发送通道: 清空 pending (不记为已发，配置好以后同一信号还会再报)；返回丢掉的条数
+        n = len(self.pending)
+        if n:
+            self.state['pending'] = []
+            metrics.count("notify.dropped", n)
+            self._write()
+        return n
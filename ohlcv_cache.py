@@ -0,0 +1,142 @@
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 本地 K 线缓存 (按代码分文件, .npy 可 mmap)
+# ==========================================
+# 每只股票一个 <SYM>.npy 结构化数组 (date + OHLCV)，
+# index.json 记录每只股票"完整覆盖"的起始日期。
+# 再次运行时只向数据源要最后几根之后的 K 线，合并后写回。
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+BAR_DTYPE = np.dtype([('date', '<i8')] + [(f, '<f8') for f in FIELDS])
+
+# yfinance period -> 自然日 (只用来判断缓存是否覆盖足够长的历史)
+PERIOD_DAYS = {'1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827, '10y': 3653}
+
+
+def period_start(period, today=None):
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today).normalize()
+    return today - pd.Timedelta(days=PERIOD_DAYS[period])
+
+
+def split_download(raw, tickers):
+    # 把 yf.download(group_by='ticker') 的结果拆成 {代码: DataFrame}
+    out = {}
+    if raw is None or raw.empty: return out
+    if isinstance(raw.columns, pd.MultiIndex):
+        names = set(raw.columns.get_level_values(0))
+        for t in tickers:
+            if t not in names: continue
+            df = raw[t]
+            if not {'Close', 'Volume'}.issubset(df.columns): continue
+            df = df.reindex(columns=FIELDS).dropna(how='all')
+            if not df.empty: out[t] = df
+    elif len(tickers) == 1 and {'Close', 'Volume'}.issubset(raw.columns):
+        df = raw.reindex(columns=FIELDS).dropna(how='all')
+        if not df.empty: out[tickers[0]] = df
+    return out
+
+
+class OHLCVCache:
+    def __init__(self, root=None, overlap=2, tolerance=1e-4):
+        self.root = root or os.environ.get("OHLCV_CACHE_DIR", os.path.join(".cache", "ohlcv"))
+        # overlap: 增量请求时往回多要几根，用来刷新盘中未收盘的那根，并校验复权有没有变
+        self.overlap = max(int(overlap), 2)
+        self.tolerance = tolerance
+        os.makedirs(self.root, exist_ok=True)
+        self.index_path = os.path.join(self.root, "index.json")
+        self.index = self._load_index()
+        # 流水线里多个下载线程共用一个缓存，索引的读写要加锁
+        self.lock = threading.Lock()
+        self.stats = {'hit': 0, 'topup': 0, 'full': 0, 'refetch': 0, 'stale': 0}
+
+    # ---------- 存储 ----------
+    def _load_index(self):
+        try:
+            with open(self.index_path, encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        with self.lock:
+            tmp = self.index_path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f: json.dump(self.index, f)
+            os.replace(tmp, self.index_path)
+
+    def _path(self, symbol):
+        return os.path.join(self.root, f"{symbol}.npy")
+
+    def read(self, symbol):
+        try:
+            arr = np.load(self._path(symbol), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if arr.dtype != BAR_DTYPE or len(arr) == 0: return None
+        idx = pd.DatetimeIndex(arr['date'].astype('datetime64[D]').astype('datetime64[ns]'), name='Date')
+        return pd.DataFrame({f: arr[f] for f in FIELDS}, index=idx)
+
+    def write(self, symbol, df, covered_from):
+        df = df[~df.index.duplicated(keep='last')].sort_index()
+        arr = np.empty(len(df), dtype=BAR_DTYPE)
+        arr['date'] = df.index.values.astype('datetime64[D]').astype('<i8')
+        for f in FIELDS: arr[f] = df[f].to_numpy(dtype='f8')
+        # 先写临时文件再替换，崩溃时不会留下半截文件
+        tmp = self._path(symbol) + ".tmp.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, self._path(symbol))
+        with self.lock:
+            self.index[symbol] = {'from': str(covered_from.date()), 'last': str(df.index[-1].date())}
+
+    def _count(self, key):
+        with self.lock: self.stats[key] += 1
+
+    # ---------- 增量拉取 ----------
+    def _merge(self, symbol, cached, fresh, start):
+        # 用重叠区里最早那根 (已收盘) 校验: 复权因子变了就要整段重拉
+        chk = cached.index[cached.index >= start]
+        if len(chk) and chk[0] in fresh.index:
+            old, new = cached.at[chk[0], 'Close'], fresh.at[chk[0], 'Close']
+            if old and not np.isnan(new) and abs(new / old - 1) > self.tolerance: return None
+        return pd.concat([cached[cached.index < start], fresh])
+
+    def fetch(self, tickers, period, download):
+        # download(tickers, period=None, start=None) -> yf.download 风格的 DataFrame 或 None
+        need_from = period_start(period)
+        frames, full, groups = {}, [], {}
+        for t in tickers:
+            meta = self.index.get(t)
+            cached = self.read(t) if meta and meta['from'] <= str(need_from.date()) else None
+            if cached is None or len(cached) <= self.overlap:
+                full.append(t); continue
+            start = cached.index[-self.overlap]
+            groups.setdefault(start, []).append(t)
+            frames[t] = cached
+
+        for start, ts in groups.items():
+            fresh = split_download(download(ts, start=start.strftime('%Y-%m-%d')), ts)
+            for t in ts:
+                if t not in fresh:
+                    # 增量失败就先用旧数据，下次再补
+                    self._count('stale'); continue
+                merged = self._merge(t, frames[t], fresh[t], start)
+                if merged is None:
+                    del frames[t]; full.append(t); self._count('refetch'); continue
+                self.write(t, merged, pd.Timestamp(self.index[t]['from']))
+                frames[t] = merged
+                self._count('topup' if len(fresh[t]) > self.overlap else 'hit')
+
+        if full:
+            fresh = split_download(download(full, period=period), full)
+            for t, df in fresh.items():
+                self.write(t, df, need_from)
+                frames[t] = df
+                self._count('full')
+
+        if groups or full: self._save_index()
+        frames = {t: frames[t][frames[t].index >= need_from] for t in tickers if t in frames}
+        if not frames: return None
+        return pd.concat(frames, axis=1)
@@ -0,0 +1,121 @@
+import math
+import bisect
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from panel import nan_quantile_rows, quantile_index
+
+# ==========================================
+# 滚动顺序统计量: 窗口分位数 / 百分位排名
+# ==========================================
+# 结果与 pandas 逐位一致:
+#   - 分位数同 Series.quantile (线性插值，忽略 NaN)，也就是 nan_quantile_rows 的公式
+#   - 排名同 rolling(width).rank(pct=True) (并列取平均名次，除以窗口内有效值个数)
+# SortedWindow 给逐根推进的场景 (盘中逐根更新、按天回放): 进一根出一根只做 bisect 定位
+# 和一次 list 插入 / 删除，不重排整个窗口。整段历史一次算完用 rolling_rank / rolling_quantile
+# (sliding_window_view 叠成矩阵后按行处理)；整批股票同一时刻的窗口仍用 nan_quantile_rows 按行排序，
+# 实测 (3000 只 × 90 根) 比逐行增量插入删除还快。
+
+
+def _interp(s, n, q):
+    # 有序序列 s 前 n 个有效值的 q 分位数，算式与 nan_quantile_rows 相同 (保证浮点结果一致)
+    if n == 0: return np.nan
+    virtual = quantile_index(n, q)
+    prev = math.floor(virtual)
+    gamma = virtual - prev
+    a, b = s[min(max(prev, 0), n - 1)], s[min(max(prev + 1, 0), n - 1)]
+    diff = b - a
+    return b - diff * (1 - gamma) if gamma >= 0.5 else a + diff * gamma
+
+
+def quantiles(values, *qs):
+    # 一段数据排序一次，取多个分位数 (同 Series.quantile，忽略 NaN)
+    s = np.sort(np.asarray(values, dtype='f8'))
+    n = int((~np.isnan(s)).sum())
+    return tuple(_interp(s, n, q) for q in qs)
+
+
+class SortedWindow:
+    # 定长滑动窗口: 原始顺序存在 deque 里 (决定谁先出窗)，有效值 (非 NaN) 另存一份有序 list
+    def __init__(self, width, values=()):
+        self.width = width
+        self.raw = deque()
+        self.sorted = []
+        for x in values: self.push(x)
+
+    def __len__(self):
+        return len(self.raw)
+
+    @property
+    def count(self):
+        # 窗口内有效值个数
+        return len(self.sorted)
+
+    def _add(self, x):
+        if x == x: bisect.insort(self.sorted, x)
+
+    def _remove(self, x):
+        if x == x: del self.sorted[bisect.bisect_left(self.sorted, x)]
+
+    def push(self, x):
+        # 追加一根；窗口满了先移出最早的一根并返回它
+        x = float(x)
+        old = None
+        if len(self.raw) == self.width:
+            old = self.raw.popleft()
+            self._remove(old)
+        self.raw.append(x)
+        self._add(x)
+        return old
+
+    def replace(self, x):
+        # 改写最新一根 (盘中未收盘的 K 线在变)
+        x = float(x)
+        self._remove(self.raw[-1])
+        self.raw[-1] = x
+        self._add(x)
+
+    def quantile(self, q):
+        return _interp(self.sorted, len(self.sorted), q)
+
+    def median(self):
+        # 同 Series.median (偶数个取中间两个的均值)
+        s, n = self.sorted, len(self.sorted)
+        if n == 0: return np.nan
+        return s[n // 2] if n % 2 else (s[n // 2 - 1] + s[n // 2]) / 2
+
+    def rank(self, x=None, min_periods=None):
+        # x (默认最新一根) 在窗口内的百分位排名 (0, 1]；有效值少于 min_periods (默认窗口长度) 返回 NaN
+        x = self.raw[-1] if x is None else float(x)
+        n = len(self.sorted)
+        if x != x or n == 0 or n < (self.width if min_periods is None else min_periods): return np.nan
+        lo = bisect.bisect_left(self.sorted, x)
+        hi = bisect.bisect_right(self.sorted, x)
+        return (lo + (hi - lo + 1) / 2) / n
+
+
+def _windows(x, width):
+    # 第 t 行是以 t 结尾的 width 根 (左侧不足补 NaN)
+    x = np.asarray(x, dtype='f8')
+    pad = np.concatenate([np.full(width - 1, np.nan), x])
+    return x, sliding_window_view(pad, width)
+
+
+def rolling_rank(x, width, min_periods=None):
+    # 同 pd.Series(x).rolling(width, min_periods).rank(pct=True)，一次算完整段
+    x, win = _windows(x, width)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = (~np.isnan(win)).sum(axis=1)
+        last = x[:, None]
+        r = ((win < last).sum(axis=1) + ((win == last).sum(axis=1) + 1) / 2) / n
+    r[(n < (width if min_periods is None else min_periods)) | np.isnan(x)] = np.nan
+    return r
+
+
+def rolling_quantile(x, width, q, min_periods=None):
+    # 每个窗口的 Series.quantile(q) (忽略 NaN)；有效值少于 min_periods (默认窗口长度) 为 NaN
+    x, win = _windows(x, width)
+    out = nan_quantile_rows(win, q)
+    out[(~np.isnan(win)).sum(axis=1) < (width if min_periods is None else min_periods)] = np.nan
+    return out
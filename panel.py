@@ -0,0 +1,283 @@
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 批量数组工具: 把一批 DataFrame 叠成 (股票 × 天 × 字段)
+# ==========================================
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class Panel(Mapping):
+    # 一批股票的 K 线拼成一块连续数组:
+    #   values  (总行数, 5) float64，按股票依次排列，每只内部按日期升序
+    #   dates   (总行数,)  int64 纳秒时间戳
+    #   offsets (股票数+1,) 第 i 只股票占 values[offsets[i]:offsets[i+1]]
+    # 按代码取值返回 DataFrame 视图，可直接当 {代码: DataFrame} 用
+    # dense: 已保证没有空值的字段 (from_download 按 subset 去掉了空行)
+    def __init__(self, symbols, values, dates, offsets, fields=FIELDS, dense=()):
+        self.symbols = list(symbols)
+        self.values = values
+        self.dates = dates
+        self.offsets = offsets
+        self.fields = list(fields)
+        self.dense = tuple(dense)
+        self._pos = {s: i for i, s in enumerate(self.symbols)}
+
+    @classmethod
+    def from_frames(cls, frames, fields=FIELDS):
+        symbols, vals, dates = [], [], []
+        for s, df in frames.items():
+            if not df.index.is_monotonic_increasing: df = df.sort_index()
+            symbols.append(s)
+            vals.append(df.reindex(columns=fields).to_numpy(dtype='f8'))
+            dates.append(df.index.values.astype('datetime64[ns]').view('i8'))
+        offsets = np.zeros(len(symbols) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(v) for v in vals])
+        values = np.concatenate(vals) if vals else np.empty((0, len(fields)))
+        dates = np.concatenate(dates) if dates else np.empty(0, dtype=np.int64)
+        return cls(symbols, np.ascontiguousarray(values), dates, offsets, fields)
+
+    @classmethod
+    def from_download(cls, raw, tickers, fields=FIELDS, subset=None, require=('Close', 'Volume'), compact=False):
+        # 直接把 yf.download(group_by='ticker') 的整块结果转成 Panel，不经过逐只 DataFrame，
+        # 每个值只拷贝一次 (从下载的列拷进 values)。
+        # subset=None 去掉全空的行 (同 dropna(how='all'))，否则去掉 subset 有空值的行；
+        # 缺 require 列或去空后没有数据的代码不收录。顺序与 tickers 一致。
+        # compact=True 返回 CompactPanel (float32 + 交易日下标)
+        empty = CompactPanel.empty(fields) if compact else \
+            cls([], np.empty((0, len(fields))), np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), fields, subset or ())
+        if raw is None or raw.empty: return empty
+        cols = raw.columns
+        if isinstance(cols, pd.MultiIndex):
+            names = set(cols.get_level_values(0))
+            tickers = [t for t in dict.fromkeys(tickers) if t in names]
+            keys = lambda t: [(t, f) for f in fields]
+        elif len(tickers) == 1:
+            keys = lambda t: list(fields)
+        else:
+            return empty
+        at = {c: i for i, c in enumerate(cols)}
+        pos = np.array([[at.get(k, -1) for k in keys(t)] for t in tickers], dtype=np.int64).reshape(len(tickers), len(fields))
+        need = [fields.index(f) for f in require]
+        ok = (pos[:, need] >= 0).all(axis=1)
+        tickers, pos = [t for t, k in zip(tickers, ok) if k], pos[ok]
+        if not tickers: return empty
+
+        idx = raw.index
+        order = None if idx.is_monotonic_increasing else np.argsort(idx.values, kind='stable')
+        # 逐列取 ndarray 视图 (不把整块合并成一个大数组)，再直接写进压缩后的 values，
+        # 峰值只比结果多出几列临时数组
+        nan_col = np.full(len(idx), np.nan)
+        col = [a.to_numpy(dtype='f8') for _, a in raw.items()]
+        if order is not None: col = [a[order] for a in col]
+        get = lambda j: col[j] if j >= 0 else nan_col
+
+        chk = [fields.index(f) for f in subset] if subset else list(range(len(fields)))
+        mask = np.empty((len(tickers), len(idx)), dtype=bool)
+        for i, p in enumerate(pos):
+            nan = [np.isnan(get(p[k])) for k in chk]
+            mask[i] = ~np.logical_or.reduce(nan) if subset else ~np.logical_and.reduce(nan)
+        lengths = mask.sum(axis=1)
+        offsets = np.zeros(len(tickers) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+
+        values = np.empty((offsets[-1], len(fields)), dtype=np.float32 if compact else np.float64)
+        d = idx.values.astype('datetime64[ns]').view('i8')
+        if order is not None: d = d[order]
+        if compact:
+            # 整批共用一份交易日历，每行只存 int32 下标
+            calendar = np.unique(d)
+            d = np.searchsorted(calendar, d).astype(np.int32)
+        dates = np.empty(offsets[-1], dtype=d.dtype)
+        for i, p in enumerate(pos):
+            a, b, m = offsets[i], offsets[i + 1], mask[i]
+            for f, j in enumerate(p): values[a:b, f] = get(j)[m]
+            dates[a:b] = d[m]
+        # 全空的代码占 0 行，直接从名单里去掉即可
+        has = lengths > 0
+        if not has.all():
+            tickers = [t for t, k in zip(tickers, has) if k]
+            offsets = np.concatenate(([0], offsets[1:][has]))
+        if compact: return CompactPanel(tickers, values, dates, calendar, offsets, fields, subset or ())
+        return cls(tickers, values, dates, offsets, fields, subset or ())
+
+    @classmethod
+    def concat(cls, panels):
+        # 把若干批 Panel 首尾相接 (代码不去重)
+        panels = [p for p in panels if len(p)]
+        if not panels: return cls([], np.empty((0, len(FIELDS))), np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64))
+        ends = np.cumsum([0] + [p.offsets[-1] for p in panels[:-1]])
+        offsets = np.concatenate([[0]] + [p.offsets[1:] + e for p, e in zip(panels, ends)])
+        dense = set(panels[0].dense).intersection(*(p.dense for p in panels))
+        return cls([s for p in panels for s in p.symbols], np.concatenate([p.values for p in panels]),
+                   np.concatenate([p.dates for p in panels]), offsets, panels[0].fields,
+                   [f for f in panels[0].fields if f in dense])
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __getitem__(self, symbol):
+        return self.frame(self._pos[symbol])
+
+    def row_dates(self, a, b):
+        # values[a:b] 对应的日期 (int64 纳秒)
+        return self.dates[a:b]
+
+    def compact(self):
+        # 转成 CompactPanel (float32 + 交易日下标)
+        calendar = np.unique(self.dates)
+        return CompactPanel(self.symbols, self.values.astype(np.float32), np.searchsorted(calendar, self.dates).astype(np.int32),
+                            calendar, self.offsets, self.fields, self.dense)
+
+    def frame(self, i):
+        a, b = self.offsets[i], self.offsets[i + 1]
+        idx = pd.DatetimeIndex(self.row_dates(a, b).view('datetime64[ns]'), name='Date')
+        return pd.DataFrame(self.values[a:b], index=idx, columns=self.fields, copy=False)
+
+    def column(self, symbol, field):
+        # 单个字段的 Series 视图
+        i = self._pos[symbol]
+        a, b = self.offsets[i], self.offsets[i + 1]
+        idx = pd.DatetimeIndex(self.row_dates(a, b).view('datetime64[ns]'), name='Date')
+        return pd.Series(self.values[a:b, self.fields.index(field)], index=idx, name=field, copy=False)
+
+    def slice(self, lo, hi):
+        a, b = self.offsets[lo], self.offsets[hi]
+        return Panel(self.symbols[lo:hi], self.values[a:b], self.dates[a:b],
+                     self.offsets[lo:hi + 1] - a, self.fields, self.dense)
+
+    def since(self, start):
+        # 只保留 start (含) 之后的行；没有剩余行的代码保留为空段
+        keep = self.dates >= pd.Timestamp(start).value
+        if keep.all(): return self
+        ck = np.concatenate(([0], np.cumsum(keep)))
+        return Panel(self.symbols, self.values[keep], self.dates[keep], ck[self.offsets], self.fields, self.dense)
+
+    def tails(self, width, subset=None):
+        # stack_tails 的向量化版本，不经过逐只 DataFrame
+        cols = [self.fields.index(f) for f in (subset or self.fields) if f not in self.dense]
+        n = len(self.symbols)
+        if not cols:
+            # 要求的字段都没有空值: 直接按 offsets 切出每只的最后 width 行，没有按行的临时数组
+            lengths = np.diff(self.offsets)
+            out = np.full((n, width, len(self.fields)), np.nan)
+            for i in range(n):
+                b = self.offsets[i + 1]
+                a = max(self.offsets[i], b - width)
+                out[i, width - (b - a):] = self.values[a:b]
+            return list(self.symbols), out, lengths
+        rows = np.flatnonzero(~np.isnan(self.values[:, cols]).any(axis=1))
+        tid = np.searchsorted(self.offsets, rows, side='right') - 1
+        lengths = np.bincount(tid, minlength=n).astype(np.int64)
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        from_end = lengths[tid] - 1 - (np.arange(len(rows)) - starts[tid])
+        keep = from_end < width
+        out = np.full((n, width, len(self.fields)), np.nan)
+        out[tid[keep], width - 1 - from_end[keep]] = self.values[rows[keep]]
+        return list(self.symbols), out, lengths
+
+
+class CompactPanel(Panel):
+    # 省内存的 Panel: values 为 float32 (每行 20 字节，Panel 是 40)，日期不逐行存 int64，
+    # 而是共享交易日历 calendar (int64 纳秒) 加每行一个 int32 下标 day。
+    # tails / stack_tails 取出的尾部矩阵仍是 float64，指标按 float64 计算 (输入是 float32 精度)
+    def __init__(self, symbols, values, day, calendar, offsets, fields=FIELDS, dense=()):
+        self.symbols = list(symbols)
+        self.values = values
+        self.day = day
+        self.calendar = calendar
+        self.offsets = offsets
+        self.fields = list(fields)
+        self.dense = tuple(dense)
+        self._pos = {s: i for i, s in enumerate(self.symbols)}
+
+    @classmethod
+    def empty(cls, fields=FIELDS):
+        return cls([], np.empty((0, len(fields)), dtype=np.float32), np.empty(0, dtype=np.int32),
+                   np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), fields)
+
+    @classmethod
+    def concat(cls, panels):
+        # 日历取并集，各批的下标换算到新日历上
+        panels = [p if isinstance(p, CompactPanel) else p.compact() for p in panels if len(p)]
+        if not panels: return cls.empty()
+        calendar = np.unique(np.concatenate([p.calendar for p in panels]))
+        day = np.concatenate([np.searchsorted(calendar, p.calendar).astype(np.int32)[p.day] for p in panels])
+        ends = np.cumsum([0] + [p.offsets[-1] for p in panels[:-1]])
+        offsets = np.concatenate([[0]] + [p.offsets[1:] + e for p, e in zip(panels, ends)])
+        dense = set(panels[0].dense).intersection(*(p.dense for p in panels))
+        return cls([s for p in panels for s in p.symbols], np.concatenate([p.values for p in panels]), day, calendar,
+                   offsets, panels[0].fields, [f for f in panels[0].fields if f in dense])
+
+    @property
+    def dates(self):
+        return self.calendar[self.day]
+
+    def row_dates(self, a, b):
+        return self.calendar[self.day[a:b]]
+
+    def compact(self):
+        return self
+
+    def slice(self, lo, hi):
+        a, b = self.offsets[lo], self.offsets[hi]
+        return CompactPanel(self.symbols[lo:hi], self.values[a:b], self.day[a:b], self.calendar,
+                            self.offsets[lo:hi + 1] - a, self.fields, self.dense)
+
+    def since(self, start):
+        keep = self.day >= np.searchsorted(self.calendar, pd.Timestamp(start).value)
+        if keep.all(): return self
+        ck = np.concatenate(([0], np.cumsum(keep)))
+        return CompactPanel(self.symbols, self.values[keep], self.day[keep], self.calendar, ck[self.offsets],
+                            self.fields, self.dense)
+
+
+def stack_tails(frames, width, fields=FIELDS, subset=None):
+    # 每只股票去掉 subset 列有空值的行 (默认全部字段，等价于 df.dropna())，
+    # 取最后 width 根右对齐；不足的左侧补 NaN。lengths 是去空后的真实长度。
+    if isinstance(frames, Panel) and frames.fields == list(fields):
+        return frames.tails(width, subset)
+    symbols = list(frames)
+    cols = [fields.index(f) for f in (subset or fields)]
+    out = np.full((len(symbols), width, len(fields)), np.nan)
+    lengths = np.zeros(len(symbols), dtype=np.int64)
+    for i, s in enumerate(symbols):
+        df = frames[s]
+        if not df.index.is_monotonic_increasing: df = df.sort_index()
+        vals = df.reindex(columns=fields).to_numpy(dtype='f8')
+        vals = vals[~np.isnan(vals[:, cols]).any(axis=1)]
+        lengths[i] = len(vals)
+        k = min(width, len(vals))
+        if k: out[i, width - k:] = vals[len(vals) - k:]
+    return symbols, out, lengths
+
+
+# np.quantile(method='linear') 的虚拟下标: numpy 2 起是 (n-1)·q，1.x 是 n·q + (1-q) - 1。
+# 两式数学上相等但浮点末位可能不同，跟随当前安装的 numpy 才能逐位一致
+_NUMPY2 = int(np.__version__.split('.')[0]) >= 2
+
+
+def quantile_index(n, q):
+    return (n - 1) * q if _NUMPY2 else n * q + (1 - q) - 1
+
+
+def nan_quantile_rows(x, q):
+    # 按行求分位数并忽略 NaN；插值公式与 np.quantile(method='linear') 逐位一致，
+    # 因而与 pandas Series.quantile 的结果相同。全 NaN 的行返回 NaN。
+    s = np.sort(x, axis=1)
+    n = (~np.isnan(s)).sum(axis=1)
+    virtual = quantile_index(n, q)
+    prev = np.floor(virtual)
+    gamma = virtual - prev
+    lo = np.clip(prev, 0, np.maximum(n - 1, 0)).astype(np.int64)
+    hi = np.clip(prev + 1, 0, np.maximum(n - 1, 0)).astype(np.int64)
+    rows = np.arange(len(s))
+    a, b = s[rows, lo], s[rows, hi]
+    diff = b - a
+    res = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+    res[n == 0] = np.nan
+    return res
@@ -0,0 +1,100 @@
+import os
+import numpy as np
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from panel import Panel
+from metrics import metrics
+
+# ==========================================
+# 多进程分析 (--workers N)
+# ==========================================
+# 一批 K 线先拼成 Panel，再整块放进共享内存；任务只传 (共享内存名, 起止下标)，
+# 不再 pickle DataFrame。基准 (QQQ) 在进程初始化时每个进程只传一次。
+# 结果按任务起始下标排序，和单进程扫描的顺序完全一致。
+# 子进程里 analyze_batch 记的计数 / 计时 / 异常随结果一起带回，并进主进程的 metrics。
+
+_worker = {}
+
+
+def _init_worker(analyzer_cls, bench_data, kwargs):
+    analyzer = analyzer_cls(**kwargs)
+    if bench_data is not None: analyzer.bench_data = bench_data
+    _worker['analyzer'] = analyzer
+
+
+def _share(arr):
+    shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach(desc, a, b):
+    # 只把本任务需要的那一段拷出来，随即关闭共享内存，避免视图引用导致无法 close
+    name, shape, dtype = desc
+    shm = SharedMemory(name=name)
+    try:
+        return np.array(np.ndarray(shape, dtype=dtype, buffer=shm.buf)[a:b])
+    finally:
+        shm.close()
+
+
+def _run_chunk(symbols, values_desc, dates_desc, offsets, dense=()):
+    a, b = offsets[0], offsets[-1]
+    panel = Panel(symbols, _attach(values_desc, a, b), _attach(dates_desc, a, b), offsets - a, dense=dense)
+    # 每个任务从零记起，返回的就是本任务的增量
+    metrics.reset()
+    return _worker['analyzer'].analyze_batch(panel), metrics.snapshot()
+
+
+class ParallelAnalyzer:
+    # analyzer_cls: WyckoffAnalyzer / NanoAnalyzer (需要有 analyze_batch)
+    def __init__(self, analyzer_cls, workers, bench_data=None, chunk_size=25, **kwargs):
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.chunk_size = max(1, int(chunk_size))
+        # 空批次的返回值决定合并方式: Wyckoff 是列表，Nano 是 {代码: 结果}
+        self.empty = analyzer_cls(**kwargs).analyze_batch({})
+        # 先启动 resource_tracker 再 fork，子进程与主进程共用一个，
+        # 否则子进程 attach 共享内存时会各自登记，退出时误报泄漏
+        resource_tracker.ensure_running()
+        self.pool = get_context().Pool(self.workers, initializer=_init_worker,
+                                       initargs=(analyzer_cls, bench_data, kwargs))
+
+    def analyze_batch(self, data):
+        panel = data if isinstance(data, Panel) else Panel.from_frames(data)
+        if not len(panel): return type(self.empty)()
+        shm_v, v_desc = _share(panel.values)
+        shm_d, d_desc = _share(panel.dates)
+        try:
+            jobs = []
+            for lo in range(0, len(panel), self.chunk_size):
+                hi = min(lo + self.chunk_size, len(panel))
+                jobs.append(self.pool.apply_async(
+                    _run_chunk, (panel.symbols[lo:hi], v_desc, d_desc, panel.offsets[lo:hi + 1], panel.dense)))
+            # 按提交顺序取结果，输出顺序与单进程一致
+            parts = []
+            for j in jobs:
+                part, snap = j.get()
+                parts.append(part)
+                metrics.merge(snap)
+        finally:
+            for shm in (shm_v, shm_d):
+                shm.close(); shm.unlink()
+        if isinstance(self.empty, dict):
+            out = {}
+            for part in parts: out.update(part)
+            return out
+        return [r for part in parts for r in part]
+
+    def close(self, terminate=False):
+        # 正常结束等进程退出；出错 / Ctrl-C 时 terminate 直接结束在途任务
+        if terminate: self.pool.terminate()
+        else: self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # 扫描中途抛异常也要收掉进程池 (共享内存块在 analyze_batch 的 finally 里已释放)
+        self.close(terminate=exc_type is not None)
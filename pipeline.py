@@ -0,0 +1,275 @@
+import time
+import heapq
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from metrics import metrics
+
+# ==========================================
+# 下载 / 分析流水线
+# ==========================================
+# 多个批次同时在下载线程里跑，主线程按提交顺序逐批分析；
+# 在途批次数有上限 (背压)，请求频率由令牌桶统一控制，取代固定 sleep。
+
+
+class TokenBucket:
+    # rate: 每秒补充的令牌数; capacity: 桶容量 (允许的瞬时突发)
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        # 拿不到令牌就睡到够为止；rate<=0 表示不限速
+        if self.rate <= 0: return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return waited
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class Pipeline:
+    # fetch(batch) 在下载线程里执行；迭代 run(batches) 得到 (batch, data)，顺序与 batches 一致。
+    # fetch 抛出的异常 (缓存写盘失败、下载库的意外错误等) 只影响这一批: 记入 metrics，data 为 None
+    def __init__(self, fetch, workers=4, max_pending=None):
+        self.fetch = fetch
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending or self.workers * 2))
+
+    def run(self, batches):
+        pending = deque()
+        it = iter(batches)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fetch") as pool:
+            try:
+                for batch in it:
+                    pending.append((batch, pool.submit(self.fetch, batch)))
+                    # 在途批次满了就先消费最早的一批，下载线程不会无限跑在分析前面
+                    if len(pending) >= self.max_pending:
+                        batch, fut = pending.popleft()
+                        yield batch, self._result(fut)
+                while pending:
+                    batch, fut = pending.popleft()
+                    yield batch, self._result(fut)
+            finally:
+                # 提前退出时取消还没开始的下载
+                for _, fut in pending: fut.cancel()
+
+
+    @staticmethod
+    def _result(fut):
+        try:
+            return fut.result()
+        except Exception as e:
+            metrics.error("fetch", e)
+            return None
+
+
+class AdaptiveFetcher:
+    # 自适应下载调度: 一个实例管一次运行
+    #   - 批大小: 请求成功且不慢就放大 (×grow)，出错或超过 slow 秒就缩小 (×shrink)
+    #   - 二分: 一批失败就拆成两半分别重试，把出问题的代码隔离到单只
+    #   - 重试队列: 单只仍失败的按指数退避 (backoff × 2^(n-1)，最多 max_backoff 秒) 延后重试，
+    #     超过 retries 次放弃；已经拿到数据 (例如缓存里的旧 K 线) 的不再重试
+    #   - 熔断: 连续 breaker 次请求失败后，本次运行不再发请求，剩下的代码记为跳过
+    #     (只数多只的请求；二分一条坏代码本身就会连续失败 log2(批大小) 次，breaker 要比它大)
+    # 用法: for batch, raw in fetcher.run(tickers, fetch)，fetch 里用 fetcher.download 代替原下载函数
+    def __init__(self, download, size=100, min_size=5, max_size=200, grow=1.25, shrink=0.5, slow=30.0,
+                 retries=3, backoff=2.0, max_backoff=60.0, breaker=20):
+        self.raw = download
+        self.size, self.min_size, self.max_size = float(size), min_size, max_size
+        self.grow, self.shrink, self.slow = grow, shrink, slow
+        self.retries, self.backoff, self.max_backoff, self.breaker = retries, backoff, max_backoff, breaker
+        self.cond = threading.Condition()
+        self.queue = deque()
+        self.due = []          # 重试队列: (到期时间, 序号, 代码)
+        self.attempts = {}     # 代码 -> 已失败次数
+        self.errored = set()   # 本轮请求出错的单只，批次结束时决定是否重试
+        self.inflight = 0
+        self.fails = 0         # 连续失败的请求数
+        self.open = False
+        self.seq = 0
+        self.started = None
+        self.stats = {'requested': 0, 'requests': 0, 'errors': 0, 'slow': 0, 'bisections': 0,
+                      'retries': 0, 'failed': 0, 'skipped': 0, 'size_min': size, 'size_max': size}
+
+    # ---------- 下载 (在下载线程里执行) ----------
+    def download(self, tickers, **kwargs):
+        # 与原下载函数同签名；返回成功部分拼起来的 DataFrame，全失败返回 None
+        parts = [p for p in self._get(list(tickers), kwargs) if p is not None and not p.empty]
+        if not parts: return None
+        return parts[0] if len(parts) == 1 else pd.concat(parts, axis=1)
+
+    def _get(self, tickers, kwargs):
+        if self.open:
+            with self.cond: self.stats['skipped'] += len(tickers)
+            metrics.count("tickers.skipped", len(tickers))
+            return []
+        t0 = time.perf_counter()
+        err = None
+        try:
+            data = self.raw(tickers, **kwargs)
+        except Exception as e:
+            data, err = None, e
+            metrics.error("download", e)
+        ok = data is not None and not data.empty
+        self._feedback(ok, time.perf_counter() - t0, len(tickers))
+        if ok: return [data]
+        if len(tickers) == 1:
+            # 单只返回空表多半是真的没有数据 (退市 / 停牌)，不重试；抛异常的才进重试队列
+            if err is not None:
+                with self.cond: self.errored.add(tickers[0])
+            return []
+        with self.cond: self.stats['bisections'] += 1
+        metrics.count("fetch.bisect")
+        mid = len(tickers) // 2
+        return self._get(tickers[:mid], kwargs) + self._get(tickers[mid:], kwargs)
+
+    def _feedback(self, ok, seconds, n):
+        with self.cond:
+            self.stats['requests'] += 1
+            if ok: self.fails = 0
+            else:
+                self.stats['errors'] += 1
+                # 单只失败多半是代码本身有问题 (反复重试的坏代码)，不算进熔断
+                if n > 1: self.fails += 1
+                if self.fails >= self.breaker and not self.open:
+                    self.open = True
+                    print(f"\n🔌 连续 {self.fails} 次下载失败，本次运行熔断，剩余代码跳过")
+                    metrics.count("fetch.breaker_open")
+                    self.cond.notify_all()
+            if ok and seconds <= self.slow:
+                self.size = min(self.max_size, self.size * self.grow)
+            else:
+                if ok: self.stats['slow'] += 1
+                self.size = max(self.min_size, self.size * self.shrink)
+            self.stats['size_min'] = min(self.stats['size_min'], int(self.size))
+            self.stats['size_max'] = max(self.stats['size_max'], int(self.size))
+
+    # ---------- 调度 ----------
+    def _tracked(self, fetch):
+        def run(batch):
+            data = None
+            try:
+                data = fetch(batch)
+                return data
+            finally:
+                got = _symbols(data, batch)
+                with self.cond:
+                    for t in batch:
+                        if t in self.errored:
+                            self.errored.discard(t)
+                            if t not in got: self._defer(t)
+                    self.inflight -= 1
+                    self.cond.notify_all()
+        return run
+
+    def _defer(self, t):
+        # 调用方持有锁
+        n = self.attempts[t] = self.attempts.get(t, 0) + 1
+        if n > self.retries or self.open:
+            self.stats['failed'] += 1
+            metrics.count("tickers.download_failed")
+            return
+        self.seq += 1
+        heapq.heappush(self.due, (time.monotonic() + min(self.max_backoff, self.backoff * 2 ** (n - 1)), self.seq, t))
+        self.stats['retries'] += 1
+        metrics.count("download.retry")
+
+    def _next(self, ready):
+        # 取下一批: 主队列优先，其次是到期的重试。返回 (批次, 是否结束)；
+        # 没有可发的批次但 ready() 为真 (最早的在途批次已完成) 时返回 (None, False)，先去交结果
+        with self.cond:
+            while True:
+                if self.open:
+                    left = len(self.queue) + len(self.due)
+                    self.stats['skipped'] += left
+                    metrics.count("tickers.skipped", left)
+                    self.queue.clear(); self.due = []
+                    return None, True
+                if self.queue:
+                    n = min(max(1, int(self.size)), len(self.queue))
+                    batch = [self.queue.popleft() for _ in range(n)]
+                    break
+                now = time.monotonic()
+                if self.due and self.due[0][0] <= now:
+                    batch = []
+                    while self.due and self.due[0][0] <= now and len(batch) < max(1, int(self.size)):
+                        batch.append(heapq.heappop(self.due)[2])
+                    break
+                if not self.due and not self.inflight: return None, True
+                if ready(): return None, False
+                # 等重试到期，或者等一个在途批次结束 (完成回调会 notify)
+                self.cond.wait(self.due[0][0] - now if self.due else None)
+            self.inflight += 1
+        return batch, False
+
+    def _notify(self, _fut):
+        with self.cond: self.cond.notify_all()
+
+    def run(self, tickers, fetch, workers=4, max_pending=None):
+        # 与 Pipeline.run 相同: 按提交顺序交出 (batch, data)，在途批次数有上限。
+        # 区别是重试队列在等退避时，已经下完的批次先交给调用方分析 / 提交断点，不陪着一起等
+        self.started = time.monotonic()
+        with self.cond:
+            self.queue.extend(tickers)
+            self.stats['requested'] += len(tickers)
+        run = self._tracked(fetch)
+        workers = max(1, int(workers))
+        max_pending = max(1, int(max_pending or workers * 2))
+        pending = deque()
+        ready = lambda: bool(pending) and pending[0][1].done()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as pool:
+            try:
+                while True:
+                    while ready():
+                        batch, fut = pending.popleft()
+                        yield batch, Pipeline._result(fut)
+                    batch, end = self._next(ready)
+                    if end: break
+                    if batch is None: continue
+                    fut = pool.submit(run, batch)
+                    fut.add_done_callback(self._notify)
+                    pending.append((batch, fut))
+                    if len(pending) >= max_pending:
+                        batch, fut = pending.popleft()
+                        yield batch, Pipeline._result(fut)
+                while pending:
+                    batch, fut = pending.popleft()
+                    yield batch, Pipeline._result(fut)
+            finally:
+                for _, fut in pending: fut.cancel()
+
+    def report(self, scanned):
+        # scanned: 最终拿到数据的代码数 (覆盖率的分子)
+        s = self.stats
+        dt = time.monotonic() - (self.started or time.monotonic())
+        cov = scanned / s['requested'] * 100 if s['requested'] else 100.0
+        print(f"📶 覆盖率 {cov:.1f}% ({scanned}/{s['requested']}) | 吞吐 {scanned / max(dt, 1e-9):.1f} 只/秒 | "
+              f"请求 {s['requests']} 次, 失败 {s['errors']}, 二分 {s['bisections']}, 重试 {s['retries']}, "
+              f"放弃 {s['failed']}, 跳过 {s['skipped']} | 批大小 {s['size_min']}-{s['size_max']}"
+              + (" | 🔌 已熔断" if self.open else ""))
+        return dict(s, coverage=round(cov, 2), throughput=round(scanned / max(dt, 1e-9), 2), seconds=round(dt, 3),
+                    breaker_open=self.open)
+
+
+def _symbols(raw, batch):
+    # yf.download 结果里有数据的代码
+    if raw is None or getattr(raw, 'empty', True): return set()
+    if isinstance(raw.columns, pd.MultiIndex): return set(raw.columns.get_level_values(0))
+    return set(batch) if len(batch) == 1 else set()
+
+
+def chunked(items, size):
+    return [items[i:i+size] for i in range(0, len(items), size)]
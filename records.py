@@ -0,0 +1,70 @@
+from collections.abc import Mapping
+
+# ==========================================
+# 信号记录: 数值存在 __slots__ 里，展示用的字符串到出报告时才生成
+# ==========================================
+# 记录仍按原来的 dict 键名读写 (r['Symbol'] / r.get('Stop') / dict(r) / DataFrame)，
+# 邮件、CSV、回测等下游不用改。FIELDS: 键名 -> 属性名 (可读写) 或取值函数 (只读)。
+
+
+class Record(Mapping):
+    __slots__ = ()
+    FIELDS = {}
+
+    def __init__(self, **attrs):
+        for k, v in attrs.items(): setattr(self, k, v)
+
+    def __getitem__(self, key):
+        f = self.FIELDS.get(key)
+        if f is None: raise KeyError(key)
+        try:
+            return f(self) if callable(f) else getattr(self, f)
+        except AttributeError:
+            # 还没填的属性 (例如汇总前的 Symbol) 当作没有这个键
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        f = self.FIELDS.get(key)
+        if not isinstance(f, str): raise KeyError(key)
+        setattr(self, f, value)
+
+    def __iter__(self):
+        return (k for k in self.FIELDS if k in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)})"
+
+
+# ---------- 纳米盘 (monitor.py) ----------
+class Ambush(Record):
+    __slots__ = ('trigger', 'stop', 'rr', 'symbol', 'close')
+    FIELDS = {'Trigger': 'trigger', 'Stop': 'stop', 'Risk': lambda r: f"{r.rr*100:.1f}%",
+              'Setup': lambda r: "Deep+Quiet", 'Symbol': 'symbol', 'Signal': lambda r: 'Ambush', 'Close': 'close'}
+
+
+class Compression(Record):
+    __slots__ = ('rvol', 'change', 'score', 'symbol', 'close')
+    FIELDS = {'RVol': 'rvol', 'Change%': lambda r: f"{r.change:.2f}%", 'Score': 'score',
+              'Setup': lambda r: "Vol Squeeze", 'Symbol': 'symbol', 'Signal': lambda r: 'Compression', 'Close': 'close'}
+
+
+# ---------- 威科夫 (wyckoff_scan.py) ----------
+def _week(r):
+    # 周线结构 (--weekly 时才有): 最新周收盘相对 N 周均值
+    w = getattr(r, 'week', None)
+    return f" | W:{w:+.1f}%" if w is not None and w == w else ""
+
+
+class Spring(Record):
+    __slots__ = ('symbol', 'price', 'score', 'notes', 'crp', 'stop', 'week')
+    FIELDS = {'Symbol': 'symbol', 'Signal': lambda r: '🔥 V19 Spring', 'Price': 'price',
+              'Detail': lambda r: f"Sc:{r.score} {','.join(r.notes)} CRP:{r.crp:.2f}{_week(r)}", 'Stop': 'stop'}
+
+
+class SOS(Record):
+    __slots__ = ('symbol', 'price', 'rs', 'stop', 'week')
+    FIELDS = {'Symbol': 'symbol', 'Signal': lambda r: '🚀 V19 SOS', 'Price': 'price',
+              'Detail': lambda r: f"Coil Break | RS:{r.rs:.1f}{_week(r)}", 'Stop': 'stop'}
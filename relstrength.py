@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 相对强度 (RS): 基准只对齐一次，斜率整批闭式求解
+# ==========================================
+# log(s/s0) - log(b/b0) 的斜率与常数项无关，所以 RS 斜率就是
+# log(收盘) - log(基准) 对时间的最小二乘斜率。基准的 log 收盘在构造时算好，
+# 每只股票只需按日期查表 (口径同 reindex + ffill)，最后 window 个点
+# 拼成 (股票 × window) 矩阵一次算完；多个基准只多一次查表。
+
+BENCHMARKS = ('QQQ', 'SPY', 'IWM')
+
+
+class Benchmarks:
+    # closes: {名称: 收盘价 Series}；也接受单个 Series (当作 QQQ)
+    def __init__(self, closes):
+        if isinstance(closes, pd.Series): closes = {'QQQ': closes}
+        series = {}
+        for k, s in closes.items():
+            if s is None: continue
+            s = s.dropna()
+            s = s[~s.index.duplicated(keep='last')].sort_index()
+            if len(s): series[k] = s
+        self.names = list(series)
+        # 所有基准交易日的并集；某个基准当天没有数据记 NaN (等同 reindex 后的空值)
+        stamps = [s.index.values.astype('datetime64[ns]').view('i8') for s in series.values()]
+        self.dates = np.unique(np.concatenate(stamps)) if stamps else np.empty(0, dtype=np.int64)
+        self.log = np.full((len(self.names), len(self.dates)), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for k, (d, s) in enumerate(zip(stamps, series.values())):
+                self.log[k, np.searchsorted(self.dates, d)] = np.log(s.to_numpy(dtype='f8'))
+
+    def __len__(self):
+        return len(self.names)
+
+    def pick(self, name):
+        # 没有要的基准就退回第一个
+        return name if name in self.names else (self.names[0] if self.names else None)
+
+    def slopes(self, stocks, window=50):
+        # stocks: [(日期 int64 纳秒, 收盘价)]，每只已去空并按日期升序
+        # 返回 {基准名: (股票数,) 斜率 × 1000}。与 StatUtils 的旧口径一致:
+        # 不足 window 根、或第一根当天没有基准价 (归一化后基准全空) 的记 0；
+        # 收盘价 <= 0 的点先去掉 (旧版 replace(0, nan).dropna())，取剩下的最后 window 个点回归，
+        # 剩不到 10 个点记 0
+        n = len(stocks)
+        out = {k: np.zeros(n) for k in self.names}
+        if not n or not self.names: return out
+        lengths = np.array([len(c) for _, c in stocks], dtype=np.int64)
+        dates = np.concatenate([d for d, _ in stocks])
+        close = np.concatenate([c for _, c in stocks]).astype('f8')
+        ok = lengths >= window
+        valid = close > 0
+        if not valid.all():
+            seg = np.repeat(np.arange(n), lengths)
+            dates, close = dates[valid], close[valid]
+            lengths = np.bincount(seg[valid], minlength=n)
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        m = np.minimum(lengths, window)
+        ok &= m >= 10
+        if not ok.any(): return out
+
+        pos = np.minimum(np.searchsorted(self.dates, dates), len(self.dates) - 1)
+        same_day = self.dates[pos] == dates
+        rows = np.arange(len(dates))
+        # 有效点不足 window 的行只用右侧 m 个点 (左侧下标夹到本段起点，权重为 0)
+        idx = np.maximum(offsets[1:][ok, None] - window + np.arange(window), offsets[:-1][ok, None])
+        part = m[ok] < window
+        w = np.arange(window) >= (window - m[ok])[:, None]
+        x = np.arange(window) - (window - 1) / 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y_stock = np.log(close[idx])
+            for k, name in enumerate(self.names):
+                b = self.log[k, pos]
+                has = same_day & ~np.isnan(b)
+                # 当天没有基准价就沿用本股票上一行的 (逐段 ffill；第一行有值时不会跨段)
+                src = np.maximum.accumulate(np.where(has, rows, -1))
+                first = has[offsets[:-1][ok]]
+                y = y_stock - b[src[idx]]
+                yc = y - y.mean(axis=1, keepdims=True)
+                slope = (yc * x).sum(axis=1) / (x * x).sum() * 1000
+                if part.any():
+                    # 点数不足 window 的行: 只对有效点做最小二乘
+                    wp, yp = w[part], np.where(w[part], y[part], 0.0)
+                    cnt = wp.sum(axis=1, keepdims=True)
+                    dx = np.where(wp, x - (x * wp).sum(axis=1, keepdims=True) / cnt, 0.0)
+                    dy = np.where(wp, yp - yp.sum(axis=1, keepdims=True) / cnt, 0.0)
+                    slope[part] = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1) * 1000
+                out[name][ok] = np.where(first, slope, 0)
+        return out
+
+    def series_slope(self, stock_close, name=None, window=50):
+        # 单只 Series 的版本，走同一套计算
+        name = self.pick(name)
+        if name is None: return 0
+        s = stock_close.dropna().sort_index()
+        d = s.index.values.astype('datetime64[ns]').view('i8')
+        return float(self.slopes([(d, s.to_numpy(dtype='f8'))], window)[name][0])
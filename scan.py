@@ -0,0 +1,29 @@
+import sys
+import argparse
+import importlib
+
+# ==========================================
+# 统一入口: python scan.py <nano|wyckoff> [子命令参数...]
+# ==========================================
+# 这里只 import 标准库；选定子命令后才加载对应模块 (pandas 等随之加载，
+# yfinance / requests 到第一次下载时才加载)。子命令的参数原样交给模块的 main，
+# 例如 python scan.py wyckoff --compact、python scan.py nano --daemon。
+
+COMMANDS = {
+    'nano': ('monitor', "纳米盘雷达 (单次扫描 / --daemon 盘中常驻)"),
+    'wyckoff': ('wyckoff_scan', "威科夫全市场扫描"),
+}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="scan", description="扫描器入口",
+                                epilog="\n".join(f"  {k:<10}{h}" for k, (_, h) in COMMANDS.items()),
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("command", choices=sorted(COMMANDS))
+    p.add_argument("args", nargs=argparse.REMAINDER, help="传给子命令的参数 (子命令 --help 查看)")
+    args = p.parse_args(argv)
+    return importlib.import_module(COMMANDS[args.command][0]).main(args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+
+from checkpoint import trading_day
+
+# ==========================================
+# 信号历史库 (SQLite，只追加)
+# ==========================================
+# 每次扫描记一行 runs，每个命中记一行 signals (代码、信号、价格 / 止损 / 触发价，
+# 完整记录和策略参数存 JSON)。索引在 (day) 和 (symbol, signal) 上，常用查询:
+#   - 某只股票第一次出这个信号是哪天          first_seen
+#   - 本次相对上一次运行新出现的信号          new_since_last
+#   - 最近 N 个交易日里每个信号持续了几天      persistence
+# 同一个 run_key (例如断点续跑的 run_id) 重复写入时覆盖该次运行，不会记两遍。
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scanner TEXT NOT NULL,
+    run_key TEXT UNIQUE,
+    day TEXT NOT NULL,
+    ts REAL NOT NULL,
+    params TEXT
+);
+CREATE TABLE IF NOT EXISTS signals (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    scanner TEXT NOT NULL,
+    day TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    signal TEXT NOT NULL,
+    price REAL,
+    stop REAL,
+    trigger REAL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_signals_day ON signals(day);
+CREATE INDEX IF NOT EXISTS idx_signals_symbol ON signals(symbol, signal);
+CREATE INDEX IF NOT EXISTS idx_signals_run ON signals(run_id);
+CREATE INDEX IF NOT EXISTS idx_runs_scanner ON runs(scanner, id);
+"""
+
+
+def _plain(o):
+    return o.item() if hasattr(o, 'item') else str(o)
+
+
+def _num(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return None
+
+
+def params_of(obj):
+    # 分析器上的标量参数 (阈值等)，记进 runs.params
+    return {k: v for k, v in vars(obj).items() if not k.startswith('_') and isinstance(v, (int, float, str))}
+
+
+class SignalStore:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("SIGNAL_DB", os.path.join(".cache", "signals.db"))
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def record(self, scanner, items, params=None, run_key=None, day=None):
+        # 写入一次运行的全部命中，返回 run id
+        day = day or trading_day()
+        with self.db:
+            if run_key is not None:
+                old = self.db.execute("SELECT id FROM runs WHERE run_key = ?", (run_key,)).fetchone()
+                if old is not None:
+                    self.db.execute("DELETE FROM signals WHERE run_id = ?", (old['id'],))
+                    self.db.execute("DELETE FROM runs WHERE id = ?", (old['id'],))
+            run_id = self.db.execute(
+                "INSERT INTO runs (scanner, run_key, day, ts, params) VALUES (?, ?, ?, ?, ?)",
+                (scanner, run_key, day, time.time(), json.dumps(params or {}, default=_plain))).lastrowid
+            self.db.executemany(
+                "INSERT INTO signals (run_id, scanner, day, symbol, signal, price, stop, trigger, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, scanner, day, r['Symbol'], r['Signal'], _num(r.get('Price', r.get('Close'))),
+                  _num(r.get('Stop')), _num(r.get('Trigger')), json.dumps(dict(r), default=_plain)) for r in items])
+        return run_id
+
+    def discard(self, run_id):
+        # 删掉一次运行 (报告没发出去时调用)，下一次运行仍和更早的那次比较，新信号不会丢
+        with self.db:
+            self.db.execute("DELETE FROM signals WHERE run_id = ?", (run_id,))
+            self.db.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+
+    def previous_run(self, scanner, run_id):
+        row = self.db.execute("SELECT id FROM runs WHERE scanner = ? AND id < ? ORDER BY id DESC LIMIT 1",
+                              (scanner, run_id)).fetchone()
+        return row['id'] if row else None
+
+    def new_since_last(self, scanner, run_id):
+        # 本次运行里上一次运行没有的 (代码, 信号)；没有上一次运行时全部算新
+        prev = self.previous_run(scanner, run_id)
+        rows = self.db.execute(
+            "SELECT s.symbol, s.signal FROM signals s WHERE s.run_id = ? AND NOT EXISTS "
+            "(SELECT 1 FROM signals p WHERE p.run_id = ? AND p.symbol = s.symbol AND p.signal = s.signal)",
+            (run_id, prev if prev is not None else -1)).fetchall()
+        return {(r['symbol'], r['signal']) for r in rows}
+
+    def first_seen(self, symbol, signal=None):
+        # 第一次出现的交易日，没有记录返回 None
+        sql, args = "SELECT MIN(day) AS day FROM signals WHERE symbol = ?", [symbol]
+        if signal is not None: sql, args = sql + " AND signal = ?", args + [signal]
+        return self.db.execute(sql, args).fetchone()['day']
+
+    def persistence(self, days=5, scanner=None):
+        # 最近 days 个有记录的交易日里，每个 (代码, 信号) 出现的天数，按天数降序
+        sql = "SELECT DISTINCT day FROM signals" + (" WHERE scanner = ?" if scanner else "") + " ORDER BY day DESC LIMIT ?"
+        recent = [r['day'] for r in self.db.execute(sql, ([scanner] if scanner else []) + [days])]
+        if not recent: return []
+        sql = ("SELECT symbol, signal, COUNT(DISTINCT day) AS days, MIN(day) AS first, MAX(day) AS last "
+               "FROM signals WHERE day >= ?" + (" AND scanner = ?" if scanner else "") +
+               " GROUP BY symbol, signal ORDER BY days DESC, symbol")
+        return [dict(r) for r in self.db.execute(sql, [recent[-1]] + ([scanner] if scanner else []))]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="信号历史查询")
+    p.add_argument("--db", default=None)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    q = sub.add_parser("first", help="某只股票第一次出信号的日期")
+    q.add_argument("symbol"); q.add_argument("--signal")
+    q = sub.add_parser("new", help="最近一次运行新出现的信号")
+    q.add_argument("scanner", choices=["nano", "wyckoff"])
+    q = sub.add_parser("persist", help="最近 N 个交易日的信号持续天数")
+    q.add_argument("--days", type=int, default=5); q.add_argument("--scanner")
+    args = p.parse_args(argv)
+
+    store = SignalStore(args.db)
+    if args.cmd == "first":
+        print(store.first_seen(args.symbol, args.signal) or "无记录")
+    elif args.cmd == "new":
+        row = store.db.execute("SELECT MAX(id) AS id FROM runs WHERE scanner = ?", (args.scanner,)).fetchone()
+        for sym, sig in sorted(store.new_since_last(args.scanner, row['id']) if row['id'] else []): print(sym, sig)
+    else:
+        for r in store.persistence(args.days, args.scanner):
+            print(f"{r['symbol']:<8} {r['signal']:<14} {r['days']} 天 ({r['first']} ~ {r['last']})")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
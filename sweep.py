@@ -0,0 +1,211 @@
+import argparse
+import itertools
+import random
+import numpy as np
+import pandas as pd
+from multiprocessing import get_context
+
+from engine import STRATEGIES, load_builtin
+from backtest import HistoryFeatures, DayView, HORIZONS, simulate, add_history_args, history_ctx, history_tasks
+from monitor import NanoAnalyzer
+from wyckoff_scan import WyckoffAnalyzer
+from metrics import metrics
+
+# ==========================================
+# 参数扫描: 网格 / 随机搜索，在历史数据上比较命中率和前向收益
+# ==========================================
+# 按股票分任务: 每只股票的 HistoryFeatures 只建一次，所有参数组共用。尾部矩阵、
+# TR、分位数以及分析器里与阈值无关的部分 (nano.base / wyckoff.base / RS) 都记在
+# feats 里，每组参数只重做阈值比较和命中后的打分；同一笔信号的进出场模拟也只算一次。
+# 进程内先把一组股票的统计量累加好再返回，主进程只做求和。
+
+SPACE = {
+    'nano': {
+        'atr_period': [7, 10, 14],
+        'box_days': [10, 15, 20],
+        'trigger_buffer': [0.25, 0.5, 0.75],
+        'min_vol_low': [0.02, 0.03],
+        'min_vol_high': [0.02, 0.03, 0.04],
+        'min_rvol': [1.5, 2.0, 2.5, 3.0],
+        'max_change': [5.0, 8.0, 12.0],
+        'min_change': [-3.0, -1.0, 0.0],
+    },
+    'wyckoff': {
+        'min_score': [2.0, 2.5, 3.0, 3.5],
+        'dry_vr': [20, 30, 40],
+        'absorb_vr': [80, 85, 90],
+        'sos_vr': [60, 70, 80],
+        'spring_band': [1.01, 1.03, 1.05],
+        'coil': [0.6, 0.8, 1.0],
+    },
+}
+SETUPS = {'nano': ('Ambush', 'Compression'), 'wyckoff': ('Spring', 'SOS')}
+# 每组参数 × 形态累加的统计量
+STATS = ['Signals', 'Entered', 'Wins', 'Ret'] + [f'{k}{h}' for h in HORIZONS for k in ('Fwd', 'FwdN', 'FwdUp')]
+
+
+def parse_grid(specs):
+    # ["box_days=10,15", "coil=0.6,0.8"] -> {参数: [值]}
+    out = {}
+    for spec in specs:
+        k, _, vals = spec.partition("=")
+        out[k.strip()] = [float(v) if any(c in v for c in ".e") else int(v) for v in vals.split(",") if v]
+    return out
+
+
+def combos(space, n=None, seed=0):
+    # 全网格，或不放回地随机抽 n 组 (按下标解码，不展开整个网格)
+    keys = list(space)
+    sizes = [len(space[k]) for k in keys]
+    total = int(np.prod(sizes)) if keys else 1
+    picks = range(total) if not n or n >= total else sorted(random.Random(seed).sample(range(total), n))
+    out = []
+    for idx in picks:
+        params = {}
+        for k, size in zip(reversed(keys), reversed(sizes)):
+            idx, r = divmod(idx, size)
+            params[k] = space[k][r]
+        out.append({k: params[k] for k in keys})
+    return out
+
+
+def signals(family, params, view, feats, ctx):
+    # 一组参数在一只股票全部历史上的信号: [(形态, 交易日, Trigger, Stop)]
+    if family == 'nano':
+        hits = NanoAnalyzer(**params).analyze_batch(view, feats)
+        return [(k, key, r.get('Trigger'), r.get('Stop')) for key, res in hits.items() for k, r in res.items()]
+    base = ctx['wyckoff']
+    an = WyckoffAnalyzer(base.rs_bench, **params)
+    an.bench_data = base.bench_data
+    return [('Spring' if 'Spring' in r['Signal'] else 'SOS', r['Symbol'], None, r['Stop'])
+            for r in an.analyze_batch(view, feats)]
+
+
+# ---------- 每个进程一份参数表 ----------
+_worker = {}
+
+
+def _init_worker(family, grid, ctx, hold, entry_days):
+    load_builtin()
+    period = next(c.period for c in STRATEGIES.values() if c.family == family)
+    _worker.update(family=family, grid=grid, ctx=ctx, period=period, hold=hold, entry_days=entry_days)
+
+
+def sweep_symbol(symbol, dates, values, acc):
+    w = _worker
+    setups = SETUPS[w['family']]
+    view = DayView(dates, values)
+    feats = HistoryFeatures(dates, values, w['period'])
+    sim = {}
+    for ci, params in enumerate(w['grid']):
+        for setup, key, trigger, stop in signals(w['family'], params, view, feats, w['ctx']):
+            i = view.pos[key]
+            if (i, trigger, stop) not in sim:
+                sim[i, trigger, stop] = simulate(values, i, trigger, stop, w['hold'], w['entry_days'])
+            res = sim[i, trigger, stop]
+            row = acc[ci, setups.index(setup)]
+            row[0] += 1
+            r = res.get('Return', np.nan)
+            if r == r: row[1] += 1; row[2] += r > 0; row[3] += r
+            for k, h in enumerate(HORIZONS):
+                f = res[f'Fwd{h}']
+                if f == f: row[4 + 3 * k] += f; row[5 + 3 * k] += 1; row[6 + 3 * k] += f > 0
+
+
+def _run_chunk(tasks):
+    w = _worker
+    acc = np.zeros((len(w['grid']), len(SETUPS[w['family']]), len(STATS)))
+    for t in tasks:
+        try:
+            sweep_symbol(*t, acc)
+        except Exception as e:
+            metrics.error("sweep", e)
+    return acc, len(tasks)
+
+
+def run(tasks, family, grid, ctx=None, workers=1, hold=20, entry_days=5, chunk=20):
+    # 返回 (参数组数, 形态数, len(STATS)) 的累计统计
+    ctx = ctx if ctx is not None else {}
+    it = iter(tasks)
+    chunks = iter(lambda: list(itertools.islice(it, chunk)), [])
+    total = np.zeros((len(grid), len(SETUPS[family]), len(STATS)))
+    done = 0
+    if workers <= 1:
+        _init_worker(family, grid, ctx, hold, entry_days)
+        parts = map(_run_chunk, chunks)
+    else:
+        pool = get_context().Pool(workers, initializer=_init_worker, initargs=(family, grid, ctx, hold, entry_days))
+        parts = pool.imap_unordered(_run_chunk, chunks)
+    try:
+        for acc, n in parts:
+            total += acc
+            done += n
+            print(f"   已扫描 {done} 只...", end="\r")
+    finally:
+        if workers > 1: pool.close(); pool.join()
+    return total
+
+
+def table(family, grid, total):
+    rows = []
+    for ci, params in enumerate(grid):
+        for si, setup in enumerate(SETUPS[family]):
+            s = dict(zip(STATS, total[ci, si]))
+            row = dict(params, Setup=setup, Signals=int(s['Signals']), Entered=int(s['Entered']))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                row['WinRate%'] = round(s['Wins'] / s['Entered'] * 100, 1)
+                row['AvgRet%'] = round(s['Ret'] / s['Entered'] * 100, 2)
+                for h in HORIZONS:
+                    row[f'Hit{h}%'] = round(s[f'FwdUp{h}'] / s[f'FwdN{h}'] * 100, 1)
+                    row[f'Fwd{h}%'] = round(s[f'Fwd{h}'] / s[f'FwdN{h}'] * 100, 2)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    load_builtin()
+    p = argparse.ArgumentParser(description="策略参数扫描: 网格 / 随机搜索")
+    p.add_argument("family", choices=sorted(SPACE))
+    p.add_argument("--grid", nargs="*", default=[], help='"参数=值1,值2"，只扫给出的参数；默认用 SPACE 的网格')
+    p.add_argument("--random", type=int, help="从网格中随机抽 N 组")
+    p.add_argument("--seed", type=int, default=0)
+    add_history_args(p)
+    p.add_argument("--hold", type=int, default=20, help="最长持有天数")
+    p.add_argument("--entry-days", type=int, default=5, help="Trigger 信号等待突破的天数")
+    p.add_argument("--rank", default="AvgRet%", help="排序列，如 WinRate% / Hit5% / Fwd20%")
+    p.add_argument("--min-signals", type=int, default=30, help="信号数少于此的组合排在最后")
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--out", help="默认 sweep_<family>.csv")
+    args = p.parse_args(argv)
+
+    space = parse_grid(args.grid) if args.grid else SPACE[args.family]
+    grid = combos(space, args.random, args.seed)
+    try:
+        for params in grid[:1]: (NanoAnalyzer if args.family == 'nano' else WyckoffAnalyzer)(**params)
+    except ValueError as e:
+        p.error(str(e))
+    metrics.reset(f"sweep_{args.family}")
+
+    ctx = history_ctx(args, {args.family})
+    picks = [c() for c in STRATEGIES.values() if c.family == args.family]
+    tickers, tasks = history_tasks(args, picks)
+    print(f"🔧 参数扫描 {args.family}: {len(grid)} 组 | {len(tickers)} 只 × {args.period} | {args.workers} 进程")
+
+    with metrics.timer("sweep"):
+        total = run(tasks, args.family, grid, ctx, args.workers, args.hold, args.entry_days)
+    print()
+    df = table(args.family, grid, total)
+    if args.rank not in df.columns: p.error(f"没有这一列: {args.rank}")
+    enough = df['Signals'] >= args.min_signals
+    df = pd.concat([df[enough].sort_values(args.rank, ascending=False), df[~enough]])
+    out = args.out or f"sweep_{args.family}.csv"
+    df.to_csv(out, index=False)
+    print(f"💾 {len(df)} 行 -> {out}")
+    print(df.head(args.top).to_string(index=False))
+    metrics.print_summary()
+    metrics.write(args.metrics_dir)
+    return df
+
+
+if __name__ == "__main__":
+    main()
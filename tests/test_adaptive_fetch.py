@@ -0,0 +1,24 @@
+import time
+
+from bench.fake_backend import FakeYahoo
+from bench.synthetic import symbols
+from pipeline import AdaptiveFetcher
+
+# 重试队列等退避期间，已经下完的批次要先交出去，不能陪着一起等
+
+
+def test_ready_batches_not_held_by_backoff():
+    tickers = symbols(200)
+    src = FakeYahoo(bad=[tickers[5]])
+    f = AdaptiveFetcher(src.download, size=20, retries=2, backoff=0.5, max_backoff=0.5)
+    t0 = time.perf_counter()
+    seen = []
+    for batch, data in f.run(tickers, lambda b: f.download(b, period="1y", group_by='ticker'), workers=2):
+        got = set(data.columns.get_level_values(0)) if data is not None else set()
+        seen.append((time.perf_counter() - t0, got))
+    done = set().union(*(g for _, g in seen))
+    assert done == set(tickers) - {tickers[5]}
+    assert f.stats['retries'] == 2 and f.stats['failed'] == 1
+    # 两次退避共约 1 秒，其余 199 只在第一次退避到期前就已交出
+    assert max(t for t, g in seen if g) < 0.4
+    assert time.perf_counter() - t0 >= 1.0
@@ -0,0 +1,8 @@
+from bench import bench_fetch
+
+# 自适应下载在坏代码 + 随机失败 + 批次上限下的校验 (断言在 bench_fetch.main 里)
+
+
+def test_adaptive_isolates_bad_tickers():
+    bench_fetch.main(["--tickers", "600", "--latency", "0", "--backoff", "0.01", "--fail-rate", "0.1",
+                      "--bad", "4", "--max-batch", "80"])
@@ -0,0 +1,7 @@
+from bench import bench_notify
+
+# 本地 SMTP 上复用连接 + 去重 + 汇总间隔 + 451 重试的校验 (断言在 bench_notify.main 里)
+
+
+def test_digest_reuses_session_and_retries():
+    bench_notify.main(["--runs", "8", "--latency", "0", "--every", "60", "--fail", "2"])
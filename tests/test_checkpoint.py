@@ -0,0 +1,50 @@
+import json
+
+from checkpoint import ScanCheckpoint, trading_day
+
+# 断点: 同一 run_id 续跑、提交幂等落盘、完成后跳过、名单快照不重拉
+
+
+def test_trading_day_rolls_weekend_back():
+    assert trading_day("2026-10-17 10:00") == "2026-10-16"     # 周六 -> 周五
+    assert trading_day("2026-10-19 10:00") == "2026-10-19"
+    assert ScanCheckpoint("wyckoff", root="x").run_id == f"wyckoff-{trading_day()}"
+
+
+def test_resume_same_run_id(tmp_path):
+    root = str(tmp_path)
+    calls = []
+    load = lambda: calls.append(1) or ['A', 'B', 'C', 'D']
+    ck = ScanCheckpoint("wyckoff", "r1", root=root)
+    assert not ck.resumed and ck.universe(load) == ['A', 'B', 'C', 'D']
+    ck.commit(['A', 'B'], [{'Symbol': 'A', 'Signal': 'Spring'}])
+
+    again = ScanCheckpoint("wyckoff", "r1", root=root)
+    assert again.resumed and not again.finished
+    # 续跑用第一次的名单快照，不再调用 load
+    assert again.universe(load) == ['A', 'B', 'C', 'D'] and len(calls) == 1
+    assert again.pending() == ['C', 'D']
+    assert again.results == [{'Symbol': 'A', 'Signal': 'Spring'}]
+    again.commit(['C', 'D'], [])
+    again.finish()
+
+    done = ScanCheckpoint("wyckoff", "r1", root=root)
+    assert done.finished and done.pending() == []
+    assert not ScanCheckpoint("wyckoff", "r2", root=root).resumed
+
+
+def test_commit_is_atomic_and_reset(tmp_path):
+    ck = ScanCheckpoint("nano", "r", root=str(tmp_path))
+    ck.universe(lambda: ['A', 'B'])
+    ck.commit(['A'], [])
+    ck.commit(['A'], [])
+    state = json.load(open(ck.path, encoding='utf-8'))
+    assert state['done'] == ['A'] and not (tmp_path / "r.json.tmp").exists()
+    ck.reset()
+    assert not (tmp_path / "r.json").exists() and not ScanCheckpoint("nano", "r", root=str(tmp_path)).resumed
+
+
+def test_prune_keeps_latest(tmp_path):
+    for k in range(5):
+        ScanCheckpoint("w", f"r{k}", root=str(tmp_path), keep=3).universe(lambda: ['A'])
+    assert len(list(tmp_path.glob("*.json"))) == 3
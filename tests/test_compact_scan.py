@@ -0,0 +1,37 @@
+import io
+import contextlib
+
+from bench.synthetic import make_market, screener_rows, benchmark_series, FIELDS
+from bench.fake_backend import FakeYahoo, FakeScreener, install
+from checkpoint import ScanCheckpoint
+import wyckoff_scan as ws
+
+# --compact 也要逐批分析、逐批提交断点，信号与 float64 模式相同
+
+
+def scan(tmp_path, monkeypatch, flags):
+    frames, _ = make_market(450, days=260, seed=3, price=(1, 80), plant={'Spring': 0.05, 'SOS': 0.05})
+    market = dict(frames)
+    b = benchmark_series(260)
+    for name in ('QQQ', 'SPY', 'IWM'):
+        market[name] = b.to_frame().assign(Open=b, High=b, Low=b, Volume=1e6)[FIELDS]
+    monkeypatch.chdir(tmp_path)
+    for k, v in dict(UNIVERSE_CACHE=str(tmp_path / "universe.json"), OHLCV_CACHE="0", METRICS_DIR=str(tmp_path / "m"),
+                     CHECKPOINT_DIR=str(tmp_path / "ckpt")).items():
+        monkeypatch.setenv(k, v)
+    commits, sent = [], []
+    real = ScanCheckpoint.commit
+    monkeypatch.setattr(ScanCheckpoint, "commit", lambda self, s, r: (commits.append(len(s)), real(self, s, r)))
+    monkeypatch.setattr(ws, "send_email", lambda r: sent.extend(r) or True)
+    with install(FakeYahoo(market=market), FakeScreener(screener_rows(frames)), modules=(ws,)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ws.main(["--rate", "0", "--no-probe", "--no-store", "--all", "--batch-size", "100",
+                     "--max-batch-size", "100", "--run-id", "t", "--fresh"] + flags)
+    return commits, sorted((r['Symbol'], r['Signal']) for r in sent)
+
+
+def test_compact_commits_per_batch(tmp_path, monkeypatch):
+    commits, compact = scan(tmp_path, monkeypatch, ["--compact"])
+    assert len(commits) > 1 and max(commits) <= 100
+    _, ref = scan(tmp_path, monkeypatch, [])
+    assert compact == ref and compact
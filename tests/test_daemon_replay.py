@@ -0,0 +1,64 @@
+import io
+import contextlib
+from collections import Counter
+
+from bench.synthetic import make_market, screener_rows
+from bench.fake_backend import FakeScreener, install
+from live import ReplayFeed
+from ohlcv_cache import OHLCVCache
+import monitor
+
+# 常驻模式 (--replay 本地回放): 每个新命中只报一次，并且与同一天的单次扫描结果一致
+
+
+def setup(tmp_path, monkeypatch):
+    frames, _ = make_market(200, days=160, seed=4, price=(0.3, 5), plant={'Ambush': 0.05, 'Compression': 0.05})
+    cache = OHLCVCache(str(tmp_path / "ohlcv"))
+    for s, df in frames.items(): cache.write(s, df, df.index[0])
+    monkeypatch.chdir(tmp_path)
+    for k, v in dict(UNIVERSE_CACHE=str(tmp_path / "universe.json"), UNIVERSE_TTL="0", OHLCV_CACHE="0",
+                     METRICS_DIR=str(tmp_path / "m"), SIGNAL_STORE="0", NOTIFY_DIR=str(tmp_path), REPORT_ALL="1").items():
+        monkeypatch.setenv(k, v)
+    # 两种模式都经过 collect，把每次报出来的 (代码, 形态) 按回放日记下来
+    seen = []
+    collect = monitor.collect
+    def record(hits, panel, *lists):
+        seen.append([(s, k) for s, r in hits.items() for k in r])
+        return collect(hits, panel, *lists)
+    monkeypatch.setattr(monitor, "collect", record)
+    return frames, seen
+
+
+def daemon(tmp_path, days, steps):
+    args = monitor.parse_args(["--replay", str(tmp_path / "ohlcv"), "--replay-days", str(days),
+                               "--replay-steps", str(steps), "--metrics-dir", str(tmp_path / "m")])
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor.run_daemon(args)
+
+
+def test_alerts_once_per_hit(tmp_path, monkeypatch):
+    frames, seen = setup(tmp_path, monkeypatch)
+    daemon(tmp_path, days=3, steps=3)
+    assert len(seen) == 9 and any(seen)
+    for d in range(3):
+        fired = Counter(h for tick in seen[d * 3:(d + 1) * 3] for h in tick)
+        assert all(n == 1 for n in fired.values())
+
+
+def test_matches_run_scan(tmp_path, monkeypatch):
+    frames, seen = setup(tmp_path, monkeypatch)
+    daemon(tmp_path, days=3, steps=1)
+    live = seen[:]
+    del seen[:]
+    feed = ReplayFeed(frames, days=3, steps=1)
+    scans = []
+    with install(feed, FakeScreener(screener_rows(frames)), modules=(monitor,)):
+        tickers = set(monitor.get_nasdaq_tickers(min_p=0.2, max_p=5.0))
+        while True:
+            with contextlib.redirect_stdout(io.StringIO()): monitor.run_scan()
+            scans.append(sorted(h for tick in seen for h in tick))
+            del seen[:]
+            if not feed.advance(): break
+    assert len(scans) == 3 and any(scans)
+    # 单次扫描只看 screener 名单里的，常驻回放跟踪缓存里的全部代码
+    assert scans == [sorted(h for h in tick if h[0] in tickers) for tick in live]
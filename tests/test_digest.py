@@ -0,0 +1,73 @@
+import io
+import contextlib
+
+from bench.synthetic import make_market, screener_rows
+from bench.fake_backend import FakeYahoo, FakeScreener, install
+from bench.smtp_server import LocalSMTP
+from live import MarketClock
+import monitor
+import notify
+from notify import Digest
+
+# 发不出邮件时 pending 不能无限增长
+
+
+def items(k, n):
+    return [{'Symbol': f"S{k}_{i}", 'Signal': 'Ambush'} for i in range(n)]
+
+
+def test_pending_capped(tmp_path):
+    d = Digest("t", every=3600, path=str(tmp_path / "n.json"), max_pending=25)
+    for k in range(5):
+        d.add(items(k, 10), now=k)
+    assert len(d.pending) == 25
+    assert d.pending[-1]['Symbol'] == "S4_9"
+    assert len(Digest("t", path=str(tmp_path / "n.json")).pending) == 25
+
+
+def test_drop_keeps_signal_reportable(tmp_path):
+    d = Digest("t", path=str(tmp_path / "n.json"))
+    d.add(items(0, 3), now=0)
+    assert d.drop() == 3 and not d.pending
+    assert d.add(items(0, 3), now=1) == 3
+
+
+def test_unconfigured_mailer_does_not_accumulate(tmp_path, monkeypatch):
+    frames, _ = make_market(300, days=260, seed=5, price=(0.3, 5), plant={'Ambush': 0.05, 'Compression': 0.05})
+    monkeypatch.chdir(tmp_path)
+    for k, v in dict(UNIVERSE_CACHE=str(tmp_path / "universe.json"), OHLCV_CACHE="0", METRICS_DIR=str(tmp_path / "m"),
+                     SIGNAL_STORE="0", NOTIFY_DIR=str(tmp_path), NOTIFY_EVERY="0", NOTIFY_DEDUP="0").items():
+        monkeypatch.setenv(k, v)
+    for k in ("MAIL_USER", "MAIL_PASS", "MAIL_TO"):
+        monkeypatch.delenv(k, raising=False)
+    monkeypatch.setattr(notify, "_mailer", None)
+    out = io.StringIO()
+    with install(FakeYahoo(market=frames), FakeScreener(screener_rows(frames)), modules=(monitor,)):
+        with contextlib.redirect_stdout(out):
+            for _ in range(2): monitor.run_scan()
+    assert "📭" in out.getvalue()
+    assert not Digest("nano").pending
+
+
+def test_daemon_shares_digest_with_run_scan(tmp_path, monkeypatch):
+    # 常驻模式的报警也走 Digest: 重启后 / 单次扫描不会把同一信号再发一遍，汇总间隔内不连发
+    frames, _ = make_market(300, days=260, seed=5, price=(0.3, 5), plant={'Ambush': 0.05, 'Compression': 0.05})
+    monkeypatch.chdir(tmp_path)
+    for k, v in dict(UNIVERSE_CACHE=str(tmp_path / "universe.json"), OHLCV_CACHE="0", METRICS_DIR=str(tmp_path / "m"),
+                     SIGNAL_STORE="0", NOTIFY_DIR=str(tmp_path), NOTIFY_EVERY="3600").items():
+        monkeypatch.setenv(k, v)
+    # 周末 / 盘后也当作开盘
+    monkeypatch.setattr(monitor, "MarketClock", lambda hours, tz: MarketClock("00:00-23:59", "UTC", weekdays=range(7)))
+    monkeypatch.setattr(monitor.limiter, "rate", 0)
+    args = monitor.parse_args(["--daemon", "--max-ticks", "2", "--interval", "0"])
+    with LocalSMTP() as srv, install(FakeYahoo(market=frames), FakeScreener(screener_rows(frames)), modules=(monitor,)):
+        for k, v in srv.env().items(): monkeypatch.setenv(k, v)
+        monkeypatch.setattr(notify, "_mailer", None)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            for _ in range(2): monitor.run_daemon(args)
+            monitor.run_scan()
+        notify.mailer().close()
+    assert "🎯" in out.getvalue()
+    assert len(srv.messages) == 1
+    assert not Digest("nano").pending
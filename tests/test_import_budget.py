@@ -0,0 +1,10 @@
+import os
+
+from bench import bench_import
+
+# 入口模块的冷启动预算，且 import 时不提前加载 yfinance / requests / scipy (判定在 bench_import.main 里)。
+# 每个模块要起子进程量 3 次；慢机器上用 IMPORT_BUDGET_SCALE 放宽预算倍数
+
+
+def test_import_budget():
+    assert bench_import.main(["--scale", os.environ.get("IMPORT_BUDGET_SCALE", "1.0")]) == 0
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from bench.synthetic import make_market
+from panel import Panel
+from monitor import NanoAnalyzer
+
+# NanoAnalyzer.analyze_batch 必须与逐只 analyze 的结果逐位一致
+
+
+def market(seed=0):
+    frames, planted = make_market(300, days=130, seed=seed, price=(0.3, 6),
+                                  plant={'Ambush': 0.1, 'Compression': 0.1})
+    rng = np.random.default_rng(seed)
+    names = list(frames)
+    for k, s in enumerate(names):
+        df = frames[s]
+        if k % 7 == 0:
+            # 零散空值 (停牌 / 缺字段)
+            for f in ('Open', 'High', 'Low', 'Close', 'Volume'):
+                df.loc[df.index[rng.choice(len(df) - 1, 3, replace=False)], f] = np.nan
+        if k % 11 == 0:
+            # 并列: 成交量和价格大量重复
+            df['Volume'] = (df['Volume'] // 50000) * 50000
+            df[['Open', 'High', 'Low', 'Close']] = df[['Open', 'High', 'Low', 'Close']].round(1)
+        if k % 13 == 0:
+            # 历史不足 60 根 / 刚好 60 根
+            frames[s] = df.iloc[-(45 if k % 2 else 60):]
+    return frames, planted
+
+
+SETUPS = [{}, dict(box_days=10, min_rvol=1.5, atr_period=14, min_change=-1.0),
+          dict(trigger_buffer=0.2, min_vol_low=0.01, max_change=4.0)]
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("params", SETUPS)
+def test_batch_matches_scalar(seed, params):
+    frames, planted = market(seed)
+    nano = NanoAnalyzer(**params)
+    ref = {}
+    for s, df in frames.items():
+        r = nano.analyze(s, df)
+        if r: ref.update(r)
+    assert ref, "合成行情里应当有信号"
+    assert nano.analyze_batch(frames) == ref
+    assert nano.analyze_batch(Panel.from_frames(frames)) == ref
+
+
+def test_planted_found():
+    frames, planted = market(2)
+    hits = NanoAnalyzer().analyze_batch(frames)
+    found = [s for s in planted['Compression'] if 'Compression' in hits.get(s, {})]
+    assert len(found) >= len(planted['Compression']) // 2
+
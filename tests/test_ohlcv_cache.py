@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from ohlcv_cache import OHLCVCache, period_start, FIELDS
+
+# K 线缓存: 只补最新几根、重叠区价格变了 (复权) 整段重拉、增量失败沿用旧数据
+
+
+def bars(index, scale=1.0):
+    c = np.linspace(10, 20, len(index)) * scale
+    return pd.DataFrame({'Open': c, 'High': c * 1.01, 'Low': c * 0.99, 'Close': c, 'Volume': 1e6}, index=index)
+
+
+class Source:
+    # 假数据源: 每次调用记下 (代码, period, start)
+    def __init__(self, frames):
+        self.frames, self.calls = frames, []
+
+    def __call__(self, tickers, period=None, start=None):
+        self.calls.append((tuple(tickers), period, start))
+        lo = pd.Timestamp(start) if start else period_start(period)
+        out = {t: df[df.index >= lo] for t, df in self.frames.items() if t in tickers}
+        return pd.concat(out, axis=1) if out else pd.DataFrame()
+
+
+def index(end, n=120):
+    return pd.bdate_range(end=end, periods=n, name='Date')
+
+
+def test_topup_only_requests_new_bars(tmp_path):
+    idx = index(pd.Timestamp.today().normalize())
+    src = Source({'A': bars(idx[:-3]), 'B': bars(idx[:-3], 2)})
+    cache = OHLCVCache(str(tmp_path))
+    first = cache.fetch(['A', 'B'], '3mo', src)
+    assert cache.stats['full'] == 2 and src.calls[0][1] == '3mo'
+    src.frames = {'A': bars(idx), 'B': bars(idx, 2)}
+    got = OHLCVCache(str(tmp_path)).fetch(['A', 'B'], '3mo', src)
+    # 第二次只从倒数第 overlap 根开始要
+    assert src.calls[1][1] is None and src.calls[1][2] == idx[-5].strftime('%Y-%m-%d')
+    want = src.frames['A'][src.frames['A'].index >= period_start('3mo')]
+    pd.testing.assert_frame_equal(got['A'], want, check_freq=False)
+    assert len(got['A']) == len(first['A']) + 3
+
+
+def test_adjustment_triggers_full_refetch(tmp_path):
+    idx = index(pd.Timestamp.today().normalize())
+    src = Source({'A': bars(idx[:-2])})
+    OHLCVCache(str(tmp_path)).fetch(['A'], '3mo', src)
+    # 拆股 / 分红复权后历史价格整体变了
+    src.frames = {'A': bars(idx, 0.5)}
+    cache = OHLCVCache(str(tmp_path))
+    got = cache.fetch(['A'], '3mo', src)
+    assert cache.stats['refetch'] == 1 and cache.stats['full'] == 1
+    want = src.frames['A']['Close'][src.frames['A'].index >= period_start('3mo')]
+    assert np.allclose(got['A']['Close'], want) and np.allclose(cache.read('A')['Close'], want)
+
+
+def test_failed_topup_keeps_cached(tmp_path):
+    idx = index(pd.Timestamp.today().normalize())
+    OHLCVCache(str(tmp_path)).fetch(['A'], '3mo', Source({'A': bars(idx)}))
+    cache = OHLCVCache(str(tmp_path))
+    got = cache.fetch(['A'], '3mo', Source({}))
+    assert cache.stats['stale'] == 1 and list(got['A'].columns) == FIELDS
+    assert got['A'].index[-1] == idx[-1]
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from orderstats import SortedWindow, quantiles, rolling_rank, rolling_quantile
+
+# 顺序统计量: 与 numpy.nanquantile / pandas 逐位一致 (含并列、空值)
+
+QS = (0.0, 0.05, 0.25, 0.5, 0.9, 0.95, 1.0)
+
+
+def data(seed, n=300, ties=False):
+    rng = np.random.default_rng(seed)
+    x = rng.integers(0, 20, n).astype(float) if ties else rng.lognormal(size=n)
+    x[rng.random(n) < 0.05] = np.nan
+    return x
+
+
+@pytest.mark.parametrize("ties", [False, True])
+def test_quantiles_match_numpy(ties):
+    for seed in range(5):
+        x = data(seed, ties=ties)
+        assert quantiles(x, *QS) == tuple(np.nanquantile(x, q) for q in QS)
+        assert quantiles(x, 0.5) == (pd.Series(x).quantile(0.5),)
+    assert np.isnan(quantiles([np.nan, np.nan], 0.5)[0])
+
+
+def test_sorted_window_matches_numpy():
+    x = data(1, ties=True)
+    w = SortedWindow(30)
+    for t, v in enumerate(x):
+        w.push(v)
+        win = x[max(0, t - 29):t + 1]
+        win = win[~np.isnan(win)]
+        if not len(win): continue
+        assert [w.quantile(q) for q in QS] == list(np.quantile(win, QS))
+        assert w.median() == np.median(win) and w.count == len(win)
+    # 改写最新一根 (盘中未收盘)
+    w.replace(100.0)
+    win = np.r_[x[-30:-1], 100.0]
+    assert w.quantile(0.95) == np.nanquantile(win, 0.95) and w.rank() == 1.0
+
+
+def test_rolling_matches_pandas():
+    for ties in (False, True):
+        x = data(2, ties=ties)
+        s = pd.Series(x)
+        assert np.array_equal(rolling_rank(x, 20), s.rolling(20).rank(pct=True).to_numpy(), equal_nan=True)
+        assert np.array_equal(rolling_quantile(x, 20, 0.9), s.rolling(20).quantile(0.9).to_numpy(), equal_nan=True)
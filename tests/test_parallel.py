@@ -0,0 +1,45 @@
+import pytest
+
+from bench.synthetic import make_market, benchmark_series
+from metrics import metrics
+from panel import Panel
+from parallel import ParallelAnalyzer
+from monitor import NanoAnalyzer
+from wyckoff_scan import WyckoffAnalyzer
+
+# 多进程结果与单进程一致；中途出错时进程池要被收掉
+
+
+def test_matches_single_process():
+    frames, _ = make_market(120, days=260, seed=1, price=(0.3, 60), plant={'Spring': 0.05, 'Ambush': 0.05})
+    panel = Panel.from_frames(frames)
+    wa = WyckoffAnalyzer()
+    wa.bench_data = benchmark_series(260)
+    with ParallelAnalyzer(WyckoffAnalyzer, 2, bench_data=wa.bench_data, chunk_size=16) as pa:
+        assert pa.analyze_batch(panel) == wa.analyze_batch(panel)
+    with ParallelAnalyzer(NanoAnalyzer, 2, chunk_size=16) as pa:
+        assert pa.analyze_batch(panel) == NanoAnalyzer().analyze_batch(panel)
+
+
+def test_pool_released_on_error():
+    with pytest.raises(KeyError):
+        with ParallelAnalyzer(NanoAnalyzer, 2) as pa:
+            raise KeyError("boom")
+    assert all(not p.is_alive() for p in pa.pool._pool)
+    with pytest.raises(ValueError):
+        pa.pool.apply_async(len, ([],))
+
+
+def test_worker_metrics_merged():
+    # 子进程里记的漏斗计数要并回主进程，和单进程的数一致
+    frames, _ = make_market(120, days=260, seed=2, price=(0.3, 60), plant={'Spring': 0.05, 'SOS': 0.05})
+    panel = Panel.from_frames(frames)
+    wa = WyckoffAnalyzer()
+    wa.bench_data = benchmark_series(260)
+    metrics.reset()
+    wa.analyze_batch(panel)
+    ref = dict(metrics.counters)
+    metrics.reset()
+    with ParallelAnalyzer(WyckoffAnalyzer, 2, bench_data=wa.bench_data, chunk_size=16) as pa:
+        pa.analyze_batch(panel)
+    assert ref and metrics.counters == ref
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from relstrength import Benchmarks
+
+# RS 斜率: log(股票) - log(基准) 对时间的最小二乘斜率 × 1000，与 linregress 一致
+
+
+def series(n=120, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2026-01-02", periods=n)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, n))), index=idx)
+
+
+def stock(s):
+    return s.index.values.astype('datetime64[ns]').view('i8'), s.to_numpy(dtype='f8')
+
+
+def test_known_slope():
+    qqq = series()
+    b = Benchmarks(qqq)
+    # 股票 = 基准 × exp(0.002 t): RS 斜率正好 2
+    s = qqq * np.exp(0.002 * np.arange(len(qqq)))
+    assert np.isclose(b.series_slope(s), 2.0)
+
+
+def test_matches_linregress():
+    # SciPy 已不是运行依赖，只在测试里拿来做对照
+    linregress = pytest.importorskip("scipy.stats").linregress
+    qqq, spy = series(seed=1), series(seed=2)
+    b = Benchmarks({'QQQ': qqq, 'SPY': spy})
+    stocks = [series(seed=10 + k) for k in range(6)]
+    # 有一只缺几天 (按基准 ffill 对齐)，一只有非正收盘 (先去掉)
+    stocks[1] = stocks[1].drop(stocks[1].index[[70, 90, 100]])
+    stocks[2].iloc[[80, 95]] = [0.0, -1.0]
+    got = b.slopes([stock(s) for s in stocks], window=50)
+    for name, bench in (('QQQ', qqq), ('SPY', spy)):
+        for k, s in enumerate(stocks):
+            s = s[s > 0].iloc[-50:]
+            ratio = np.log(s) - np.log(bench.reindex(s.index).ffill())
+            ref = linregress(np.arange(len(ratio)), ratio.to_numpy()).slope * 1000
+            assert np.isclose(got[name][k], ref), (name, k)
+
+
+def test_short_history_is_zero():
+    b = Benchmarks(series())
+    assert b.slopes([stock(series(n=30, seed=3))], window=50)['QQQ'][0] == 0
@@ -0,0 +1,44 @@
+import io
+import json
+import contextlib
+
+from bench.synthetic import make_market, screener_rows, benchmark_series, FIELDS
+from bench.fake_backend import FakeYahoo, FakeScreener, install
+import wyckoff_scan as ws
+
+# 报告没发出去: 断点不标记完成、本次运行不入库，同一交易日重跑不再下载，把同一份报告补发
+
+
+def test_failed_mail_is_resent(tmp_path, monkeypatch):
+    frames, _ = make_market(150, days=260, seed=3, price=(1, 80), plant={'Spring': 0.08, 'SOS': 0.08})
+    market = dict(frames)
+    b = benchmark_series(260)
+    for name in ('QQQ', 'SPY', 'IWM'):
+        market[name] = b.to_frame().assign(Open=b, High=b, Low=b, Volume=1e6)[FIELDS]
+    monkeypatch.chdir(tmp_path)
+    for k, v in dict(UNIVERSE_CACHE=str(tmp_path / "universe.json"), OHLCV_CACHE="0", METRICS_DIR=str(tmp_path / "m"),
+                     CHECKPOINT_DIR=str(tmp_path / "ckpt"), SIGNAL_DB=str(tmp_path / "signals.db")).items():
+        monkeypatch.setenv(k, v)
+    yahoo = FakeYahoo(market=market)
+    outcome, sent = [False, RuntimeError("smtp down"), True], []
+
+    def send(report):
+        sent.append(sorted((r['Symbol'], r['Signal']) for r in report))
+        ok = outcome.pop(0)
+        if isinstance(ok, Exception): raise ok
+        return ok
+
+    monkeypatch.setattr(ws, "send_email", send)
+    state = lambda: json.load(open(tmp_path / "ckpt" / "t.json", encoding='utf-8'))
+    argv = ["--rate", "0", "--no-probe", "--run-id", "t"]
+    with install(yahoo, FakeScreener(screener_rows(frames)), modules=(ws,)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ws.main(argv)
+            assert not state().get('finished')
+            calls = yahoo.calls
+            ws.main(argv)                 # 发送抛异常: 仍然保留断点
+            assert not state().get('finished') and yahoo.calls == calls + 1   # 只拉了基准
+            ws.main(argv)                 # 这次发出去了
+            assert state().get('finished')
+            ws.main(argv)                 # 已完成: 跳过，不再发
+    assert len(sent) == 3 and sent[0] and sent[0] == sent[1] == sent[2]
@@ -0,0 +1,50 @@
+from signal_store import SignalStore
+
+# 信号库: 相对上一次运行的新信号、run_key 覆盖写、持续天数、首次出现
+
+
+def hits(*pairs):
+    return [{'Symbol': s, 'Signal': k, 'Price': 1.0} for s, k in pairs]
+
+
+def test_new_since_last(tmp_path):
+    db = SignalStore(str(tmp_path / "s.db"))
+    r1 = db.record("wyckoff", hits(('A', 'Spring'), ('B', 'SOS')), day="2026-10-14")
+    assert db.new_since_last("wyckoff", r1) == {('A', 'Spring'), ('B', 'SOS')}
+    r2 = db.record("wyckoff", hits(('A', 'Spring'), ('B', 'Spring'), ('C', 'SOS')), day="2026-10-15")
+    assert db.new_since_last("wyckoff", r2) == {('B', 'Spring'), ('C', 'SOS')}
+    # 另一个扫描器的运行不参与比较
+    db.record("nano", hits(('C', 'SOS')), day="2026-10-15")
+    r3 = db.record("wyckoff", hits(('C', 'SOS'), ('D', 'SOS')), day="2026-10-16")
+    assert db.new_since_last("wyckoff", r3) == {('D', 'SOS')}
+    db.close()
+
+
+def test_run_key_overwrites_and_discard(tmp_path):
+    db = SignalStore(str(tmp_path / "s.db"))
+    db.record("wyckoff", hits(('A', 'Spring')), day="2026-10-15")
+    db.record("wyckoff", hits(('A', 'Spring')), run_key="wyckoff-2026-10-16", day="2026-10-16")
+    # 续跑同一 run_key: 覆盖，仍和前一天比较
+    r = db.record("wyckoff", hits(('A', 'Spring'), ('B', 'SOS')), run_key="wyckoff-2026-10-16", day="2026-10-16")
+    assert db.db.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 2
+    assert db.new_since_last("wyckoff", r) == {('B', 'SOS')}
+    # 没发出去的运行被删掉后，下一次仍和更早那次比较
+    db.discard(r)
+    r = db.record("wyckoff", hits(('A', 'Spring'), ('B', 'SOS')), day="2026-10-16")
+    assert db.new_since_last("wyckoff", r) == {('B', 'SOS')}
+    db.close()
+
+
+def test_persistence_and_first_seen(tmp_path):
+    path = str(tmp_path / "s.db")
+    db = SignalStore(path)
+    for day, pairs in (("2026-10-12", [('A', 'Spring')]), ("2026-10-13", [('A', 'Spring'), ('B', 'SOS')]),
+                       ("2026-10-14", [('A', 'Spring'), ('B', 'SOS')]), ("2026-10-15", [('B', 'SOS')])):
+        db.record("wyckoff", hits(*pairs), day=day)
+    db.close()
+    db = SignalStore(path)          # 落盘后重新打开
+    rows = db.persistence(days=3)
+    assert [(r['symbol'], r['days'], r['first'], r['last']) for r in rows] == [
+        ('B', 3, '2026-10-13', '2026-10-15'), ('A', 2, '2026-10-13', '2026-10-14')]
+    assert db.first_seen('A') == '2026-10-12' and db.first_seen('A', 'SOS') is None
+    db.close()
@@ -0,0 +1,55 @@
+import io
+import time
+import contextlib
+
+import pytest
+
+from universe import UniverseCache, clean_rows
+
+# 股票池缓存: TTL 内复用、过期重拉并记录增删、重拉失败退回旧名单
+
+
+def rows(*syms):
+    return [{'symbol': s, 'lastsale': '$1.50', 'volume': '1,000', 'marketCap': 'NA'} for s in syms]
+
+
+def quiet(fn, *a, **k):
+    with contextlib.redirect_stdout(io.StringIO()): return fn(*a, **k)
+
+
+def test_clean_rows():
+    out = clean_rows(rows('A', 'A', ' B ') + [{'symbol': ''}])
+    assert out == [{'symbol': 'A', 'lastsale': 1.5, 'volume': 1000.0, 'marketCap': None},
+                   {'symbol': 'B', 'lastsale': 1.5, 'volume': 1000.0, 'marketCap': None}]
+
+
+def test_ttl_and_diffs(tmp_path):
+    path = str(tmp_path / "u.json")
+    calls = []
+    fetch = lambda syms: (lambda: calls.append(1) or rows(*syms))
+    uc = UniverseCache(path, ttl=3600)
+    assert [r['symbol'] for r in quiet(uc.load, fetch(['A', 'B']))] == ['A', 'B']
+    # TTL 内 (新实例从磁盘读) 不再拉取
+    assert [r['symbol'] for r in quiet(UniverseCache(path, ttl=3600).load, fetch(['X']))] == ['A', 'B']
+    assert len(calls) == 1
+    # 过期: 重拉，记录增删
+    uc = UniverseCache(path, ttl=0)
+    assert [r['symbol'] for r in quiet(uc.load, fetch(['B', 'C']))] == ['B', 'C']
+    assert uc.diffs[-1]['added'] == ['C'] and uc.diffs[-1]['removed'] == ['A']
+    # force 忽略 TTL
+    quiet(UniverseCache(path, ttl=3600).load, fetch(['C']), force=True)
+    assert len(calls) == 3
+
+
+def test_fallback_on_failure(tmp_path):
+    path = str(tmp_path / "u.json")
+    def broken(): raise ConnectionError("down")
+    assert quiet(UniverseCache(path, ttl=0).load, broken) is None
+    quiet(UniverseCache(path).load, lambda: rows('A'))
+    stale = UniverseCache(path, ttl=0)
+    stale.state['fetched_at'] = time.time() - 86400
+    assert [r['symbol'] for r in quiet(stale.load, broken)] == ['A']
+    # 空名单视为失败，同样退回
+    assert [r['symbol'] for r in quiet(stale.load, lambda: [])] == ['A']
+    with pytest.raises(Exception):
+        UniverseCache(str(tmp_path / "v.json")).refresh(lambda: [])
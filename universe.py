@@ -0,0 +1,106 @@
+import os
+import json
+import time
+
+# ==========================================
+# 股票池缓存 (NASDAQ screener)
+# ==========================================
+# 清洗后的名单连同 lastsale / volume / marketCap 存到本地 JSON，
+# 在 TTL 内直接复用；过期才重拉，并记录新增/消失的代码。
+# 重拉失败时退回上一次成功的名单。
+
+SCREENER_URL = "https://api.nasdaq.com/api/screener/stocks?tableonly=true&limit=25&offset=0&download=true"
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Origin': 'https://www.nasdaq.com',
+    'Referer': 'https://www.nasdaq.com/'
+}
+
+
+def fetch_screener(session=None, timeout=30):
+    import requests
+    r = (session or requests).get(SCREENER_URL, headers=HEADERS, timeout=timeout)
+    data_json = r.json()
+    if 'data' not in data_json or not data_json['data'] or 'rows' not in data_json['data']:
+        raise Exception("API结构改变")
+    return data_json['data']['rows']
+
+
+def _num(x):
+    # "$1,234.5" / "12,345" / "NA" / "" -> float 或 None
+    s = str(x).replace('$', '').replace(',', '').strip()
+    try:
+        v = float(s)
+    except ValueError:
+        return None
+    return v if v == v else None
+
+
+def clean_rows(rows):
+    out, seen = [], set()
+    for r in rows:
+        sym = str(r.get('symbol', '')).strip()
+        if not sym or sym in seen: continue
+        seen.add(sym)
+        out.append({'symbol': sym, 'lastsale': _num(r.get('lastsale')),
+                    'volume': _num(r.get('volume')), 'marketCap': _num(r.get('marketCap'))})
+    return out
+
+
+class UniverseCache:
+    def __init__(self, path=None, ttl=None, keep_diffs=50):
+        self.path = path or os.environ.get("UNIVERSE_CACHE", os.path.join(".cache", "universe.json"))
+        # 默认 6 小时: 盘中名单几乎不变，30 分钟一次的雷达不必每轮重拉
+        self.ttl = float(ttl if ttl is not None else os.environ.get("UNIVERSE_TTL", 6 * 3600))
+        self.keep_diffs = keep_diffs
+        self.state = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+    @property
+    def age(self):
+        return time.time() - self.state.get('fetched_at', 0)
+
+    @property
+    def diffs(self):
+        return self.state.get('diffs', [])
+
+    def refresh(self, fetch):
+        rows = clean_rows(fetch())
+        if not rows: raise Exception("名单为空")
+        old = {r['symbol'] for r in self.state.get('rows', [])}
+        new = {r['symbol'] for r in rows}
+        if old:
+            diff = {'at': time.time(), 'added': sorted(new - old), 'removed': sorted(old - new)}
+            self.state['diffs'] = (self.diffs + [diff])[-self.keep_diffs:]
+            if diff['added'] or diff['removed']:
+                print(f"📋 名单变化: +{len(diff['added'])} / -{len(diff['removed'])}")
+        self.state['rows'] = rows
+        self.state['fetched_at'] = time.time()
+        self._write()
+        return rows
+
+    def load(self, fetch, force=False):
+        # 返回清洗后的行；新鲜就直接用缓存，过期才重拉，失败退回旧名单 (没有旧名单则返回 None)
+        rows = self.state.get('rows')
+        if rows and not force and self.age < self.ttl:
+            print(f"🗂️ 使用缓存名单 ({len(rows)} 只, {self.age/60:.0f} 分钟前)")
+            return rows
+        try:
+            return self.refresh(fetch)
+        except Exception as e:
+            if rows:
+                print(f"⚠️ 名单刷新失败 ({e})，沿用上次成功的名单 ({self.age/3600:.1f} 小时前)")
+                return rows
+            print(f"⚠️ 名单刷新失败 ({e})，且没有可用的缓存")
+            return None
@@ -1,121 +1,102 @@
 import pandas as pd
-import yfinance as yf
 import numpy as np
 import logging
 import time
 import os
-import random
-import traceback
-import math
-import requests
-import smtplib
-from email.mime.text import MIMEText
-from email.utils import formataddr
+import argparse
+from contextlib import nullcontext
 from datetime import datetime
-from scipy.signal import argrelextrema
-from scipy.stats import percentileofscore, linregress
-import urllib3
+from checkpoint import ScanCheckpoint
+from notify import mailer, table
+from signal_store import SignalStore, params_of
+from ohlcv_cache import OHLCVCache
+from panel import Panel, nan_quantile_rows
+from pipeline import TokenBucket, AdaptiveFetcher
+from parallel import ParallelAnalyzer
+from universe import UniverseCache, fetch_screener
+from metrics import metrics, ProfileSampler
+from relstrength import Benchmarks, BENCHMARKS
+from engine import Strategy, Features, register
+from records import Spring, SOS
+from intraday import weekly_trend
+from orderstats import SortedWindow, rolling_rank, quantiles
 
 # ==========================================
 # 0. 🛠️ 用户配置区
 # ==========================================
-# 邮箱配置 (优先读取环境变量)
-MAIL_USER = os.environ.get("MAIL_USER")
-MAIL_PASS = os.environ.get("MAIL_PASS")
-MAIL_TO   = os.environ.get("MAIL_TO")
+# 邮箱配置: 环境变量 MAIL_USER / MAIL_PASS / MAIL_TO (notify.Mailer 读取)，
+# SMTP_HOST / SMTP_PORT / SMTP_SSL 可覆盖按邮箱域名选的服务器
 
 # 代理配置 
 # 注意：在 GitHub Actions 云端运行时，不要设置这个变量，让它保持为 None
 PROXY_PORT = os.environ.get("PROXY_PORT") 
 
 # ------------------------------------------
+# yfinance / requests 较重，只在真正下载时才 import (见 RobustDownloader)；
+# 代理、日志等进程级设置也不在 import 时做，由入口 (main / 策略 prepare) 调用 setup()
+_setup_done = False
 
-# 自动配置代理逻辑
-if PROXY_PORT:
-    PROXY_URL = f"http://127.0.0.1:{PROXY_PORT}"
-    os.environ["HTTP_PROXY"] = PROXY_URL
-    os.environ["HTTPS_PROXY"] = PROXY_URL
-    print(f"🌍 本地代理已开启: {PROXY_PORT}")
-else:
-    # GitHub Actions 会走进这个分支，直接使用云端高速网络
-    print("☁️ 无代理模式 (适合云端/Github Actions)")
-
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
-logger = logging.getLogger("Wyckoff_Mail")
+def setup():
+    global _setup_done
+    if _setup_done: return
+    _setup_done = True
+    # 自动配置代理逻辑
+    if PROXY_PORT:
+        PROXY_URL = f"http://127.0.0.1:{PROXY_PORT}"
+        os.environ["HTTP_PROXY"] = PROXY_URL
+        os.environ["HTTPS_PROXY"] = PROXY_URL
+        print(f"🌍 本地代理已开启: {PROXY_PORT}")
+    else:
+        # GitHub Actions 会走进这个分支，直接使用云端高速网络
+        print("☁️ 无代理模式 (适合云端/Github Actions)")
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
 # ==========================================
 # 1. 📧 邮件发送模块
 # ==========================================
+RESULT_COLUMNS = [
+    ("Symbol", lambda r: f"<b>{r['Symbol']}</b>"),
+    ("Price", lambda r: f"${r['Price']}"),
+    # 根据信号类型给颜色: Spring绿，SOS橙
+    ("Signal", lambda r: r['Signal'],
+     lambda r: f"color:{'#1b5e20' if 'Spring' in r['Signal'] else '#e65100'}; font-weight:bold;"),
+    ("Detail (Score/Vol/RS)", lambda r: r['Detail'], "font-size:12px;"),
+    ("Stop Loss", lambda r: f"${r['Stop']}", "color:#c62828;"),
+]
+
+def render_report(results_list):
+    return "".join([
+        f"<h3>🦅 威科夫全市场战报 ({datetime.now().strftime('%Y-%m-%d %H:%M')})</h3>",
+        f"<p>共扫描全美股，发现 <b>{len(results_list)}</b> 个高概率结构。</p>",
+        table(RESULT_COLUMNS, results_list, header_style="background-color:#2c3e50; color:white;",
+              row_style=lambda r: f"background-color:{'#e8f5e9' if 'Spring' in r['Signal'] else '#fff3e0'};",
+              style="border-collapse: collapse; width: 100%; font-family: Arial, sans-serif;", cellpadding=5),
+        "<p style='font-size:12px; color:gray;'>* V19.0 Anti-Fragile Engine Output</p>",
+    ])
+
 def send_email(results_list):
-    if not MAIL_USER or not MAIL_PASS or not MAIL_TO:
+    m = mailer()
+    if not m.configured:
         print("❌ 邮箱配置缺失 (Secrets未设置)，跳过发送。")
-        return
-
-    print(f"📧 正在向 {MAIL_TO} 发送战报...")
-    
-    # 构建 HTML 表格
-    html_content = f"""
-    <h3>🦅 威科夫全市场战报 ({datetime.now().strftime('%Y-%m-%d %H:%M')})</h3>
-    <p>共扫描全美股，发现 <b>{len(results_list)}</b> 个高概率结构。</p>
-    <table border='1' cellpadding='5' cellspacing='0' style='border-collapse: collapse; width: 100%; font-family: Arial, sans-serif;'>
-        <tr style='background-color:#2c3e50; color:white;'>
-            <th>Symbol</th>
-            <th>Price</th>
-            <th>Signal</th>
-            <th>Detail (Score/Vol/RS)</th>
-            <th>Stop Loss</th>
-        </tr>
-    """
-    
-    for row in results_list:
-        # 根据信号类型给颜色
-        bg_color = "#e8f5e9" if "Spring" in row['Signal'] else "#fff3e0" # Spring绿，SOS橙
-        text_color = "#1b5e20" if "Spring" in row['Signal'] else "#e65100"
-        
-        html_content += f"""
-        <tr style='background-color:{bg_color};'>
-            <td><b>{row['Symbol']}</b></td>
-            <td>${row['Price']}</td>
-            <td style='color:{text_color}; font-weight:bold;'>{row['Signal']}</td>
-            <td style='font-size:12px;'>{row['Detail']}</td>
-            <td style='color:#c62828;'>${row['Stop']}</td>
-        </tr>
-        """
-    
-    html_content += "</table><p style='font-size:12px; color:gray;'>* V19.0 Anti-Fragile Engine Output</p>"
-
-    msg = MIMEText(html_content, 'html', 'utf-8')
-    msg['From'] = formataddr(["Wyckoff Hunter", MAIL_USER])
-    msg['To'] = formataddr(["Commander", MAIL_TO])
-    msg['Subject'] = f"🚀 威科夫战报: 发现 {len(results_list)} 个猎物"
-
-    try:
-        # 智能判断 SMTP 服务器
-        if 'qq.com' in MAIL_USER:
-            smtp_server = 'smtp.qq.com'
-        elif '163.com' in MAIL_USER:
-            smtp_server = 'smtp.163.com'
-        elif 'gmail.com' in MAIL_USER:
-            smtp_server = 'smtp.gmail.com'
-        else:
-            smtp_server = 'smtp.qq.com' # 默认尝试QQ
-        
-        # 使用 SSL 465 端口
-        server = smtplib.SMTP_SSL(smtp_server, 465)
-        server.login(MAIL_USER, MAIL_PASS)
-        server.sendmail(MAIL_USER, [MAIL_TO], msg.as_string())
-        server.quit()
-        print("✅ 邮件发送成功！")
-    except Exception as e:
-        print(f"❌ 邮件发送失败: {e}")
+        return False
+    print(f"📧 正在向 {m.to} 发送战报...")
+    ok = m.send(f"🚀 威科夫战报: 发现 {len(results_list)} 个猎物", render_report(results_list),
+                sender="Wyckoff Hunter", recipient="Commander")
+    if ok: print("✅ 邮件发送成功！")
+    return ok
 
 # ==========================================
 # 2. 强壮网络与统计库
 # ==========================================
 class RobustDownloader:
+    # 全局请求限速 (令牌桶)，所有下载线程共用；main() 会按命令行参数重设
+    limiter = TokenBucket(rate=float(os.environ.get("YF_RATE", 1.0)), capacity=float(os.environ.get("YF_BURST", 2)))
+
     @staticmethod
     def get_custom_session():
+        import requests
         s = requests.Session()
         s.verify = False
         s.trust_env = True
@@ -124,38 +105,52 @@ class RobustDownloader:
         return s
 
     @staticmethod
-    def download_chunk(tickers, period="1y"):
+    def download_chunk(tickers, period="1y", cache=None):
+        # 有本地缓存时只补最后几根 K 线
+        if cache is not None:
+            return cache.fetch(tickers, period, RobustDownloader.download_raw)
+        return RobustDownloader.download_raw(tickers, period=period)
+
+    @staticmethod
+    def download_once(tickers, period=None, start=None, session=None):
+        # 单次请求，失败直接抛异常；重试 / 拆批交给调用方 (download_raw 或 AdaptiveFetcher)
+        metrics.observe("download.rate_wait", RobustDownloader.limiter.acquire())
+        import yfinance as yf
+        t0 = time.perf_counter()
+        try:
+            # 注意：yfinance 新版 auto_adjust 参数
+            data = yf.download(tickers, period=period, start=start, group_by='ticker',
+                             threads=True, progress=False, auto_adjust=True,
+                             session=session or RobustDownloader.get_custom_session())
+        finally:
+            metrics.observe("download.attempt", time.perf_counter() - t0)
+        if data is None or data.empty: metrics.count("download.empty")
+        return data
+
+    @staticmethod
+    def download_raw(tickers, period=None, start=None):
         s = RobustDownloader.get_custom_session()
-        for _ in range(3):
+        for attempt in range(3):
+            if attempt: metrics.count("download.retry")
             try:
-                time.sleep(random.uniform(0.5, 1.5))
-                # 注意：yfinance 新版 auto_adjust 参数
-                data = yf.download(tickers, period=period, group_by='ticker', 
-                                 threads=True, progress=False, auto_adjust=True, session=s)
+                data = RobustDownloader.download_once(tickers, period=period, start=start, session=s)
                 if data is not None and not data.empty: return data
-            except: 
+            except Exception as e: 
+                metrics.error("download", e)
                 time.sleep(2)
+        metrics.count("download.gave_up")
+        metrics.count("tickers.download_failed", len(tickers))
         return None
 
     @staticmethod
-    def normalize_data(raw_data, batch_tickers):
-        std = {}
-        if raw_data is None or raw_data.empty: return std
-        
-        # 处理多级索引 (MultiIndex)
-        if isinstance(raw_data.columns, pd.MultiIndex):
-            for t in raw_data.columns.levels[0]:
-                try:
-                    df = raw_data[t].copy()
-                    if 'Close' in df.columns and 'Volume' in df.columns:
-                        if not df['Close'].dropna().empty: std[t] = df
-                except: continue
-        # 处理单级索引 (DataFrame)
-        elif isinstance(raw_data, pd.DataFrame):
-            cols = set(raw_data.columns)
-            if {'Close', 'Volume'}.issubset(cols):
-                if len(batch_tickers) == 1: std[batch_tickers[0]] = raw_data.copy()
-        return std
+    def normalize_data(raw_data, batch_tickers, compact=False):
+        # 整块下载结果一次性转成 Panel (连续数组 + 每只的起止下标)，按代码取值是视图，不再逐只 copy；
+        # 只保留 Close/Volume 都有值的行，analyze 里的 dropna 因此不会再删行。compact=True 存成 float32
+        try:
+            return Panel.from_download(raw_data, batch_tickers, subset=['Close', 'Volume'], compact=compact)
+        except Exception as e:
+            metrics.error("normalize", e)
+            return {}
 
 class StatUtils:
     @staticmethod
@@ -166,54 +161,79 @@ class StatUtils:
 
     @staticmethod
     def calculate_rolling_rank(series, window=120):
-        return series.rolling(window).rank(pct=True) * 100
+        # 同 series.rolling(window).rank(pct=True) * 100
+        return pd.Series(rolling_rank(series.to_numpy(dtype='f8'), window) * 100, index=series.index)
 
     @staticmethod
-    def calculate_log_rs_slope(stock_close, bench_close, window=50):
+    def calculate_log_rs_slope(stock_close, bench_close, window=50, name=None):
+        # bench_close: 基准 Series 或预先对齐好的 Benchmarks；批量计算见 Benchmarks.slopes
         try:
-            # 对齐数据
-            bench = bench_close.reindex(stock_close.index).ffill()
-            s = stock_close / stock_close.iloc[0]
-            b = bench / bench.iloc[0]
-            rs = s / b
-            
-            if len(rs) < window: return 0
-            
-            log_rs = np.log(rs.replace(0, np.nan).dropna())
-            y = log_rs.iloc[-window:].values
-            
-            if len(y) < 10: return 0
-            return linregress(np.arange(len(y)), y)[0] * 1000
-        except: return 0
+            bench = bench_close if isinstance(bench_close, Benchmarks) else Benchmarks(bench_close)
+            return bench.series_slope(stock_close, name, window)
+        except Exception as e:
+            metrics.error("rs_slope", e)
+            return 0
 
 # ==========================================
 # 3. 威科夫分析引擎
 # ==========================================
+# 基础过滤阈值: analyze / analyze_batch 与下载前的漏斗 (screen / probe) 共用
+MIN_BARS = 180
+MIN_PRICE, MAX_PRICE = 2, 500
+MIN_DOLLAR_VOL = 500000     # 20 日平均成交额
+
 class WyckoffAnalyzer:
-    def __init__(self):
+    def __init__(self, rs_bench=None, **params):
+        # bench_data: Benchmarks (fetch_benchmark 设置) 或单个基准收盘 Series
         self.bench_data = None
+        # RS 用哪个基准: 小盘股可以换成 IWM
+        self.rs_bench = rs_bench or os.environ.get("RS_BENCH", "QQQ")
+        self._bench = (None, None)
+        # 形态 / 打分阈值 (sweep.py 扫描的就是这些)
+        self.min_score = 2.5     # Spring 入选的最低得分
+        self.dry_vr = 30         # 近 3 日量能排名低于此记 Dry
+        self.absorb_vr = 85      # 高于此且收在高位记 Absorb
+        self.sos_vr = 70         # SOS 当日量能排名下限
+        self.spring_band = 1.03  # 3 日低点在支撑 × 该系数以内
+        self.coil = 0.8          # ATR < 120 日收盘标准差 × 该系数算收敛
+        self.weekly = 0          # >0: 信号附带周线结构 (最新周收盘相对 N 周均值)，由日线本地合并，不另下载
+        for k, v in params.items():
+            if not hasattr(self, k): raise ValueError(f"未知参数: {k}")
+            setattr(self, k, v)
 
-    def fetch_benchmark(self):
+    @property
+    def benchmarks(self):
+        # 基准只在 bench_data 变化时对齐一次
+        if self.bench_data is None: return None
+        if isinstance(self.bench_data, Benchmarks): return self.bench_data
+        if self._bench[0] is not self.bench_data:
+            self._bench = (self.bench_data, Benchmarks(self.bench_data))
+        return self._bench[1]
+
+    def fetch_benchmark(self, names=BENCHMARKS, period="1y"):
+        import yfinance as yf
         try:
             s = RobustDownloader.get_custom_session()
-            b = yf.download("QQQ", period="1y", progress=False, session=s)
-            
-            # 处理 benchmark 数据格式
-            if isinstance(b, pd.DataFrame):
-                if isinstance(b.columns, pd.MultiIndex): 
-                    # 尝试提取 QQQ 的 Close
-                    if 'QQQ' in b.columns.get_level_values(1):
-                        self.bench_data = b.xs('QQQ', level=1, axis=1)['Close'] 
-                    else:
-                        self.bench_data = b.iloc[:,0] # 盲取第一列
-                else: 
-                    self.bench_data = b['Close']
-            
-            # 再次确认是 Series
-            if isinstance(self.bench_data, pd.DataFrame): 
-                self.bench_data = self.bench_data.iloc[:,0]
-                
-            print("✅ 基准数据 (QQQ) 就绪")
+            # 几个基准一次请求拉完
+            b = yf.download(list(names), period=period, progress=False, session=s)
+            closes = {}
+            if isinstance(b, pd.DataFrame) and not b.empty:
+                if isinstance(b.columns, pd.MultiIndex):
+                    # 列可能是 (字段, 代码) 或 (代码, 字段)
+                    for lvl in (1, 0):
+                        for n in names:
+                            if n not in closes and n in b.columns.get_level_values(lvl):
+                                closes[n] = b.xs(n, level=lvl, axis=1)['Close']
+                elif 'Close' in b.columns:
+                    closes[names[0]] = b['Close']
+            for n, c in closes.items():
+                # 再次确认是 Series
+                if isinstance(c, pd.DataFrame): closes[n] = c.iloc[:, 0]
+            bench = Benchmarks(closes)
+            if not len(bench): raise Exception("基准数据为空")
+            self.bench_data = bench
+            pick = bench.pick(self.rs_bench)
+            print(f"✅ 基准数据 ({'/'.join(bench.names)}) 就绪，RS 对比 {pick}")
         except Exception as e: 
             print(f"⚠️ 基准获取失败 ({e})，将跳过 RS 分析")
 
@@ -225,35 +245,44 @@ class WyckoffAnalyzer:
         atr = StatUtils.calculate_atr(sub).iloc[-1]
         atr = curr * 0.05 if pd.isna(atr) else atr
         
-        # 95% 分位数 + ATR 钳位
-        res = min(sub['High'].quantile(0.95), sub['Close'].median() + 4*atr)
-        sup = max(sub['Low'].quantile(0.05), sub['Close'].median() - 4*atr)
+        # 95% 分位数 + ATR 钳位 (numpy 直接算，与 pandas 结果相同)
+        med = np.median(sub['Close'].to_numpy())
+        res = min(quantiles(sub['High'].to_numpy(), 0.95)[0], med + 4*atr)
+        sup = max(quantiles(sub['Low'].to_numpy(), 0.05)[0], med - 4*atr)
         return res, sup
 
+    def week_of(self, df):
+        return weekly_trend(df.index.values.astype('datetime64[ns]').view('i8'), df['Close'].to_numpy(dtype='f8'), self.weekly)
+
     def analyze(self, t, df):
         try:
             df = df.dropna(subset=['Close','Volume']).sort_index()
-            if len(df) < 180: return None
+            if len(df) < MIN_BARS: return None
             
             c, v, l = df['Close'], df['Volume'], df['Low']
             curr = c.iloc[-1]
             
-            # 过滤: $2-$500, 流动性>50万
-            if not (2 <= curr <= 500): return None
-            if (c*v).rolling(20).mean().iloc[-1] < 500000: return None
-            
-            # 指标计算
-            atr = StatUtils.calculate_atr(df).iloc[-1]
-            vr = StatUtils.calculate_rolling_rank(v, 60)
-            rs = StatUtils.calculate_log_rs_slope(c, self.bench_data) if self.bench_data is not None else 0
+            # 过滤: $2-$500, 流动性>50万 (由便宜到贵，先淘汰再算指标)
+            if not (MIN_PRICE <= curr <= MAX_PRICE): return None
+            if (c*v).rolling(20).mean().iloc[-1] < MIN_DOLLAR_VOL: return None
             
             res, sup = self.find_dynamic_zones(df)
             if not res or (res-sup)/curr < 0.05: return None # 波动太窄
             
+            # 指标计算 (只对通过过滤的股票)
+            atr = StatUtils.calculate_atr(df).iloc[-1]
+            # 量能 60 日排名只用得到最后 3 根: 窗口逐根推进，不对整段历史做滚动排名
+            win = SortedWindow(60, v.iloc[-62:-3].to_numpy())
+            vr = []
+            for x in v.iloc[-3:].to_numpy():
+                win.push(x)
+                vr.append(win.rank() * 100)
+            rs = StatUtils.calculate_log_rs_slope(c, self.benchmarks, name=self.rs_bench) if self.bench_data is not None else 0
+            
             # === Spring 信号识别 ===
             rec_l = l.iloc[-3:].min()
             # 价格刺破支撑但收回
-            if rec_l < sup * 1.03 and curr > sup:
+            if rec_l < sup * self.spring_band and curr > sup:
                 l3 = df.iloc[-3:]
                 rng = (l3['High']-l3['Low']).replace(0, 0.01)
                 crp = ((l3['Close']-l3['Low'])/rng).clip(0,1)
@@ -264,100 +293,414 @@ class WyckoffAnalyzer:
                 if w_crp > 0.6: sc+=1
                 if w_crp > 0.7: sc+=1
                 
-                cur_vr = vr.iloc[-3:].mean()
-                if cur_vr < 30: sc+=1.5; note.append("Dry")
-                elif cur_vr > 85 and w_crp > 0.6: sc+=1.5; note.append("Absorb")
+                cur_vr = np.mean(vr)
+                if cur_vr < self.dry_vr: sc+=1.5; note.append("Dry")
+                elif cur_vr > self.absorb_vr and w_crp > 0.6: sc+=1.5; note.append("Absorb")
                 if rs > -0.05: sc+=1
                 
-                if sc >= 2.5:
-                    return {
-                        'Symbol':t, 
-                        'Signal':'🔥 V19 Spring', 
-                        'Price':round(curr,2), 
-                        'Detail':f"Sc:{sc} {','.join(note)} CRP:{w_crp:.2f}", 
-                        'Stop':round(rec_l*0.98,2)
-                    }
+                if sc >= self.min_score:
+                    r = Spring(symbol=t, price=round(curr,2), score=sc, notes=tuple(note), crp=w_crp, stop=round(rec_l*0.98,2))
+                    if self.weekly: r.week = self.week_of(df)
+                    return r
 
             # === SOS 信号识别 ===
             if curr > res:
-                if atr < df['Close'].rolling(120).std().iloc[-1]*0.8: # Coil近似
-                    if rs > 0 and vr.iloc[-1] > 70:
-                        return {
-                            'Symbol':t, 
-                            'Signal':'🚀 V19 SOS', 
-                            'Price':round(curr,2),
-                            'Detail':f"Coil Break | RS:{rs:.1f}", 
-                            'Stop':round(l.iloc[-1],2)
-                        }
-        except: pass
+                if atr < df['Close'].rolling(120).std().iloc[-1]*self.coil: # Coil近似
+                    if rs > 0 and vr[-1] > self.sos_vr:
+                        r = SOS(symbol=t, price=round(curr,2), rs=rs, stop=round(l.iloc[-1],2))
+                        if self.weekly: r.week = self.week_of(df)
+                        return r
+        except Exception as e:
+            metrics.error("analyze", e)
         return None
 
+    def analyze_batch(self, data, feats=None):
+        # 批量版 analyze: 只算规则用得到的最后几根指标值 (整批一次数组运算)，
+        # 候选股很少，再按原逻辑逐只打分，信号与逐只调用 analyze 完全一致。
+        # 返回结果列表，顺序与 data 一致；feats 为多策略引擎共享的指标缓存
+        cv = ['Close', 'Volume']
+        feats = feats or Features(data)
+        syms, x, n = feats.tails(120, subset=cv)
+        if not syms: return []
+        h, l, c, v = x[:, :, 1], x[:, :, 2], x[:, :, 3], x[:, :, 4]
+        curr = c[:, -1]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # 与打分阈值无关的部分记在 feats 里，参数扫描时各组参数共用
+            def base():
+                # 逐级过滤，并记录每一级淘汰的数量
+                ok = n >= MIN_BARS
+                metrics.count("drop.wyckoff.short_history", int((~ok).sum()))
+                keep = (curr >= MIN_PRICE) & (curr <= MAX_PRICE)
+                metrics.count("drop.wyckoff.price", int((ok & ~keep).sum())); ok &= keep
+                keep = ~((c[:, -20:] * v[:, -20:]).mean(axis=1) < MIN_DOLLAR_VOL)
+                metrics.count("drop.wyckoff.liquidity", int((ok & ~keep).sum())); ok &= keep
+
+                # 以下指标只对通过上面几级过滤的行计算，结果按原下标放回 (其余行为 NaN)
+                idx = np.flatnonzero(ok)
+                xs, cs, vs, cur = x[idx], c[idx], v[idx], curr[idx]
+
+                # ATR(14): TR 取三者中非空的最大值，窗口内有空值则为 NaN (同 rolling.mean)
+                hs, ls, cp = xs[:, 1:, 1], xs[:, 1:, 2], xs[:, :-1, 3]
+                tr = np.fmax(hs - ls, np.fmax(np.abs(hs - cp), np.abs(ls - cp)))
+                atr = tr[:, -14:].mean(axis=1)
+
+                # 成交量 60 日分位排名，只算最后 3 根
+                vr = np.empty((len(idx), 3))
+                for k in range(3):
+                    win = vs[:, 58 + k:118 + k]
+                    x_t = win[:, -1:]
+                    vr[:, k] = ((win < x_t).sum(axis=1) + ((win == x_t).sum(axis=1) + 1) / 2) / 60 * 100
+
+                # 动态区间 (find_dynamic_zones): 窗口 iloc[-120:-3]
+                sub_atr = tr[:, -17:-3].mean(axis=1)
+                sub_atr = np.where(np.isnan(sub_atr), cur * 0.05, sub_atr)
+                med = np.median(cs[:, :-3], axis=1)
+                q_hi, cap = nan_quantile_rows(xs[:, :-3, 1], 0.95), med + 4 * sub_atr
+                q_lo, flo = nan_quantile_rows(xs[:, :-3, 2], 0.05), med - 4 * sub_atr
+                res = np.where(cap < q_hi, cap, q_hi)
+                sup = np.where(flo > q_lo, flo, q_lo)
+                keep = (res != 0) & ~((res - sup) / cur < 0.05)
+                metrics.count("drop.wyckoff.narrow_zone", int((~keep).sum())); ok[idx] = keep
+                rec_l = np.fmin.reduce(l[idx, -3:], axis=1)
+
+                def full(a):
+                    out = np.full((len(syms),) + a.shape[1:], np.nan)
+                    out[idx] = a
+                    return out
+                return ok, full(atr), full(vr), full(res), full(sup), full(rec_l), full(cs.std(axis=1, ddof=1))
+            ok, atr, vr, res, sup, rec_l, std = feats.memo('wyckoff.base', base)
+
+            spring = ok & (rec_l < sup * self.spring_band) & (curr > sup)
+            sos = ok & (curr > res) & (atr < std * self.coil) & (vr[:, -1] > self.sos_vr)
+
+        results = []
+        cand = np.flatnonzero(spring | sos)
+        metrics.count("candidates.wyckoff", len(cand))
+        # 候选股的 RS 斜率一次算完 (所有基准)；已算过的 (参数扫描时) 直接复用
+        rs_all = np.zeros(len(cand))
+        bench = self.benchmarks
+        if bench is not None and len(bench) and len(cand):
+            try:
+                done = feats.memo(('wyckoff.rs', bench.pick(self.rs_bench)), dict)
+                need = [i for i in cand if i not in done]
+                if need:
+                    done.update(zip(need, bench.slopes([feats.series(i, cv) for i in need])[bench.pick(self.rs_bench)]))
+                rs_all = np.array([done[i] for i in cand])
+            except Exception as e:
+                metrics.error("rs_slope", e)
+        for j, i in enumerate(cand):
+            t = syms[i]
+            try:
+                rs = rs_all[j]
+                if spring[i]:
+                    l3 = x[i, -3:]
+                    rng = l3[:, 1] - l3[:, 2]
+                    rng[rng == 0] = 0.01
+                    crp = np.clip((l3[:, 3] - l3[:, 2]) / rng, 0, 1)
+                    w_crp = np.average(crp, weights=[1,2,3])
+
+                    sc = 0
+                    note = []
+                    if w_crp > 0.6: sc+=1
+                    if w_crp > 0.7: sc+=1
+
+                    cur_vr = vr[i].mean()
+                    if cur_vr < self.dry_vr: sc+=1.5; note.append("Dry")
+                    elif cur_vr > self.absorb_vr and w_crp > 0.6: sc+=1.5; note.append("Absorb")
+                    if rs > -0.05: sc+=1
+
+                    if sc >= self.min_score:
+                        results.append(Spring(symbol=t, price=round(curr[i],2), score=sc, notes=tuple(note), crp=w_crp, stop=round(rec_l[i]*0.98,2)))
+                        metrics.count("signals.spring")
+                        if self.weekly: results[-1].week = weekly_trend(*feats.series(i, cv), self.weekly)
+                        continue
+                if sos[i] and rs > 0:
+                    results.append(SOS(symbol=t, price=round(curr[i],2), rs=rs, stop=round(l[i, -1],2)))
+                    metrics.count("signals.sos")
+                    if self.weekly: results[-1].week = weekly_trend(*feats.series(i, cv), self.weekly)
+            except Exception as e:
+                metrics.error("analyze", e)
+        return results
+
+class WyckoffSetup(Strategy):
+    # 多策略引擎插件: Spring / SOS 共用一个 WyckoffAnalyzer (基准每次运行只拉一次)
+    family = 'wyckoff'
+    period = '1y'
+    signal = None
+
+    def prepare(self, ctx):
+        super().prepare(ctx)
+        setup()
+        if 'wyckoff' not in ctx:
+            ctx['wyckoff'] = WyckoffAnalyzer()
+            ctx['wyckoff'].fetch_benchmark()
+
+    def universe(self, row):
+        return is_wyckoff(row)
+
+    def scan(self, panel, feats):
+        found = feats.memo('wyckoff', lambda: self.ctx['wyckoff'].analyze_batch(panel, feats))
+        return [r for r in found if self.signal in r['Signal']]
+
+    def notify(self, items):
+        send_email(items)
+
+@register
+class WyckoffSpring(WyckoffSetup):
+    name = 'wyckoff.spring'
+    signal = 'Spring'
+
+@register
+class WyckoffSOS(WyckoffSetup):
+    name = 'wyckoff.sos'
+    signal = 'SOS'
+
 # ==========================================
 # 4. 主程序
 # ==========================================
+def is_wyckoff(r):
+    return (r['lastsale'] or 0) >= 2 and (r['marketCap'] or 0) > 50000000 and r['symbol'].isalpha()
+
+# ---------- 下载前的漏斗: 由便宜到贵，淘汰的代码不再下载 1 年历史 ----------
+# 第 1 级只看 screener 字段。screener 的成交量只是当天一天，成交额门槛按
+# SCREEN_VOL_FACTOR 放宽，价格上限留 10% 余量；缺字段的不淘汰。
+SCREEN_VOL_FACTOR = 0.2
+
+def screen(r):
+    # 返回淘汰原因，通过返回 None
+    p, vol = r['lastsale'], r['volume']
+    if p is not None and p > MAX_PRICE * 1.1: return 'price'
+    if p is not None and vol is not None and p * vol < MIN_DOLLAR_VOL * SCREEN_VOL_FACTOR: return 'liquidity'
+    return None
+
+def probe(tickers, cache=None, workers=4):
+    # 第 2 级: 本地没有历史的代码先拉 1 个月 K 线，最新价和 20 日平均成交额按 analyze 的
+    # 阈值检查，不达标的不再下载 1 年。已有缓存的只需补几根，不探测。
+    # 探测没拿到数据或不足 20 根的保留 (交给正式下载判断)。返回 (保留, {代码: 淘汰原因})
+    need = [t for t in tickers if cache is None or t not in cache.index]
+    if not need: return list(tickers), {}
+    fetcher = AdaptiveFetcher(RobustDownloader.download_once)
+    dropped = {}
+    with metrics.timer("probe"):
+        for batch, raw in fetcher.run(need, lambda b: fetcher.download(b, period="1mo"), workers=workers):
+            panel = RobustDownloader.normalize_data(raw, batch)
+            if not len(panel): continue
+            syms, x, n = Features(panel).tails(20, subset=['Close', 'Volume'])
+            c, v = x[:, :, 3], x[:, :, 4]
+            with np.errstate(invalid='ignore'):
+                bad_price = ~((c[:, -1] >= MIN_PRICE) & (c[:, -1] <= MAX_PRICE))
+                bad_liq = (c * v).mean(axis=1) < MIN_DOLLAR_VOL
+            for t, bp, bl in zip(syms, bad_price, bad_liq):
+                if bp: dropped[t] = 'price'
+                elif bl: dropped[t] = 'liquidity'
+    metrics.count("probe.tickers", len(need))
+    for why in ('price', 'liquidity'):
+        metrics.count(f"drop.probe.{why}", sum(1 for w in dropped.values() if w == why))
+    return [t for t in tickers if t not in dropped], dropped
+
+# 漏斗各级: (名称, 淘汰计数)
+FUNNEL = [
+    ("基础过滤", ["drop.universe.filter"]),
+    ("screener 价格/成交额", ["drop.screen.price", "drop.screen.liquidity"]),
+    ("1 个月探测", ["drop.probe.price", "drop.probe.liquidity"]),
+    ("下载", ["drop.no_data"]),
+    ("历史/价格/成交额", ["drop.wyckoff.short_history", "drop.wyckoff.price", "drop.wyckoff.liquidity"]),
+    ("区间宽度", ["drop.wyckoff.narrow_zone"]),
+]
+
+def print_funnel():
+    # 每级剩余数量；下载前淘汰的代码都省掉了一次 1 年历史下载
+    cnt = metrics.counters
+    left = cnt.get("tickers.screener", 0)
+    if not left: return
+    line = [f"screener {left}"]
+    for name, keys in FUNNEL:
+        left -= sum(cnt.get(k, 0) for k in keys)
+        line.append(f"{name} {left}")
+    line.append(f"候选 {cnt.get('candidates.wyckoff', 0)}")
+    line.append(f"信号 {cnt.get('signals.total', 0)}")
+    saved = sum(cnt.get(k, 0) for k in FUNNEL[1][1] + FUNNEL[2][1])
+    print("🔻 漏斗: " + " → ".join(line))
+    print(f"   下载前淘汰 {saved} 只，省下 {saved} 次 1 年历史下载 (探测 {cnt.get('probe.tickers', 0)} 只 × 1 个月)")
+
 def get_tickers():
     print("🌊 拉取 NASDAQ 全量列表...")
-    try:
-        s = RobustDownloader.get_custom_session()
-        r = s.get("https://api.nasdaq.com/api/screener/stocks?tableonly=true&limit=25&offset=0&download=true", 
-                  headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
-        
-        data_json = r.json()
-        if 'data' not in data_json or 'rows' not in data_json['data']:
-            raise Exception("API结构改变")
-            
-        df = pd.DataFrame(data_json['data']['rows'])
-        
-        # 数据清洗
-        df['lastsale'] = pd.to_numeric(df['lastsale'].astype(str).str.replace('$','').str.replace(',',''), errors='coerce')
-        df['marketCap'] = pd.to_numeric(df['marketCap'].astype(str).str.replace(',','').str.replace('NA','0'), errors='coerce')
-        
-        mask = (df['lastsale'] >= 2) & (df['marketCap'] > 50000000)
-        ts = [x for x in df[mask]['symbol'].tolist() if str(x).isalpha()]
-        
-        print(f"✅ 获取 {len(ts)} 只标的")
-        return list(set(ts))
-    except Exception as e:
-        print(f"⚠️ 获取失败 ({e})，使用测试列表")
+    s = RobustDownloader.get_custom_session()
+    with metrics.timer("universe"):
+        rows = UniverseCache().load(lambda: fetch_screener(s, timeout=30))
+    if not rows:
+        print("⚠️ 获取失败，使用测试列表")
         return ['AAPL','TSLA','AMD','NVDA','PLTR','SOFI','MARA','DKNG','COIN','AI','UPST','CVNA']
+    
+    base = [r for r in rows if is_wyckoff(r)]
+    metrics.count("tickers.screener", len(rows))
+    metrics.count("drop.universe.filter", len(rows) - len(base))
+    ts = []
+    for r in base:
+        why = screen(r)
+        if why: metrics.count(f"drop.screen.{why}")
+        else: ts.append(r['symbol'])
+    print(f"✅ 获取 {len(ts)} 只标的")
+    return ts
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Wyckoff 全市场扫描")
+    p.add_argument("--download-workers", type=int, default=int(os.environ.get("DOWNLOAD_WORKERS", 4)),
+                   help="同时在途的下载批次数")
+    p.add_argument("--rate", type=float, default=float(os.environ.get("YF_RATE", 1.0)),
+                   help="每秒最多发起的下载请求数 (<=0 不限速)")
+    p.add_argument("--burst", type=float, default=float(os.environ.get("YF_BURST", 2)),
+                   help="令牌桶容量 (允许的瞬时突发请求数)")
+    p.add_argument("--batch-size", type=int, default=int(os.environ.get("BATCH_SIZE", 100)),
+                   help="初始下载批大小 (之后按请求成败自动调整)")
+    p.add_argument("--max-batch-size", type=int, default=int(os.environ.get("MAX_BATCH_SIZE", 200)))
+    p.add_argument("--workers", type=int, default=int(os.environ.get("SCAN_WORKERS", 1)),
+                   help="分析进程数 (1 = 单进程, 0 = CPU 核数)")
+    p.add_argument("--profile-slowest", type=int, default=int(os.environ.get("PROFILE_SLOWEST", 0)),
+                   help="逐只 cProfile 分析并保留最慢的 N 份 (0 = 关闭)")
+    p.add_argument("--metrics-dir", default=os.environ.get("METRICS_DIR"),
+                   help="指标汇总输出目录 (默认 .cache/metrics)")
+    p.add_argument("--rs-bench", default=os.environ.get("RS_BENCH", "QQQ"), choices=BENCHMARKS,
+                   help="RS 斜率对比的基准指数")
+    p.add_argument("--compact", action="store_true", default=os.environ.get("COMPACT", "0") == "1",
+                   help="K 线以 float32 紧凑存储 (逐批下载、逐批分析)")
+    p.add_argument("--weekly", type=int, default=int(os.environ.get("WEEKLY", 0)), metavar="N",
+                   help="信号附带周线结构: 最新周收盘相对 N 周均值 (0 = 关闭)")
+    p.add_argument("--no-probe", dest="probe", action="store_false", default=os.environ.get("PROBE", "1") != "0",
+                   help="不做 1 个月探测 (本地没有历史的代码直接下载 1 年)")
+    p.add_argument("--no-store", dest="store", action="store_false", default=os.environ.get("SIGNAL_STORE", "1") != "0",
+                   help="不写信号历史库 (.cache/signals.db)")
+    p.add_argument("--all", action="store_true", default=os.environ.get("REPORT_ALL", "0") == "1",
+                   help="邮件报告全部信号 (默认只报相对上一次运行新出现的)")
+    p.add_argument("--run-id", default=os.environ.get("RUN_ID"),
+                   help="断点文件名 (默认 wyckoff-<美东交易日>，同一天重启自动续跑)")
+    p.add_argument("--fresh", action="store_true", help="丢弃本次 run-id 的断点，从头扫描")
+    p.add_argument("--no-checkpoint", dest="checkpoint", action="store_false",
+                   default=os.environ.get("CHECKPOINT", "1") != "0", help="不写断点")
+    return p.parse_args(argv)
 
-def main():
-    engine = WyckoffAnalyzer()
+def main(argv=None):
+    args = parse_args(argv)
+    setup()
+    metrics.reset("wyckoff")
+    metrics.profiler = ProfileSampler(args.profile_slowest) if args.profile_slowest > 0 else None
+    RobustDownloader.limiter = TokenBucket(args.rate, args.burst)
+    engine = WyckoffAnalyzer(rs_bench=args.rs_bench, weekly=args.weekly)
     engine.fetch_benchmark()
+    # OHLCV_CACHE=0 可关闭本地缓存
+    cache = OHLCVCache() if os.environ.get("OHLCV_CACHE", "1") != "0" else None
     
-    tickers = get_tickers()
-    BATCH = 100
-    total = math.ceil(len(tickers)/BATCH)
-    all_results = []
+    # 断点: 每批分析完落盘，同一交易日重启从断点继续 (名单用第一次的快照)
+    ckpt = ScanCheckpoint("wyckoff", args.run_id) if args.checkpoint else None
+    if ckpt is not None and args.fresh: ckpt.reset()
+    if ckpt is not None and ckpt.finished:
+        print(f"✅ {ckpt.run_id} 已完成 ({len(ckpt.results)} 个信号)，跳过。--fresh 可重新扫描")
+        return
+    if ckpt is not None:
+        universe = ckpt.universe(get_tickers)
+        tickers = ckpt.pending()
+        all_results = list(ckpt.results)
+        if ckpt.resumed:
+            print(f"♻️ 从断点继续 {ckpt.run_id}: 已完成 {len(ckpt.done)}/{len(universe)} 只, 已有 {len(all_results)} 个信号")
+            metrics.count("checkpoint.resumed", len(ckpt.done))
+    else:
+        tickers, all_results = get_tickers(), []
+    if args.probe and tickers:
+        tickers, dropped = probe(tickers, cache, args.download_workers)
+        print(f"🔎 探测淘汰 {len(dropped)} 只 (价格/20 日成交额不达标)")
+        if ckpt is not None and dropped: ckpt.commit(dropped, [])
     
     print(f"\n🚀 开始全量扫描 ({len(tickers)}只)...")
+    metrics.count("tickers.requested", len(tickers))
     
-    for i in range(total):
-        batch = tickers[i*BATCH : (i+1)*BATCH]
-        print(f"Batch {i+1}/{total}...", end="\r")
-        
-        raw = RobustDownloader.download_chunk(batch)
-        data = RobustDownloader.normalize_data(raw, batch)
-        
-        for t, df in data.items():
-            res = engine.analyze(t, df)
-            if res:
-                print(f"\n🎯 Found: {t} ({res['Signal']})")
+    # 下载线程并行拉后面的批次，主线程同时分析已到达的批次。
+    # 批大小随请求成败自动调整，失败批次二分定位坏代码，单只失败的退避后重试
+    fetcher = AdaptiveFetcher(RobustDownloader.download_once, size=args.batch_size, max_size=args.max_batch_size)
+    def fetch(batch):
+        if cache is not None: return cache.fetch(batch, "1y", fetcher.download)
+        return fetcher.download(batch, period="1y")
+    downloaded = 0
+    def panels():
+        nonlocal downloaded
+        for i, (batch, raw) in enumerate(fetcher.run(tickers, fetch, workers=args.download_workers)):
+            print(f"Batch {i+1} ({downloaded}/{len(tickers)})...", end="\r")
+            with metrics.timer("normalize"):
+                data = RobustDownloader.normalize_data(raw, batch, compact=args.compact)
+            downloaded += len(data)
+            metrics.count("tickers.downloaded", len(data))
+            yield data
+
+    # 多进程模式: 基准数据 (已对齐) 在进程初始化时只传一次；中途出错进程池也会被收掉
+    pool = nullcontext(engine) if args.workers == 1 else ParallelAnalyzer(
+        WyckoffAnalyzer, args.workers, bench_data=engine.bench_data, rs_bench=args.rs_bench, weekly=args.weekly)
+    with pool as analyzer:
+        # 紧凑模式同样逐批分析: 每批转成 float32 后原始 DataFrame 即可释放，断点仍按批提交
+        for data in panels():
+            with metrics.timer("analyze.wyckoff"):
+                if metrics.profiler is not None:
+                    # 采样模式: 逐只分析并 cProfile，只留最慢的 N 份
+                    found = [r for t, df in data.items() if (r := metrics.profiler.run(t, engine.analyze, t, df))]
+                else:
+                    found = analyzer.analyze_batch(data)
+            for res in found:
+                print(f"\n🎯 Found: {res['Symbol']} ({res['Signal']})")
                 all_results.append(res)
-        
-        time.sleep(1) # 保护 API
+            if ckpt is not None:
+                with metrics.timer("checkpoint"): ckpt.commit(list(data), found)
 
     print("\n✅ 扫描完成。")
+    metrics.count("drop.no_data", len(tickers) - downloaded)
+    fetcher.report(downloaded)
+    if cache is not None:
+        print(f"🗄️ 缓存统计: {cache.stats}")
+        for k, n in cache.stats.items(): metrics.count(f"cache.{k}", n)
     
-    # 发送邮件
+    # 信号入库 (断点续跑的同一 run_id 覆盖写)，邮件只发相对上一次运行新出现的 (--all 全发)
+    report, store, run_id = all_results, None, None
+    if args.store:
+        try:
+            store = SignalStore()
+            run_id = store.record("wyckoff", all_results, params=params_of(engine),
+                                  run_key=ckpt.run_id if ckpt is not None else None)
+            new = store.new_since_last("wyckoff", run_id)
+            metrics.count("signals.new", len(new))
+            print(f"🆕 新信号 {len(new)} / {len(all_results)}")
+            if not args.all: report = [r for r in all_results if (r['Symbol'], r['Signal']) in new]
+        except Exception as e:
+            metrics.error("signal_store", e)
+
+    # 发送邮件。没发出去 (未配置 / 发送失败) 时这次运行不入库、断点不标记完成，
+    # 同一交易日重跑走续跑路径 (不再下载) 把报告补发出去
+    sent = True
+    if report:
+        try:
+            sent = bool(send_email(report))
+        except Exception as e:
+            metrics.error("email", e)
+            sent = False
+    else:
+        print("🛡️ 今日无新的符合条件的标的，不发送邮件。")
+    if store is not None:
+        try:
+            if not sent and run_id is not None: store.discard(run_id)
+            store.close()
+        except Exception as e:
+            metrics.error("signal_store", e)
     if all_results:
-        send_email(all_results)
-        # 尝试保存 CSV，虽然在 Actions 里这步不是必须的
+        # 尝试保存 CSV (当天全部信号)，虽然在 Actions 里这步不是必须的
         try:
             pd.DataFrame(all_results).to_csv(f"Wyckoff_Result_{datetime.now().strftime('%Y%m%d')}.csv", index=False)
-        except: pass
-    else:
-        print("🛡️ 今日无符合条件的标的，不发送邮件。")
+        except Exception as e:
+            metrics.error("csv", e)
+
+    if ckpt is not None:
+        if sent: ckpt.finish()
+        else: print(f"⚠️ 报告未发出，断点 {ckpt.run_id} 保留，重跑会补发")
+    metrics.count("signals.total", len(all_results))
+    print_funnel()
+    metrics.print_summary()
+    print(f"📝 指标已写入: {', '.join(metrics.write(args.metrics_dir))}")
 
 if __name__ == "__main__":
     main()